@@ -0,0 +1,345 @@
+"""Coroutine versions of the listeners in listeners.py, for the asyncio Socket Mode process (socket_mode_async.py).
+
+Every Slack call on a click, a submission or a campaign recipient is awaited on the AsyncWebClient, and the fan-out
+keeps up to ASYNC_FANOUT_CONCURRENCY recipients in flight as tasks rather than threads. The stores, the campaign
+queue and the once-per-batch housekeeping (progress message, canvas flush, users.list directory walk, CSV
+downloads) keep their threaded implementations and run through asyncio.to_thread, with a synchronous client that
+shares the same rate-limit governor.
+"""
+import time
+import asyncio
+import logging
+# custom py modules
+import ui_templates
+import metadata_codec
+import fanout
+import directory_index
+import campaign_queue
+import canvas_writer
+import rate_limits
+import metrics
+import logging_config
+import idempotency
+import recipients
+import progress
+import campaigns
+import confirmations
+import listeners
+from listeners import ALLOWED_USERS, LOG_CHANNEL, WINDOWS_VERSION, get_todays_date, read_shortcut_submission, reschedule_action_ids
+# Slack imports
+from slack_sdk.errors import SlackApiError
+
+# Wired up by register_listeners
+bot_client = None
+sync_client = None
+job_queue = None
+canvas_rows = None
+idempotency_store = None
+campaign_registry = None
+confirmation_store = None
+# Shared by every campaign batch in the process, so the total in flight stays bounded however many chunks run
+send_slots = None
+
+async def respond_to_slack_within_3_seconds(ack):
+    await ack()
+
+async def get_user_email(client, user_id: str) -> str:
+    user_object = await client.users_info(user=user_id)
+    return user_object["user"]["profile"]["email"]
+
+async def get_campaign(campaign_id):
+    return await asyncio.to_thread(campaign_registry.get, campaign_id) if campaign_registry else None
+
+async def get_full_weeks(campaign) -> frozenset:
+    if campaign is None or not campaign.capacity or confirmation_store is None:
+        return frozenset()
+    return confirmations.full_weeks(await asyncio.to_thread(confirmation_store.availability, campaign.campaign_id))
+
+async def offer_open_weeks(client, campaign, full_weeks: frozenset, channel_id: str, message_ts: str, week: str):
+    warning = f":no_entry: The week of *{week}* is fully booked. Please pick another week."
+    await client.chat_update(
+        channel=channel_id,
+        ts=message_ts,
+        text=warning,
+        blocks=[{"type": "section", "text": {"type": "mrkdwn", "text": warning}}, *campaign.blocks_without(full_weeks)]
+    )
+
+async def handle_alternative_choice(body, client, logger):
+    logger.debug("Processing handle_alternative_choice")
+    try:
+        logging_config.log_payload(logger, body)
+        trigger_id = body["trigger_id"]
+        campaign_id, selected_date = ui_templates.parse_button_value(body["actions"][0]["value"])
+        campaign = await get_campaign(campaign_id)
+        key = idempotency.action_key(body["actions"][0]["action_id"], body["message"]["ts"], trigger_id)
+        async with idempotency.once_async(idempotency_store, key) as first:
+            if not first:
+                return
+            full_weeks = await get_full_weeks(campaign)
+            if selected_date in full_weeks:
+                await client.views_open(
+                    view=ui_templates.build_week_full_modal(selected_date, [week for week in campaign.weeks if week not in full_weeks]),
+                    trigger_id=trigger_id
+                )
+                await offer_open_weeks(client, campaign, full_weeks, body["container"]["channel_id"], body["message"]["ts"], selected_date)
+                return
+            email = await get_user_email(client, body["user"]["id"])
+            private_metadata = {
+                "date": selected_date,
+                "message_ts": body["message"]["ts"],
+                "channel_id": body["container"]["channel_id"],
+                "caller_id": body["user"]["id"],
+                "user_email": email,
+                "windows_version": campaign.windows_version if campaign else WINDOWS_VERSION
+            }
+            if campaign_id:
+                private_metadata["campaign_id"] = campaign_id
+            confirmation_message = f":spiral_calendar_pad: I am scheduling my Windows upgrade on *{selected_date}*"
+            await client.views_open(
+                view=ui_templates.build_confirmation_modal(private_metadata, confirmation_message),
+                trigger_id=trigger_id
+            )
+    except SlackApiError as e:
+        logger.error(f"Failed to open modal: {e}")
+
+async def handle_view_submission_events(body, client, logger):
+    logger.debug("Processing handle_view_submission_events")
+    try:
+        logging_config.log_payload(logger, body)
+        private_metadata = metadata_codec.decode_private_metadata(body["view"]["private_metadata"])
+        if confirmation_store is not None:
+            confirmation = confirmations.from_metadata(private_metadata, body["view"]["id"], (body.get("user") or {}).get("id"))
+            try:
+                await asyncio.to_thread(confirmation_store.record, confirmation)
+            except confirmations.SlotFull as e:
+                logger.info(str(e))
+                campaign = await get_campaign(e.campaign_id)
+                if campaign is not None:
+                    await offer_open_weeks(client, campaign, await get_full_weeks(campaign) | {e.week}, private_metadata["channel_id"], private_metadata["message_ts"], e.week)
+                return
+        async with idempotency.once_async(idempotency_store, idempotency.confirm_key(body["view"]["id"])) as first:
+            if first:
+                await client.chat_update(
+                    channel=private_metadata["channel_id"],
+                    ts=private_metadata["message_ts"],
+                    text=f"You have selected the week of *{private_metadata['date']}* for your Windows upgrade."
+                )
+        # A full buffer flushes inside add(), which calls canvases.edit on the synchronous client
+        await asyncio.to_thread(canvas_rows.add, canvas_writer.CanvasRow(
+            row_id=body["view"]["id"],
+            markdown=f"{private_metadata['windows_version']}, {private_metadata['user_email']}, {private_metadata['date']}, `{get_todays_date()}`",
+            campaign_id=private_metadata.get("campaign_id") or confirmations.UNKNOWN_CAMPAIGN
+        ))
+    except SlackApiError as e:
+        logger.error(f"Failed to open modal: {e}")
+
+async def handle_global_shortcut(body, client, logger):
+    logger.debug("Processing handle_global_shortcut")
+    try:
+        user_id = body["user"]["id"]
+        if user_id not in ALLOWED_USERS:
+            await client.chat_postMessage(
+                channel=user_id,
+                text="You’re not authorized to use this shortcut. Contact #ask_bt if this seems wrong."
+            )
+            logger.info(f"Blocked {user_id}")
+        else:
+            await client.views_open(
+                trigger_id=body["trigger_id"],
+                view=ui_templates.build_shortcut_modal("private_metadata")
+            )
+    except SlackApiError as e:
+        logger.error(f"Failed to open modal: {e}")
+
+async def send_windows_message(client, email: str, campaign: campaigns.Campaign, user_id: str = None, full_weeks: frozenset = frozenset(), ordinal: int = None, time_zone: str = None) -> fanout.RecipientResult:
+    """listeners.send_windows_message as a coroutine, for a campaign already looked up once per batch."""
+    key = idempotency.send_key(campaign.campaign_id, email)
+    try:
+        with metrics.recorder.span("RecipientSend"):
+            async with idempotency.once_async(idempotency_store, key) as first:
+                if not first:
+                    return fanout.RecipientResult(email=email, ok=True, user_id=user_id, duplicate=True)
+                if user_id is None:
+                    with metrics.recorder.span("CampaignPhase", Phase="lookup"):
+                        response = await client.users_lookupByEmail(email=email)
+                    user_id = response["user"]["id"]
+                    time_zone = time_zone or response["user"].get("tz")
+                blocks = campaign.blocks_without(full_weeks)
+                post_at = campaign.pacing.post_at(ordinal, time_zone, time.time()) if campaign.pacing and ordinal is not None else None
+                if post_at is not None:
+                    with metrics.recorder.span("CampaignPhase", Phase="schedule"):
+                        response = await client.chat_scheduleMessage(channel=user_id, post_at=int(post_at), blocks=blocks, text="Message from Endpoint Engineering")
+                    return fanout.RecipientResult(
+                        email=email, ok=True, user_id=user_id, scheduled_message_id=response["scheduled_message_id"], channel_id=response["channel"], post_at=post_at, time_zone=time_zone
+                    )
+                with metrics.recorder.span("CampaignPhase", Phase="post"):
+                    await client.chat_postMessage(channel=user_id, blocks=blocks, text="Message from Endpoint Engineering")
+        return fanout.RecipientResult(email=email, ok=True, user_id=user_id, time_zone=time_zone)
+    except SlackApiError as e:
+        return fanout.RecipientResult(email=email, ok=False, error=e.response["error"])
+
+async def message_multiple_users(client, emails: list[str], campaign: campaigns.Campaign, full_weeks: frozenset = frozenset(), ordinals: dict[str, int] = None) -> fanout.FanoutSummary:
+    logging.getLogger(__name__).debug(f"Processing message_multiple_users for {len(emails)} recipients")
+    emails = fanout.clean_emails(emails)
+    with metrics.recorder.span("CampaignPhase", Phase="directory"):
+        # Reads the index directory_index.refresh saved in the queue backend; never calls Slack
+        index = await asyncio.to_thread(directory_index.get_directory_index, job_queue)
+        resolved, misses = index.resolve(emails)
+    ordinals = ordinals or {}
+    summary = await fanout.fan_out_async(
+        lambda email: send_windows_message(
+            client, email, campaign, resolved.get(email), full_weeks, ordinals.get(email), index.time_zone(resolved.get(email))
+        ),
+        emails,
+        semaphore=send_slots
+    )
+    if misses:
+        for result in summary.results:
+            if result.ok and result.user_id and result.email not in resolved:
+                index.add(result.email, result.user_id, result.time_zone)
+    return summary
+
+async def delete_scheduled(client, scheduled: list[tuple], logger) -> int:
+    """listeners.delete_scheduled with the deletions in flight together, bounded by send_slots."""
+    now = time.time()
+
+    async def delete(channel: str, message_id: str) -> bool:
+        async with send_slots:
+            try:
+                await client.chat_deleteScheduledMessage(channel=channel, scheduled_message_id=message_id)
+                return True
+            except SlackApiError as e:
+                if e.response["error"] != "invalid_scheduled_message_id":
+                    logger.error(f"Failed to delete scheduled message {message_id}: {e}")
+                return False
+
+    return sum(await asyncio.gather(*(delete(channel, message_id) for channel, message_id, post_at in scheduled if post_at > now)))
+
+async def send_campaign_batch(chunk: campaign_queue.Chunk, emails: list[str]) -> fanout.FanoutSummary:
+    logger = logging.getLogger(__name__)
+    # Each worker is its own task, so the lane and correlation ID set here don't leak into other chunks
+    with rate_limits.lane(rate_limits.BULK), logging_config.correlation(chunk.key):
+        if chunk.action == campaign_queue.CANCEL:
+            entries = [entry.split(" ") for entry in emails]
+            deleted = await delete_scheduled(bot_client, [(channel, message_id, float(post_at)) for channel, message_id, post_at in entries], logger)
+            logger.info(f"{chunk.key}: deleted {deleted} of {len(emails)} scheduled messages")
+            return fanout.FanoutSummary()
+        if await asyncio.to_thread(job_queue.is_cancelled, chunk.campaign_id):
+            logger.info(f"{chunk.key}: campaign cancelled, not messaging {len(emails)} recipients")
+            return fanout.FanoutSummary()
+        campaign = await get_campaign(chunk.campaign_id)
+        if campaign is None:
+            # Chunks are only queued after their campaign is registered
+            logger.error(f"{chunk.key}: campaign not found, not messaging {len(emails)} recipients")
+            return fanout.FanoutSummary()
+        full_weeks = await get_full_weeks(campaign)
+        ordinals = {email: chunk.offset + position for position, email in enumerate(chunk.emails)}
+        summary = await message_multiple_users(bot_client, emails, campaign, full_weeks, ordinals)
+        scheduled = [(result.channel_id, result.scheduled_message_id, result.post_at) for result in summary.results if result.scheduled_message_id]
+        if scheduled:
+            await asyncio.to_thread(job_queue.add_scheduled, chunk.campaign_id, chunk.chunk_index, scheduled)
+        if await asyncio.to_thread(job_queue.is_cancelled, chunk.campaign_id):
+            await delete_scheduled(bot_client, scheduled, logger)
+            return summary
+        await asyncio.to_thread(progress.record, sync_client, job_queue, chunk, summary.results, paced=campaign.pacing is not None, batch_start=ordinals[emails[0]] - chunk.offset)
+    logger.info(f"{chunk.key}: sent {summary.sent}, skipped {summary.skipped} already sent, failed {summary.failed} in {summary.elapsed:.2f}s")
+    return summary
+
+async def handle_cancel_campaign(body, client, logger):
+    logger.debug("Processing handle_cancel_campaign")
+    try:
+        user_id = body["user"]["id"]
+        if user_id not in ALLOWED_USERS:
+            await client.chat_postMessage(channel=user_id, text="You’re not authorized to cancel campaigns. Contact #ask_bt if this seems wrong.")
+            logger.info(f"Blocked {user_id} from cancelling a campaign")
+            return
+        campaign_id = body["actions"][0]["value"]
+        key = idempotency.action_key(body["actions"][0]["action_id"], body["message"]["ts"], body.get("trigger_id"))
+        async with idempotency.once_async(idempotency_store, key) as first:
+            if not first:
+                return
+            await asyncio.to_thread(job_queue.cancel_campaign, campaign_id)
+            now = time.time()
+            pending = [f"{channel} {message_id} {int(post_at)}" for channel, message_id, post_at in await asyncio.to_thread(job_queue.get_scheduled, campaign_id) if post_at > now]
+            chunks = await asyncio.to_thread(campaign_queue.enqueue_campaign, job_queue, pending, {}, "", campaign_id=campaign_id, action=campaign_queue.CANCEL)
+            text = f"{body['message'].get('text', '')}\n:no_entry_sign: Cancelled by <@{user_id}>: no further recipients will be messaged, and {len(pending):,} scheduled messages are being deleted."
+            await client.chat_update(
+                channel=body["container"]["channel_id"],
+                ts=body["message"]["ts"],
+                text=text,
+                blocks=progress.status_blocks(text, campaign_id, cancellable=False)
+            )
+        logger.info(f"{campaign_id}: cancelled, {chunks} chunks of scheduled messages to delete")
+        if chunks and campaign_queue.CAMPAIGN_QUEUE_BACKEND != "sqs":
+            await campaign_queue.run_workers_async(job_queue, send_campaign_batch)
+    except SlackApiError as e:
+        logger.error(f"Failed to cancel campaign: {e}")
+
+def prepare_campaign(body, view, logger) -> tuple[int, str]:
+    """The blocking half of a shortcut submission: preflight (which may download CSVs), registration and enqueueing.
+
+    Returns (chunks queued, windows version); runs on a worker thread with the synchronous client.
+    """
+    windows_version, provided_emails, provided_files, slot_capacity, per_minute, provided_schedules = read_shortcut_submission(view)
+    view_id = view.get("id")
+    with idempotency.once(idempotency_store, idempotency.campaign_key(view_id) if view_id else None) as first:
+        if not first:
+            logger.info(f"{view_id}: campaign already queued, ignoring the retried submission")
+            return 0, windows_version
+        sources = [recipients.text_lines(provided_emails), *(recipients.download_lines(sync_client, file) for file in provided_files)]
+        with recipients.preflight(sources) as recipient_list:
+            listeners.send_preflight_summary(sync_client, body, recipient_list, logger)
+            if not recipient_list.valid:
+                return 0, windows_version
+            campaign = campaigns.Campaign.create(
+                windows_version, provided_schedules, campaign_id=view_id, capacity=slot_capacity or None, per_minute=per_minute, created_by=(body.get("user") or {}).get("id")
+            )
+            campaign_registry.put(campaign)
+            if campaign.capacities:
+                if confirmation_store is None:
+                    logger.warning(f"{campaign.campaign_id}: no confirmation store to enforce a capacity of {campaign.capacity} per week")
+                else:
+                    confirmation_store.set_capacity(campaign.campaign_id, campaign.capacities)
+            progress_ts = progress.start(sync_client, LOG_CHANNEL, windows_version, recipient_list.valid, campaign.campaign_id, paced=campaign.pacing is not None)
+            chunks = campaign_queue.enqueue_campaign(
+                job_queue, recipient_list, provided_schedules, windows_version, campaign_id=campaign.campaign_id,
+                total=recipient_list.valid, progress_channel=LOG_CHANNEL, progress_ts=progress_ts
+            )
+    return chunks, windows_version
+
+async def handle_shortcut_submission_events(ack, body, client, logger, view):
+    await ack()
+    logger.debug("Processing handle_shortcut_submission_events")
+    logging_config.log_payload(logger, body)
+    chunks, windows_version = await asyncio.to_thread(prepare_campaign, body, view, logger)
+    if not chunks:
+        return
+    logger.info(f"{windows_version}: queued {chunks} chunks")
+    if campaign_queue.CAMPAIGN_QUEUE_BACKEND != "sqs":
+        await campaign_queue.run_workers_async(job_queue, send_campaign_batch)
+
+def register_listeners(app, queue, canvas, client, store=None, confirmations_store=None):
+    """listeners.register_listeners for an AsyncApp.
+
+    client is a synchronous WebClient for the housekeeping that runs on worker threads; give it the governor
+    app.client uses so both draw from the same rate-limit buckets.
+    """
+    global bot_client, sync_client, job_queue, canvas_rows, idempotency_store, campaign_registry, confirmation_store, send_slots
+    bot_client, sync_client, job_queue, canvas_rows = app.client, client, queue, canvas
+    confirmation_store = confirmations_store
+    campaign_registry = campaigns.CampaignRegistry(queue)
+    idempotency_store = store or idempotency.get_store()
+    send_slots = asyncio.Semaphore(fanout.ASYNC_FANOUT_CONCURRENCY)
+    app.use(logging_config.async_correlation_middleware)
+    for register, lazy_function in [
+        *[(app.action(action_id), handle_alternative_choice) for action_id in reschedule_action_ids],
+        (app.view("confirmation_view"), handle_view_submission_events),
+        (app.shortcut("windows_update_callbackid"), handle_global_shortcut),
+        (app.view("windows_update_modal_view"), handle_shortcut_submission_events),
+        (app.action(progress.CANCEL_ACTION_ID), handle_cancel_campaign),
+    ]:
+        name = lazy_function.__name__
+        register(
+            ack=metrics.timed_listener(respond_to_slack_within_3_seconds, name, "ack"),
+            lazy=[logging_config.with_correlation(metrics.timed_listener(lazy_function, name, "lazy"))]
+        )
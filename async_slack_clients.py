@@ -0,0 +1,140 @@
+import os
+import asyncio
+from typing import Optional
+
+import aiohttp
+from slack_sdk.web.async_client import AsyncWebClient
+from slack_sdk.web.async_internal_utils import _request_with_session
+from slack_sdk.http_retry.builtin_async_handlers import AsyncConnectionErrorRetryHandler, AsyncServerErrorRetryHandler
+
+import fanout
+import metrics
+import rate_limits
+from slack_clients import SLACK_API_URL, SLACK_MAX_RETRIES, DEFAULT_TIMEOUT_SECONDS, METHOD_TIMEOUTS, IDLE_SECONDS
+
+# Every recipient the async fan-out keeps in flight, plus a few connections for interactive calls
+ASYNC_SLACK_POOL_SIZE = int(os.getenv("ASYNC_SLACK_POOL_SIZE", str(fanout.ASYNC_FANOUT_CONCURRENCY + 16)))
+
+class AsyncTransientServerErrorRetryHandler(AsyncServerErrorRetryHandler):
+    """AsyncServerErrorRetryHandler only covers 500 and 503; Slack's edge also returns 502 and 504 under load."""
+
+    async def _can_retry_async(self, *, state, request, response=None, error=None) -> bool:
+        return response is not None and response.status_code in (500, 502, 503, 504)
+
+def build_async_retry_handlers(max_retries: int = SLACK_MAX_RETRIES) -> list:
+    # 429s are retried by PooledAsyncWebClient itself, so every attempt goes back through the governor
+    return [
+        AsyncConnectionErrorRetryHandler(max_retry_count=max_retries),
+        AsyncTransientServerErrorRetryHandler(max_retry_count=max_retries),
+    ]
+
+class PooledAsyncWebClient(AsyncWebClient):
+    """AsyncWebClient counterpart of slack_clients.PooledWebClient, for the asyncio Socket Mode process.
+
+    Every client built from this one with for_request() shares one aiohttp session, and so one keep-alive
+    connection pool, opened on first use inside the running event loop. Every attempt awaits a token from the
+    same rate-limit governor the threaded clients use, and each call records SlackApiCall{Method} latency.
+    """
+
+    def __init__(self, *args, governor: Optional[rate_limits.RateLimitGovernor] = None, pool_size: int = ASYNC_SLACK_POOL_SIZE, max_retries: int = SLACK_MAX_RETRIES, parent: Optional["PooledAsyncWebClient"] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.governor = governor
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self._parent = parent
+        # Not self.session: bolt copies app.client.session into the plain client it builds per request, and deep-copies
+        # that client (an open session can't be copied) before every lazy listener
+        self._pool_session: Optional[aiohttp.ClientSession] = None
+
+    def for_request(self, team_id: Optional[str] = None) -> "PooledAsyncWebClient":
+        """A per-request client like the one bolt builds, but sharing this client's session and governor."""
+        return PooledAsyncWebClient(
+            token=self.token,
+            base_url=self.base_url,
+            timeout=self.timeout,
+            proxy=self.proxy,
+            headers=dict(self.headers),
+            team_id=team_id,
+            logger=self.logger,
+            retry_handlers=self.retry_handlers.copy(),
+            governor=self.governor,
+            pool_size=self.pool_size,
+            max_retries=self.max_retries,
+            parent=self._parent or self
+        )
+
+    def __deepcopy__(self, memo):
+        # Bolt deep-copies each request before running lazy listeners; the copy shares the session, which can't be
+        # copied and is meant to be shared
+        copied = memo[id(self)] = self.for_request(self.default_params.get("team_id"))
+        return copied
+
+    def _shared_session(self) -> aiohttp.ClientSession:
+        root = self._parent or self
+        if root._pool_session is None or root._pool_session.closed:
+            root._pool_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=root.pool_size, keepalive_timeout=IDLE_SECONDS),
+                timeout=aiohttp.ClientTimeout(total=root.timeout)
+            )
+        return root._pool_session
+
+    async def close(self):
+        root = self._parent or self
+        if root._pool_session is not None and not root._pool_session.closed:
+            await root._pool_session.close()
+
+    async def api_call(self, api_method: str, **kwargs):
+        # Covers retries and rate-limit waits too: this is the latency the caller sees
+        with metrics.recorder.span("SlackApiCall", Method=api_method):
+            return await super().api_call(api_method, **kwargs)
+
+    async def _request(self, *, http_verb, api_url, req_args) -> dict:
+        method_name = api_url.rsplit("/", 1)[-1]
+        channel = (req_args.get("json") or req_args.get("params") or req_args.get("data") or {}).get("channel")
+        session = self._shared_session()
+        req_args["timeout"] = aiohttp.ClientTimeout(total=METHOD_TIMEOUTS.get(method_name, self.timeout or DEFAULT_TIMEOUT_SECONDS))
+        for _ in range(self.max_retries + 1):
+            if self.governor is not None:
+                await self.governor.acquire_async(method_name, channel)
+            response = await _request_with_session(
+                current_session=session,
+                timeout=self.timeout,
+                logger=self._logger,
+                http_verb=http_verb,
+                api_url=api_url,
+                req_args=req_args,
+                retry_handlers=self.retry_handlers
+            )
+            if response["status_code"] != 429:
+                if self.governor is not None:
+                    self.governor.record_success(method_name)
+                return response
+            # aiohttp's headers are case-insensitive
+            retry_after = float(response["headers"].get("Retry-After") or 1)
+            if self.governor is not None:
+                # Pauses the bucket for Retry-After, so the next attempt's acquire does the waiting
+                self.governor.record_rate_limited(method_name, channel, retry_after)
+            else:
+                await asyncio.sleep(retry_after)
+        return response
+
+def build_async_web_client(token: str, base_url: str = SLACK_API_URL, max_retries: int = SLACK_MAX_RETRIES, governor: Optional[rate_limits.RateLimitGovernor] = rate_limits.governor) -> PooledAsyncWebClient:
+    """build_web_client for the asyncio process: pooled connections, retries, rate limits and per-method timeouts."""
+    return PooledAsyncWebClient(
+        token=token,
+        base_url=base_url,
+        timeout=DEFAULT_TIMEOUT_SECONDS,
+        retry_handlers=build_async_retry_handlers(max_retries),
+        governor=governor,
+        max_retries=max_retries
+    )
+
+def use_pooled_clients(app):
+    """Makes async listeners get a client that shares app.client's session and governor, like slack_clients.use_pooled_clients."""
+    if not isinstance(app.client, PooledAsyncWebClient):
+        return
+
+    @app.use
+    async def pooled_client(context, next):
+        context["client"] = app.client.for_request(context.team_id)
+        await next()
@@ -1,40 +1,122 @@
-import boto3
 import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from botocore.exceptions import ClientError
+from slack_bolt.middleware.request_verification import RequestVerification
 load_dotenv()
 
 bot_token_secret_name = os.getenv("bot_token_secret_name")
 signing_secret_name = os.getenv("signing_secret_name")
 region_name = "us-west-1"
-# Create a Secrets Manager client
-session = boto3.session.Session()
-client = session.client(
-    service_name='secretsmanager',
-    region_name=region_name
-)
+# aws: Secrets Manager, env: SLACK_BOT_TOKEN/SLACK_SIGNING_SECRET, file: JSON with bot_token/signing_secret keys
+SECRETS_BACKEND = os.getenv("SECRETS_BACKEND", "aws")
+SECRETS_FILE = os.getenv("SECRETS_FILE", ".secrets.json")
+SECRETS_TTL_SECONDS = int(os.getenv("SECRETS_TTL_SECONDS", str(12 * 3600)))
+# Bad signatures can come from anyone, so they may trigger at most one refetch per interval
+MIN_REFRESH_SECONDS = 60
 
-def get_bot_token():
-    try:
-        get_secret_value_response = client.get_secret_value(
-            SecretId=bot_token_secret_name
-        )
-    except ClientError as e:
-        # For a list of exceptions thrown, see
-        # https://docs.aws.amazon.com/secretsmanager/latest/apireference/API_GetSecretValue.html
-        raise e
-    secret = get_secret_value_response['SecretString']
-    return secret
+ENV_NAMES = {"bot_token": "SLACK_BOT_TOKEN", "signing_secret": "SLACK_SIGNING_SECRET"}
 
-def get_signing_secret():
-    try:
-        get_secret_value_response = client.get_secret_value(
-            SecretId=signing_secret_name
-        )
-    except ClientError as e:
+logger = logging.getLogger(__name__)
+
+class SecretsProvider:
+    """Fetches the bot token and signing secret together and caches them in memory for ttl seconds."""
+
+    def __init__(self, backend: str = SECRETS_BACKEND, ttl: int = SECRETS_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self._secrets: dict[str, str] = {}
+        self._fetched_at = 0.0
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> str:
+        with self._lock:
+            if not self._secrets or time.monotonic() - self._fetched_at >= self.ttl:
+                self._load()
+            return self._secrets[name]
+
+    def refresh(self) -> bool:
+        """Refetches unless the last fetch was under MIN_REFRESH_SECONDS ago; returns True if it refetched."""
+        with self._lock:
+            if time.monotonic() - self._fetched_at < MIN_REFRESH_SECONDS:
+                return False
+            self._load()
+            return True
+
+    def _load(self):
+        if self.backend == "env":
+            self._secrets = {name: os.environ[env_name] for name, env_name in ENV_NAMES.items()}
+        elif self.backend == "file":
+            with open(SECRETS_FILE) as f:
+                self._secrets = json.load(f)
+        else:
+            self._secrets = self._fetch_from_secrets_manager()
+        self._fetched_at = time.monotonic()
+
+    def _secrets_manager(self):
+        # Only the aws backend needs boto3, so the session and client are built on first use
+        if self._client is None:
+            import boto3
+            self._client = boto3.session.Session().client(service_name="secretsmanager", region_name=region_name)
+        return self._client
+
+    def _fetch_from_secrets_manager(self) -> dict[str, str]:
         # For a list of exceptions thrown, see
-        # https://docs.aws.amazon.com/secretsmanager/latest/apireference/API_GetSecretValue.html
-        raise e
+        # https://docs.aws.amazon.com/secretsmanager/latest/apireference/API_BatchGetSecretValue.html
+        from botocore.exceptions import ClientError
+        secret_ids = {"bot_token": bot_token_secret_name, "signing_secret": signing_secret_name}
+        client = self._secrets_manager()
+        try:
+            response = client.batch_get_secret_value(SecretIdList=list(secret_ids.values()))
+            if response.get("Errors"):
+                raise RuntimeError(f"BatchGetSecretValue failed for {[error['SecretId'] for error in response['Errors']]}")
+            by_id = {}
+            for value in response["SecretValues"]:
+                by_id[value["Name"]] = by_id[value["ARN"]] = value["SecretString"]
+            return {name: by_id[secret_id] for name, secret_id in secret_ids.items()}
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in ("AccessDeniedException", "UnknownOperationException"):
+                raise e
+        # Roles without secretsmanager:BatchGetSecretValue still get both secrets in one round trip
+        with ThreadPoolExecutor(max_workers=len(secret_ids)) as executor:
+            futures = {name: executor.submit(client.get_secret_value, SecretId=secret_id) for name, secret_id in secret_ids.items()}
+            return {name: future.result()["SecretString"] for name, future in futures.items()}
+
+class RotatingRequestVerification(RequestVerification):
+    """Bolt's request verification, but a failed signature refetches the signing secret once before rejecting.
+
+    That way a rotated signing secret is picked up by warm containers without refetching on every request.
+    """
+
+    def __init__(self, provider: SecretsProvider, base_logger=None):
+        super().__init__(provider.get("signing_secret"), base_logger=base_logger)
+        self.provider = provider
+
+    def process(self, *, req, resp, next):
+        if self._can_skip(req.mode, req.body):
+            return next()
+        body = req.raw_body
+        timestamp = req.headers.get("x-slack-request-timestamp", ["0"])[0]
+        signature = req.headers.get("x-slack-signature", [""])[0]
+        if self.verifier.is_valid(body, timestamp, signature):
+            return next()
+        if self.provider.refresh() and self.provider.get("signing_secret") != self._signing_secret:
+            logger.info("Signing secret changed, verifying again with the new one")
+            self._signing_secret = self.provider.get("signing_secret")
+            self._verifier = None
+            if self.verifier.is_valid(body, timestamp, signature):
+                return next()
+        self._debug_log_error(signature, timestamp, body)
+        return self._build_error_response()
 
-    secret = get_secret_value_response['SecretString']
-    return secret
+secrets = SecretsProvider()
+
+def get_bot_token():
+    return secrets.get("bot_token")
+
+def get_signing_secret():
+    return secrets.get("signing_secret")
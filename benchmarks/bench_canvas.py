@@ -0,0 +1,59 @@
+"""canvases.edit calls for N confirmations: one call per row vs CanvasWriteBuffer.
+
+    python benchmarks/bench_canvas.py --confirmations 100 1000 10000
+"""
+import os
+import sys
+import time
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from slack_sdk import WebClient
+
+import canvas_writer
+from fake_slack import FakeSlackServer
+
+def confirmation_rows(count: int) -> list[canvas_writer.CanvasRow]:
+    return [
+        canvas_writer.CanvasRow(row_id=f"V{i}", markdown=f"Windows 11 24H2, user{i}@example.com, March 9, `2026-03-01 09:00:00 AM PST`")
+        for i in range(count)
+    ]
+
+def per_row(client: WebClient, rows: list[canvas_writer.CanvasRow]):
+    # What handle_view_submission_events did before the buffer
+    for row in rows:
+        client.canvases_edit(
+            canvas_id="F123",
+            changes=[{"operation": "insert_at_end", "document_content": {"type": "markdown", "markdown": row.markdown}}]
+        )
+
+def buffered(client: WebClient, rows: list[canvas_writer.CanvasRow], flush_rows: int):
+    buffer = canvas_writer.CanvasWriteBuffer(client, "F123", flush_rows=flush_rows)
+    for row in rows:
+        buffer.add(row)
+    buffer.flush()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--confirmations", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--flush-rows", type=int, default=canvas_writer.CANVAS_FLUSH_ROWS)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    print(f"{'rows':>7} {'per-row calls':>14} {'buffered calls':>15} {'saved':>7} {'per-row s':>10} {'buffered s':>11}")
+    for count in args.confirmations:
+        rows = confirmation_rows(count)
+        timings, calls = [], []
+        for run in (lambda c: per_row(c, rows), lambda c: buffered(c, rows, args.flush_rows)):
+            with FakeSlackServer(latency=args.latency) as server:
+                client = WebClient(token="xoxb-fake", base_url=server.base_url)
+                started = time.perf_counter()
+                run(client)
+                timings.append(time.perf_counter() - started)
+                calls.append(server.calls["canvases.edit"])
+                rendered = sum(len(markdown.split(canvas_writer.ROW_SEPARATOR)) for markdown in server.canvas)
+                assert rendered == count, f"expected {count} canvas rows, found {rendered}"
+        print(f"{count:>7} {calls[0]:>14} {calls[1]:>15} {calls[0] - calls[1]:>7} {timings[0]:>10.2f} {timings[1]:>11.2f}")
+
+if __name__ == "__main__":
+    main()
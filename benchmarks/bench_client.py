@@ -0,0 +1,50 @@
+"""Latency and throughput of the default WebClient vs slack_clients.build_web_client (keep-alive pool).
+
+    python benchmarks/bench_client.py --calls 500 --threads 1 8
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from slack_sdk import WebClient
+
+import slack_clients
+from fake_slack import FakeSlackServer
+
+def run(client: WebClient, calls: int, threads: int) -> tuple[list[float], float]:
+    def one_call(i: int) -> float:
+        started = time.perf_counter()
+        client.chat_postMessage(channel=f"U{i}", text="Message from Endpoint Engineering")
+        return time.perf_counter() - started
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = list(executor.map(one_call, range(calls)))
+    return latencies, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every fake API call")
+    args = parser.parse_args()
+
+    print(f"{'client':<8} {'threads':>7} {'p50 ms':>7} {'p99 ms':>7} {'calls/s':>8} {'connections':>12}")
+    with FakeSlackServer(latency=args.latency) as server:
+        for threads in args.threads:
+            for name in ("default", "pooled"):
+                if name == "default":
+                    client = WebClient(token="xoxb-fake", base_url=server.base_url)
+                else:
+                    # No rate-limit governor here: this compares transports, not pacing
+                    client = slack_clients.build_web_client("xoxb-fake", base_url=server.base_url, governor=None)
+                latencies, elapsed = run(client, args.calls, threads)
+                quantiles = statistics.quantiles(latencies, n=100)
+                connections = client.pool.created if name == "pooled" else args.calls
+                print(f"{name:<8} {threads:>7} {quantiles[49] * 1000:>7.2f} {quantiles[98] * 1000:>7.2f} {args.calls / elapsed:>8.0f} {connections:>12}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Query times on the SQLite confirmation store: per-week counts, latency percentiles, lookups and the canvas render.
+
+    python benchmarks/bench_confirmations.py --confirmations 10000 50000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import canvas_writer
+import confirmations
+
+WEEKS = ["2026-11-02", "2026-11-09", "2026-11-16", "2026-11-23", "2026-11-30", "2026-12-07"]
+CAMPAIGNS = {"V24H2": "Windows 11 24H2", "V25H2": "Windows 11 25H2"}
+
+def populate(store, count: int, seed: int = 1):
+    rng = random.Random(seed)
+    sent_at = time.time() - 14 * 24 * 3600
+    for i in range(count):
+        campaign_id = "V24H2" if i % 4 else "V25H2"
+        store.record(confirmations.Confirmation(
+            campaign_id=campaign_id,
+            email=f"user{i}@example.com",
+            week=rng.choice(WEEKS),
+            windows_version=CAMPAIGNS[campaign_id],
+            view_id=f"V{i}",
+            message_ts=sent_at,
+            # Most people answer within a day, a long tail takes a week or more
+            confirmed_at=sent_at + rng.lognormvariate(9, 1.5)
+        ))
+
+def timed(function, repeat: int = 20) -> float:
+    """Median milliseconds per call."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--confirmations", type=int, nargs="+", default=[10000, 50000])
+    args = parser.parse_args()
+
+    cases = {
+        "counts_by_week": lambda store: store.counts_by_week("V24H2"),
+        "latency_percentiles": lambda store: store.latency_percentiles("V24H2"),
+        "by_week": lambda store: store.by_week("V24H2", WEEKS[2]),
+        "get": lambda store: store.get("V24H2", "user4241@example.com"),
+        "for_email": lambda store: store.for_email("user4241@example.com"),
+        "render_canvas": lambda store: canvas_writer.render_markdown(list(store.iter_all())),
+    }
+    print(f"{'rows':>7} {'insert us/row':>14} " + " ".join(f"{name + ' ms':>22}" for name in cases))
+    for count in args.confirmations:
+        with tempfile.TemporaryDirectory() as directory:
+            store = confirmations.SQLiteConfirmationStore(os.path.join(directory, "confirmations.sqlite3"))
+            started = time.perf_counter()
+            populate(store, count)
+            insert_us = (time.perf_counter() - started) / count * 1e6
+            results = [timed(lambda: case(store), repeat=5 if name == "render_canvas" else 20) for name, case in cases.items()]
+        print(f"{count:>7} {insert_us:>14.1f} " + " ".join(f"{result:>22.3f}" for result in results))
+
+if __name__ == "__main__":
+    main()
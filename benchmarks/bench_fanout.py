@@ -0,0 +1,43 @@
+"""Recipients/second for message_multiple_users style fan-out at 1, 8 and 32 workers.
+
+    python benchmarks/bench_fanout.py --recipients 500 --latency 0.05
+"""
+import os
+import sys
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+
+import fanout
+from fake_slack import FakeSlackServer
+
+def build_send_one(client: WebClient):
+    # Mirrors send_windows_message: one lookup followed by one post per recipient
+    def send_one(email: str) -> fanout.RecipientResult:
+        try:
+            user_id = client.users_lookupByEmail(email=email)["user"]["id"]
+            client.chat_postMessage(channel=user_id, text="Message from Endpoint Engineering")
+            return fanout.RecipientResult(email=email, ok=True, user_id=user_id)
+        except SlackApiError as e:
+            return fanout.RecipientResult(email=email, ok=False, error=e.response["error"])
+    return send_one
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipients", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every fake API call")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    emails = [f"user{i}@example.com" for i in range(args.recipients)]
+    with FakeSlackServer(latency=args.latency) as server:
+        client = WebClient(token="xoxb-fake", base_url=server.base_url)
+        print(f"{'workers':>8} {'sent':>6} {'failed':>6} {'seconds':>8} {'recipients/s':>13}")
+        for workers in args.workers:
+            summary = fanout.fan_out(build_send_one(client), emails, max_workers=workers)
+            print(f"{workers:>8} {summary.sent:>6} {summary.failed:>6} {summary.elapsed:>8.2f} {summary.recipients_per_second:>13.1f}")
+
+if __name__ == "__main__":
+    main()
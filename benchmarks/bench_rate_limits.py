@@ -0,0 +1,47 @@
+"""How long an interactive Slack call waits for a rate-limit token while a campaign saturates the same method.
+
+    python benchmarks/bench_rate_limits.py --seconds 10 --bulk-threads 8
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import statistics
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rate_limits
+
+def run(seconds: float, bulk_threads: int, interactive_lane: int) -> tuple[list[float], dict]:
+    governor = rate_limits.RateLimitGovernor()
+    stopped = threading.Event()
+    def bulk_sender():
+        with rate_limits.lane(rate_limits.BULK):
+            while not stopped.is_set():
+                # A distinct channel per DM, like a campaign, so only the method bucket is contended
+                governor.acquire("chat.postMessage", f"D{threading.get_ident()}{time.monotonic()}")
+    threads = [threading.Thread(target=bulk_sender, daemon=True) for _ in range(bulk_threads)]
+    for thread in threads:
+        thread.start()
+    waits = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        time.sleep(0.25)
+        waits.append(governor.acquire("chat.postMessage", f"U{len(waits)}", lane=interactive_lane))
+    stopped.set()
+    return waits, governor.snapshot()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--bulk-threads", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{'interactive call':<22} {'p50 ms':>8} {'max ms':>8} {'bulk calls/min':>15}")
+    for name, interactive_lane in (("same lane as bulk", rate_limits.BULK), ("interactive lane", rate_limits.INTERACTIVE)):
+        waits, snapshot = run(args.seconds, args.bulk_threads, interactive_lane)
+        bulk_per_minute = snapshot["calls"]["chat.postMessage"] / args.seconds * 60
+        print(f"{name:<22} {statistics.median(waits) * 1000:>8.1f} {max(waits) * 1000:>8.1f} {bulk_per_minute:>15.0f}")
+
+if __name__ == "__main__":
+    main()
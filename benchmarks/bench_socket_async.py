@@ -0,0 +1,174 @@
+"""Threaded vs asyncio Socket Mode process on the same fake-Slack campaign.
+
+Submits the shortcut modal straight to each mode's handle_shortcut_submission_events (the part of the Socket Mode
+process that does the work once the envelope is acked) and reports wall time, recipients/second, peak RSS and peak
+thread count, and the CPU time the run took. By default no recipient is in the users.list directory, so each one costs a lookup and a post:
+
+    python benchmarks/bench_socket_async.py --recipients 1000 5000 --latency 0.2 --fanout-workers 8 64
+
+Each run gets its own process, and the fake Slack API runs in another one, so its threads and memory aren't counted.
+--fanout-workers runs the threaded mode once per FANOUT_WORKERS value; the asyncio mode keeps up to
+ASYNC_FANOUT_CONCURRENCY recipients in flight.
+"""
+import io
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import resource
+import threading
+import multiprocessing
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_slack import FakeSlackServer
+
+SCHEDULES = {
+    "tentative_schedule": "2026-11-02",
+    "alternate_schedule_1": "2026-11-09",
+    "alternate_schedule_2": "2026-11-16",
+    "alternate_schedule_3": "2026-11-23",
+    "alternate_schedule_4": "2026-11-30",
+    "alternate_schedule_5": "2026-12-07",
+}
+
+# Not imported from load_test, which imports the bot's modules before FANOUT_WORKERS is set for the run
+def build_recipients(count: int, invalid_share: float, directory_share: float) -> tuple[list[str], list[str]]:
+    """Returns (emails to submit, emails users.list knows about)."""
+    invalid_every = round(1 / invalid_share) if invalid_share else 0
+    emails = [f"invalid{i}@example.com" if invalid_every and i % invalid_every == 0 else f"user{i}@example.com" for i in range(count)]
+    valid = [email for email in emails if not email.startswith("invalid")]
+    return emails, valid[:int(len(valid) * directory_share)]
+
+def build_view(emails: list[str]) -> dict:
+    values = {"provided_emails": {"provided_emails-action": {"value": ",".join(emails)}}}
+    for block_id, value in SCHEDULES.items():
+        values[block_id] = {f"{block_id}-action": {"value": value}}
+    return {"id": f"V_BENCH_{len(emails)}", "state": {"values": values}}
+
+def serve(args, directory: list[str], ready):
+    with FakeSlackServer(latency=args.latency, directory=directory, error_rate=args.error_rate, rate_limits=True, time_scale=args.time_scale) as server:
+        ready.send(server.base_url)
+        ready.recv()
+
+class PeakThreads:
+    """Samples the thread count every few milliseconds while a run is in progress."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stopped.set()
+        self._thread.join()
+
+def run(mode: str, count: int, fanout_workers: int, args) -> dict:
+    # Read at import by the bot's modules, so set before importing them
+    os.environ["CAMPAIGN_QUEUE_BACKEND"] = "memory"
+    os.environ["LOG_CHANNEL"] = "C_LOG"
+    os.environ["FANOUT_WORKERS"] = str(fanout_workers)
+    os.environ["ASYNC_FANOUT_CONCURRENCY"] = str(args.concurrency)
+    import rate_limits
+    import campaign_queue
+    import canvas_writer
+    import directory_index
+    import slack_clients
+
+    emails, directory = build_recipients(count, args.invalid_share, args.directory_share)
+    parent, child = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=serve, args=(args, directory, child), daemon=True)
+    server.start()
+    base_url = parent.recv()
+    governor = rate_limits.RateLimitGovernor(time_scale=args.time_scale)
+    client = slack_clients.build_web_client("xoxb-fake", base_url=base_url, governor=governor)
+    canvas_rows = canvas_writer.CanvasWriteBuffer(client, "F_CANVAS")
+    logger = logging.getLogger("bench_socket_async")
+    view = build_view(emails)
+    job_queue = campaign_queue.get_queue("memory")
+    # What the process's refresh thread would have saved before the campaign came in
+    directory_index.refresh(client, job_queue)
+    if mode == "threaded":
+        from slack_bolt import App
+        import listeners
+    else:
+        from slack_bolt.async_app import AsyncApp
+        import async_listeners
+        import async_slack_clients
+    # Taken after the imports, so "added MB" is what the campaign itself costs
+    baseline_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    try:
+        with PeakThreads() as threads, redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            if mode == "threaded":
+                app = App(client=client, signing_secret="fake", token_verification_enabled=False)
+                listeners.register_listeners(app, job_queue, canvas_rows)
+                listeners.handle_shortcut_submission_events(ack=lambda: None, body={}, client=client, logger=logger, view=view)
+            else:
+                async def submit():
+                    async_client = async_slack_clients.build_async_web_client("xoxb-fake", base_url=base_url, governor=governor)
+                    app = AsyncApp(client=async_client, signing_secret="fake")
+                    async_listeners.register_listeners(app, job_queue, canvas_rows, client)
+
+                    async def ack():
+                        pass
+                    try:
+                        await async_listeners.handle_shortcut_submission_events(ack=ack, body={}, client=async_client, logger=logger, view=view)
+                    finally:
+                        await async_client.close()
+                asyncio.run(submit())
+            elapsed = time.perf_counter() - started
+    finally:
+        parent.send("stop")
+        server.join()
+    snapshot = governor.snapshot()
+    finished = resource.getrusage(resource.RUSAGE_SELF)
+    return {
+        "mode": mode if mode == "asyncio" else f"threads x{fanout_workers * campaign_queue.CAMPAIGN_WORKERS}",
+        "recipients": count,
+        "seconds": elapsed,
+        "calls": sum(snapshot["calls"].values()),
+        "rate_limited": sum(snapshot["rate_limited"].values()),
+        # ru_maxrss is in KiB on Linux
+        "peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "added_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 - baseline_mb,
+        "peak_threads": threads.peak,
+        "cpu_seconds": finished.ru_utime + finished.ru_stime - usage.ru_utime - usage.ru_stime,
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipients", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds added to every fake API call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with a 503")
+    parser.add_argument("--invalid-share", type=float, default=0.02, help="share of recipients with no Slack account")
+    parser.add_argument("--directory-share", type=float, default=0.0, help="share of valid recipients returned by users.list")
+    parser.add_argument("--time-scale", type=float, default=6000, help="speeds Slack's rate limits up on both sides, far enough that latency rather than rate limits sets the pace")
+    parser.add_argument("--fanout-workers", type=int, nargs="+", default=[8, 64], help="FANOUT_WORKERS for the threaded runs")
+    parser.add_argument("--concurrency", type=int, default=256, help="ASYNC_FANOUT_CONCURRENCY for the asyncio runs")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    runs = [("threaded", workers) for workers in args.fanout_workers] + [("asyncio", 0)]
+    print(f"{'mode':>12} {'recipients':>10} {'seconds':>8} {'recipients/s':>13} {'calls':>7} {'429s':>5} {'CPU s':>6} {'peak MB':>8} {'added MB':>9} {'threads':>8}")
+    for count in args.recipients:
+        for mode, workers in runs:
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                result = executor.submit(run, mode, count, workers, args).result()
+            print(f"{result['mode']:>12} {count:>10} {result['seconds']:>8.2f} {count / result['seconds']:>13.1f} {result['calls']:>7} {result['rate_limited']:>5} {result['cpu_seconds']:>6.2f} {result['peak_mb']:>8.1f} {result['added_mb']:>9.1f} {result['peak_threads']:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Campaign throughput against the number of Socket Mode replicas sharing one campaign queue.
+
+Submits one campaign through handle_shortcut_submission_events with drain_queue=False, as socket_mode.py's
+listeners do, then starts N replica processes whose campaign workers drain the shared queue against the fake
+Slack API. Each replica takes 1/N of the rate limits, like socket_mode.run_replicas. State is shared through
+STATE_BACKEND=sqlite, the single-machine stand-in for Redis:
+
+    python benchmarks/bench_socket_replicas.py --recipients 3000 --replicas 1 2 4 --latency 0.2
+
+Only the time from the replicas starting together to the last chunk being acked is measured.
+"""
+import io
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import multiprocessing
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_slack import FakeSlackServer
+from bench_socket_async import build_recipients, build_view, serve
+
+def replica(base_url: str, args, share: float, start, results):
+    from slack_bolt import App
+    import rate_limits
+    import campaign_queue
+    import canvas_writer
+    import slack_clients
+    import listeners
+    governor = rate_limits.RateLimitGovernor(time_scale=args.time_scale, share=share)
+    client = slack_clients.build_web_client("xoxb-fake", base_url=base_url, governor=governor)
+    app = App(client=client, signing_secret="fake", token_verification_enabled=False)
+    listeners.register_listeners(app, campaign_queue.get_queue(), canvas_writer.CanvasWriteBuffer(client, "F_CANVAS"), drain_queue=False)
+    start.wait()
+    with redirect_stdout(io.StringIO()):
+        campaign_queue.run_workers(listeners.job_queue, listeners.send_campaign_batch, args.campaign_workers)
+    snapshot = governor.snapshot()
+    results.put((sum(snapshot["calls"].values()), sum(snapshot["rate_limited"].values())))
+
+def run(count: int, replicas: int, args) -> dict:
+    # Read at import by the bot's modules, so set before importing them
+    state = tempfile.mkdtemp(prefix="bench_socket_replicas_")
+    os.environ.update({
+        "STATE_BACKEND": "sqlite",
+        "CAMPAIGN_QUEUE_PATH": os.path.join(state, "queue.sqlite3"),
+        "IDEMPOTENCY_PATH": os.path.join(state, "idempotency.sqlite3"),
+        "CONFIRMATION_PATH": os.path.join(state, "confirmations.sqlite3"),
+        "CAMPAIGN_CHUNK_SIZE": str(args.chunk_size),
+        "LOG_CHANNEL": "C_LOG",
+    })
+    from slack_bolt import App
+    import rate_limits
+    import campaign_queue
+    import canvas_writer
+    import directory_index
+    import slack_clients
+    import listeners
+
+    emails, directory = build_recipients(count, args.invalid_share, args.directory_share)
+    parent, child = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=serve, args=(args, directory, child), daemon=True)
+    server.start()
+    base_url = parent.recv()
+    try:
+        client = slack_clients.build_web_client("xoxb-fake", base_url=base_url, governor=rate_limits.RateLimitGovernor(time_scale=args.time_scale))
+        app = App(client=client, signing_secret="fake", token_verification_enabled=False)
+        listeners.register_listeners(app, campaign_queue.get_queue(), canvas_writer.CanvasWriteBuffer(client, "F_CANVAS"), drain_queue=False)
+        # Saved in the shared queue backend, where every replica reads it
+        directory_index.refresh(client, campaign_queue.get_queue())
+        with redirect_stdout(io.StringIO()):
+            listeners.handle_shortcut_submission_events(ack=lambda: None, body={}, client=client, logger=logging.getLogger("bench_socket_replicas"), view=build_view(emails))
+
+        start, results = multiprocessing.Event(), multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=replica, args=(base_url, args, 1 / replicas, start, results)) for _ in range(replicas)]
+        for process in processes:
+            process.start()
+        # Let every replica finish importing and connecting before the clock starts
+        time.sleep(args.warmup)
+        started = time.perf_counter()
+        start.set()
+        counts = [results.get() for _ in processes]
+        elapsed = time.perf_counter() - started
+        for process in processes:
+            process.join()
+    finally:
+        parent.send("stop")
+        server.join()
+    return {
+        "seconds": elapsed,
+        "calls": sum(calls for calls, _ in counts),
+        "rate_limited": sum(limited for _, limited in counts),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipients", type=int, nargs="+", default=[3000])
+    parser.add_argument("--replicas", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--campaign-workers", type=int, default=4, help="campaign worker threads per replica")
+    parser.add_argument("--chunk-size", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds added to every fake API call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with a 503")
+    parser.add_argument("--invalid-share", type=float, default=0.02, help="share of recipients with no Slack account")
+    parser.add_argument("--directory-share", type=float, default=0.0, help="share of valid recipients returned by users.list")
+    parser.add_argument("--time-scale", type=float, default=6000, help="speeds Slack's rate limits up on both sides, far enough that latency rather than rate limits sets the pace")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds the replicas get to start up before the clock starts")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    print(f"{'replicas':>8} {'recipients':>10} {'seconds':>8} {'recipients/s':>13} {'speedup':>8} {'calls':>7} {'429s':>5}")
+    for count in args.recipients:
+        baseline = None
+        for replicas in args.replicas:
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                result = executor.submit(run, count, replicas, args).result()
+            rate = count / result["seconds"]
+            baseline = baseline or rate
+            print(f"{replicas:>8} {count:>10} {result['seconds']:>8.2f} {rate:>13.1f} {rate / baseline:>7.2f}x {result['calls']:>7} {result['rate_limited']:>5}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Time and allocations per message: the old deepcopy build_blocks_message vs the render-once cache.
+
+    python benchmarks/bench_templates.py --messages 2000
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+from copy import deepcopy
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ui_templates
+
+SCHEDULES = {
+    "windows_version": "Windows 11 24H2",
+    "tentative_schedule": "March 2",
+    "alternate_schedule_1": "March 9",
+    "alternate_schedule_2": "March 16",
+    "alternate_schedule_3": "March 23",
+    "alternate_schedule_4": "March 30",
+    "alternate_schedule_5": "April 6",
+}
+
+def deepcopy_build_blocks_message(provided_schedules: dict, windows_version: str) -> list:
+    # The per-recipient path build_blocks_message used before the render cache
+    blocks_message = deepcopy(ui_templates.BLOCK_MESSAGE_TEMPLATE)["blocks"]
+    blocks_message[0]["text"]["text"] = f":windows_logo: *Your Windows 11 Upgrade: Scheduled for {provided_schedules['tentative_schedule']}* :windows_logo:"
+    blocks_message[2]["text"]["text"] = f"We are upgrading your Workday laptop to *{windows_version}* for improved performance and enhanced security."
+    blocks_message[3]["text"]["text"] = f"Your upgrade is scheduled for the week of {provided_schedules['tentative_schedule']}. If this timing works for you, *no action is required*."
+    for i in range(1, 6):
+        blocks_message[4 + i]["text"]["text"] = f"Upgrade the week of *{provided_schedules[f'alternate_schedule_{i}']}*"
+        blocks_message[4 + i]["accessory"]["value"] = provided_schedules[f"alternate_schedule_{i}"]
+    blocks_message[12]["elements"][0]["elements"][1]["text"] = f"Benefits of {windows_version}\n"
+    blocks_message[15]["text"]["text"] = f"For additional questions, please refer to the <https://www.google.com|{windows_version} FAQ> or ask in #ask-bt."
+    return blocks_message
+
+def measure(build, messages: int) -> tuple[float, float]:
+    """Returns (microseconds per message, bytes allocated per message)."""
+    started = time.perf_counter()
+    for _ in range(messages):
+        build(SCHEDULES, SCHEDULES["windows_version"])
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    for _ in range(messages):
+        tracemalloc.reset_peak()
+        build(SCHEDULES, SCHEDULES["windows_version"])
+        peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed / messages * 1e6, peak
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    args = parser.parse_args()
+
+    assert ui_templates.build_blocks_message(SCHEDULES, SCHEDULES["windows_version"]) == deepcopy_build_blocks_message(SCHEDULES, SCHEDULES["windows_version"])
+    print(f"{'path':<16} {'us/message':>11} {'bytes/message':>14}")
+    for name, build in [
+        ("deepcopy", deepcopy_build_blocks_message),
+        ("render cache", ui_templates.build_blocks_message),
+        ("render json", ui_templates.build_blocks_message_json),
+    ]:
+        per_message, allocated = measure(build, args.messages)
+        print(f"{name:<16} {per_message:>11.2f} {allocated:>14,}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""A local stand-in for the Slack Web API methods this bot calls.
+
+Run it directly (``python benchmarks/fake_slack.py``) or start it in-process from a benchmark and
+point a WebClient at ``server.base_url``. Latency, transient errors, invalid addresses and Slack's
+per-tier rate limits (429 with Retry-After) are all configurable, so load tests can exercise the
+same failure paths as a real workspace without messaging anyone.
+"""
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+# Calls per minute per tier, https://api.slack.com/apis/rate-limits
+TIER_PER_MINUTE = {1: 1, 2: 20, 3: 50, 4: 100}
+METHOD_TIERS = {
+    "users.list": 2,
+    "users.lookupByEmail": 3,
+    "chat.update": 3,
+    "chat.scheduleMessage": 3,
+    "chat.deleteScheduledMessage": 3,
+    "canvases.edit": 3,
+    "users.info": 4,
+    "views.open": 4,
+    "auth.test": 4,
+}
+# chat.postMessage isn't tiered: roughly one message per second per channel, with short bursts allowed
+POST_MESSAGE_PER_CHANNEL_PER_MINUTE = 60
+
+def fake_user_id(email: str) -> str:
+    return "U" + format(abs(hash(email.lower())) % 16**10, "010X")
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+class _Windows:
+    """Fixed-window call counters, keyed by method (or method and channel)."""
+
+    def __init__(self):
+        self._windows: dict[str, tuple[float, int]] = {}
+
+    def hit(self, key: str, limit: int, window: float, now: float) -> float:
+        """Counts one call; returns 0 if it's within limit, else the seconds until the window resets."""
+        started, count = self._windows.get(key, (now, 0))
+        if now - started >= window:
+            started, count = now, 0
+        if count >= limit:
+            return started + window - now
+        self._windows[key] = (started, count + 1)
+        return 0.0
+
+class FakeSlackServer:
+    """
+    latency: seconds added to every call
+    directory: emails returned by users.list; users.lookupByEmail still answers for any valid address
+    error_rate: share of calls answered with HTTP 503, which the client's retry handlers retry
+    invalid_domains: addresses at these domains (or starting with "invalid") get users_not_found
+    rate_limits: answer 429 with Retry-After once a method goes over its tier's per-minute limit
+    time_scale: shrinks the rate-limit windows, e.g. 60 turns each minute into one second for quick load tests
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.05, directory=(), error_rate: float = 0.0, invalid_domains=(), rate_limits: bool = False, time_scale: float = 1.0, seed: int = 0):
+        self.latency = latency
+        self.directory = [{"id": fake_user_id(email), "profile": {"email": email}} for email in directory]
+        self.error_rate = error_rate
+        self.invalid_domains = {domain.lower() for domain in invalid_domains}
+        self.rate_limits = rate_limits
+        self.time_scale = time_scale
+        self.calls = Counter()
+        # Calls answered with a 429 or 503 instead of being handled, by method
+        self.rejected = Counter()
+        # Markdown appended by canvases.edit, in arrival order
+        self.canvas = []
+        # Pending chat.scheduleMessage messages, scheduled_message_id -> channel
+        self.scheduled: dict[str, str] = {}
+        self._scheduled_count = 0
+        self.users: dict[str, str] = {}
+        self._random = random.Random(seed)
+        self._windows = _Windows()
+        self._lock = threading.Lock()
+        self._httpd = _Server((host, port), self._build_handler())
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/api/"
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    @property
+    def total_rejected(self) -> int:
+        return sum(self.rejected.values())
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-slack", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def is_invalid(self, email: str) -> bool:
+        return "@" not in email or email.startswith("invalid") or email.rsplit("@", 1)[-1].lower() in self.invalid_domains
+
+    def admit(self, method: str, params: dict) -> tuple[int, dict]:
+        """Decides whether a call gets handled; returns (0, {}) if so, else the HTTP status and headers to reject it with."""
+        with self._lock:
+            self.calls[method] += 1
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.rejected[method] += 1
+                return 503, {}
+            if not self.rate_limits:
+                return 0, {}
+            now = time.monotonic()
+            window = 60 / self.time_scale
+            if method == "chat.postMessage":
+                retry_after = self._windows.hit(f"{method}:{params.get('channel')}", POST_MESSAGE_PER_CHANNEL_PER_MINUTE, window, now)
+            else:
+                retry_after = self._windows.hit(method, TIER_PER_MINUTE[METHOD_TIERS.get(method, 3)], window, now)
+            if retry_after:
+                self.rejected[method] += 1
+                return 429, {"Retry-After": str(max(1, math.ceil(retry_after)))}
+        return 0, {}
+
+    def dispatch(self, method: str, params: dict) -> dict:
+        if self.latency:
+            time.sleep(self.latency)
+        if method == "users.lookupByEmail":
+            email = params.get("email", "")
+            if self.is_invalid(email):
+                return {"ok": False, "error": "users_not_found"}
+            user_id = fake_user_id(email)
+            with self._lock:
+                self.users[user_id] = email
+            return {"ok": True, "user": {"id": user_id, "profile": {"email": email}}}
+        if method == "users.info":
+            user_id = params.get("user", "")
+            with self._lock:
+                email = self.users.get(user_id, f"{user_id.lower()}@example.com")
+            return {"ok": True, "user": {"id": user_id, "profile": {"email": email}}}
+        if method == "users.list":
+            start = int(params.get("cursor") or 0)
+            end = start + int(params.get("limit") or 200)
+            next_cursor = str(end) if end < len(self.directory) else ""
+            return {"ok": True, "members": self.directory[start:end], "response_metadata": {"next_cursor": next_cursor}}
+        if method == "canvases.edit":
+            with self._lock:
+                for change in params.get("changes", []):
+                    self.canvas.append(change["document_content"]["markdown"])
+            return {"ok": True}
+        if method == "chat.postMessage":
+            return {"ok": True, "channel": params.get("channel"), "ts": f"{time.time():.6f}"}
+        if method == "chat.scheduleMessage":
+            if float(params.get("post_at") or 0) <= time.time():
+                return {"ok": False, "error": "time_in_past"}
+            with self._lock:
+                self._scheduled_count += 1
+                message_id = f"Q{self._scheduled_count:010d}"
+                self.scheduled[message_id] = params.get("channel")
+            return {"ok": True, "channel": params.get("channel"), "scheduled_message_id": message_id, "post_at": int(params["post_at"])}
+        if method == "chat.deleteScheduledMessage":
+            with self._lock:
+                if self.scheduled.pop(params.get("scheduled_message_id"), None) is None:
+                    return {"ok": False, "error": "invalid_scheduled_message_id"}
+            return {"ok": True}
+        if method == "chat.update":
+            if not params.get("ts"):
+                return {"ok": False, "error": "message_not_found"}
+            return {"ok": True, "channel": params.get("channel"), "ts": params["ts"]}
+        if method == "views.open":
+            if not params.get("trigger_id"):
+                return {"ok": False, "error": "invalid_trigger_id"}
+            view = params.get("view")
+            view = json.loads(view) if isinstance(view, str) else view or {}
+            return {"ok": True, "view": dict(view, id=f"V{self.calls[method]:08d}")}
+        return {"ok": True}
+
+    def _build_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this, keep-alive clients stall on delayed ACKs
+            disable_nagle_algorithm = True
+
+            def _respond(self, params: dict):
+                method = urlparse(self.path).path.rsplit("/", 1)[-1]
+                status, headers = server.admit(method, params)
+                if status:
+                    payload = json.dumps({"ok": False, "error": "ratelimited" if status == 429 else "service_unavailable"}).encode("utf-8")
+                else:
+                    status, headers = 200, {}
+                    payload = json.dumps(server.dispatch(method, params)).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._respond(dict(parse_qsl(urlparse(self.path).query)))
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                params = dict(parse_qsl(urlparse(self.path).query))
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    params.update(json.loads(body or b"{}"))
+                else:
+                    params.update(parse_qsl(body.decode("utf-8")))
+                self._respond(params)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=3001)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--invalid-domain", action="append", default=[])
+    parser.add_argument("--rate-limits", action="store_true")
+    parser.add_argument("--time-scale", type=float, default=1.0)
+    args = parser.parse_args()
+    with FakeSlackServer(port=args.port, latency=args.latency, error_rate=args.error_rate, invalid_domains=args.invalid_domain, rate_limits=args.rate_limits, time_scale=args.time_scale) as server:
+        print(f"Fake Slack API listening on {server.base_url}")
+        threading.Event().wait()
@@ -0,0 +1,125 @@
+"""End-to-end campaign load test against the fake Slack API.
+
+Submits the shortcut modal through handle_shortcut_submission_events with 100, 1k and 10k recipients and
+reports wall time, API calls per recipient, retried calls (429s and 503s) and peak RSS. Each size runs in its own
+process so the memory peaks don't carry over:
+
+    python benchmarks/load_test.py --recipients 100 1000 10000 --time-scale 60
+
+--time-scale speeds Slack's rate limits up by the same factor on both the fake server and the bot's
+rate-limit governor, so a 10k run that would take 20 minutes against Slack finishes in seconds.
+"""
+import io
+import os
+import sys
+import time
+import logging
+import argparse
+import resource
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Read at import by the bot's modules, so set before importing them
+os.environ.setdefault("LOG_CHANNEL", "C_LOG")
+os.environ["CAMPAIGN_QUEUE_BACKEND"] = "memory"
+
+from slack_bolt import App
+
+import listeners
+import rate_limits
+import canvas_writer
+import campaign_queue
+import directory_index
+import slack_clients
+from fake_slack import FakeSlackServer
+
+SCHEDULES = {
+    "tentative_schedule": "2026-11-02",
+    "alternate_schedule_1": "2026-11-09",
+    "alternate_schedule_2": "2026-11-16",
+    "alternate_schedule_3": "2026-11-23",
+    "alternate_schedule_4": "2026-11-30",
+    "alternate_schedule_5": "2026-12-07",
+}
+
+def build_recipients(count: int, invalid_share: float, directory_share: float) -> tuple[list[str], list[str]]:
+    """Returns (emails to submit, emails users.list knows about)."""
+    invalid_every = round(1 / invalid_share) if invalid_share else 0
+    emails = [f"invalid{i}@example.com" if invalid_every and i % invalid_every == 0 else f"user{i}@example.com" for i in range(count)]
+    valid = [email for email in emails if not email.startswith("invalid")]
+    return emails, valid[:int(len(valid) * directory_share)]
+
+def build_view(emails: list[str], per_minute: int = 0) -> dict:
+    values = {"provided_emails": {"provided_emails-action": {"value": ",".join(emails)}}}
+    if per_minute:
+        values["pacing_per_minute"] = {"pacing_per_minute-action": {"value": str(per_minute)}}
+    for block_id, value in SCHEDULES.items():
+        values[block_id] = {f"{block_id}-action": {"value": value}}
+    return {"state": {"values": values}}
+
+def run(count: int, args) -> dict:
+    emails, directory = build_recipients(count, args.invalid_share, args.directory_share)
+    directory_index._index = None
+    with FakeSlackServer(latency=args.latency, directory=directory, error_rate=args.error_rate, rate_limits=not args.no_rate_limits, time_scale=args.time_scale) as server:
+        governor = rate_limits.RateLimitGovernor(time_scale=args.time_scale)
+        client = slack_clients.build_web_client("xoxb-fake", base_url=server.base_url, governor=governor)
+        app = App(client=client, signing_secret="fake", token_verification_enabled=False)
+        canvas_rows = canvas_writer.CanvasWriteBuffer(client, "F_CANVAS")
+        job_queue = campaign_queue.get_queue("memory")
+        listeners.register_listeners(app, job_queue, canvas_rows)
+        # What the refresh schedule would have saved before the campaign came in
+        directory_index.refresh(client, job_queue)
+
+        summaries = []
+        send_campaign_batch = listeners.send_campaign_batch
+        def recording_send(chunk, batch):
+            summary = send_campaign_batch(chunk, batch)
+            summaries.append(summary)
+            return summary
+        listeners.send_campaign_batch = recording_send
+
+        started = time.perf_counter()
+        try:
+            # The listeners print a banner per batch; keep the report readable
+            with redirect_stdout(io.StringIO()):
+                listeners.handle_shortcut_submission_events(ack=lambda: None, body={}, client=client, logger=logging.getLogger("load_test"), view=build_view(emails, args.per_minute))
+        finally:
+            listeners.send_campaign_batch = send_campaign_batch
+        elapsed = time.perf_counter() - started
+        return {
+            "recipients": count,
+            "sent": sum(summary.sent for summary in summaries),
+            "failed": sum(summary.failed for summary in summaries),
+            "scheduled": sum(1 for summary in summaries for result in summary.results if result.scheduled_message_id),
+            "seconds": elapsed,
+            "calls_per_recipient": server.total_calls / count,
+            "retries": server.total_rejected,
+            # ru_maxrss is in KiB on Linux
+            "peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "calls": dict(server.calls),
+        }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipients", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every fake API call")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="share of calls answered with a 503")
+    parser.add_argument("--invalid-share", type=float, default=0.02, help="share of recipients with no Slack account")
+    parser.add_argument("--directory-share", type=float, default=0.9, help="share of valid recipients returned by users.list")
+    parser.add_argument("--time-scale", type=float, default=60)
+    parser.add_argument("--no-rate-limits", action="store_true", help="never answer 429")
+    parser.add_argument("--per-minute", type=int, default=0, help="pace the campaign with chat.scheduleMessage at this many recipients per minute")
+    parser.add_argument("--verbose", action="store_true", help="print the API calls made per method")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    print(f"{'recipients':>10} {'sent':>6} {'scheduled':>9} {'failed':>6} {'seconds':>8} {'calls/recipient':>16} {'retries':>8} {'peak MB':>8}")
+    for count in args.recipients:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            result = executor.submit(run, count, args).result()
+        print(f"{result['recipients']:>10} {result['sent']:>6} {result['scheduled']:>9} {result['failed']:>6} {result['seconds']:>8.2f} {result['calls_per_recipient']:>16.2f} {result['retries']:>8} {result['peak_mb']:>8.1f}")
+        if args.verbose:
+            print(f"{'':>10} {result['calls']}")
+
+if __name__ == "__main__":
+    main()
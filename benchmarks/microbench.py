@@ -0,0 +1,198 @@
+"""Microbenchmarks for the per-recipient and per-click hot paths, with results saved as JSON.
+
+    python benchmarks/microbench.py                       # run and write benchmarks/microbench_results.json
+    python benchmarks/microbench.py --save-baseline       # also store the run as the baseline
+    python benchmarks/microbench.py --compare             # flag cases slower or allocating more than the baseline
+
+Each case is timed as the median of --repeat runs of --number calls, then run once more under tracemalloc to
+record the bytes it allocates per call. --compare exits with status 1 if any case regressed by more than
+--threshold, so it can gate template or handler changes in CI.
+"""
+import io
+import os
+import sys
+import json
+import time
+import timeit
+import logging
+import argparse
+import platform
+import statistics
+import tracemalloc
+from contextlib import redirect_stdout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import listeners
+import ui_templates
+import canvas_writer
+import metadata_codec
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PATH = os.path.join(BENCH_DIR, "microbench_results.json")
+BASELINE_PATH = os.path.join(BENCH_DIR, "microbench_baseline.json")
+# Timing noise between runs on one machine stays well under this; anything above it is worth a look
+REGRESSION_THRESHOLD = 0.2
+
+SCHEDULES = {
+    "windows_version": "Windows 11 24H2",
+    "tentative_schedule": "March 2",
+    "alternate_schedule_1": "March 9",
+    "alternate_schedule_2": "March 16",
+    "alternate_schedule_3": "March 23",
+    "alternate_schedule_4": "March 30",
+    "alternate_schedule_5": "April 6",
+}
+PRIVATE_METADATA = {
+    "date": "March 16",
+    "message_ts": "1767225600.000100",
+    "channel_id": "D0123456789",
+    "caller_id": "U0123456789",
+    "user_email": "someone@example.com",
+    "windows_version": "Windows 11 24H2",
+}
+CONFIRMATION_MESSAGE = ":spiral_calendar_pad: I am scheduling my Windows upgrade on *March 16*"
+
+class StubClient:
+    """Answers the WebClient methods the handlers call without any I/O."""
+
+    def users_info(self, user):
+        return {"user": {"id": user, "profile": {"email": "someone@example.com"}}}
+
+    def views_open(self, view, trigger_id):
+        return {"ok": True}
+
+    def chat_update(self, channel, ts, text):
+        return {"ok": True}
+
+    def canvases_edit(self, canvas_id, changes):
+        return {"ok": True}
+
+def alternative_choice_body() -> dict:
+    return {
+        "trigger_id": "1234567890.1234567890.abcdef",
+        "user": {"id": "U0123456789"},
+        "actions": [{"action_id": "confirm_reschedule_3", "value": "March 16"}],
+        "message": {"ts": "1767225600.000100"},
+        "container": {"channel_id": "D0123456789"},
+    }
+
+def view_submission_body(view_id: str) -> dict:
+    return {"view": {"id": view_id, "private_metadata": metadata_codec.encode_private_metadata(PRIVATE_METADATA)}}
+
+def build_cases() -> dict:
+    client = StubClient()
+    # Quiet logger: the handlers log the whole body at INFO, which would otherwise dominate the timings
+    logger = logging.getLogger("microbench")
+    logger.setLevel(logging.WARNING)
+    listeners.canvas_rows = canvas_writer.CanvasWriteBuffer(client, "F_CANVAS", flush_rows=10**9)
+    listeners.flush_canvas_each_time = False
+    blocks = ui_templates.build_blocks_message(SCHEDULES, SCHEDULES["windows_version"])
+    confirmation_modal = ui_templates.build_confirmation_modal(PRIVATE_METADATA, CONFIRMATION_MESSAGE)
+    shortcut_modal = ui_templates.build_shortcut_modal("private_metadata")
+    alternative_body = alternative_choice_body()
+    view_ids = iter(range(10**12))
+
+    def build_blocks_message_cold():
+        ui_templates._render_blocks_message.cache_clear()
+        ui_templates.build_blocks_message(SCHEDULES, SCHEDULES["windows_version"])
+
+    def submit_view():
+        # A new view ID each call, or the canvas buffer drops the row as a duplicate
+        listeners.handle_view_submission_events(view_submission_body(f"V{next(view_ids)}"), client, logger)
+
+    return {
+        "build_blocks_message": lambda: ui_templates.build_blocks_message(SCHEDULES, SCHEDULES["windows_version"]),
+        "build_blocks_message_cold": build_blocks_message_cold,
+        "build_blocks_message_json": lambda: ui_templates.build_blocks_message_json(SCHEDULES, SCHEDULES["windows_version"]),
+        "build_confirmation_modal": lambda: ui_templates.build_confirmation_modal(PRIVATE_METADATA, CONFIRMATION_MESSAGE),
+        "build_shortcut_modal": lambda: ui_templates.build_shortcut_modal("private_metadata"),
+        "json_blocks_message": lambda: json.dumps(blocks),
+        "json_confirmation_modal": lambda: json.dumps(confirmation_modal),
+        "json_shortcut_modal": lambda: json.dumps(shortcut_modal),
+        "handle_alternative_choice": lambda: listeners.handle_alternative_choice(alternative_body, client, logger),
+        "handle_view_submission_events": submit_view,
+    }
+
+def measure(case, number: int, repeat: int) -> dict:
+    timings = timeit.repeat(case, number=number, repeat=repeat)
+    per_call = [timing / number * 1e6 for timing in timings]
+    tracemalloc.start()
+    case()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    case()
+    allocated = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return {"us_per_call": statistics.median(per_call), "min_us_per_call": min(per_call), "alloc_bytes": allocated}
+
+def run(number: int, repeat: int, only: list[str]) -> dict:
+    results = {}
+    # The builders and handlers print a banner per call
+    with redirect_stdout(io.StringIO()):
+        cases = build_cases()
+        for name, case in cases.items():
+            if only and name not in only:
+                continue
+            results[name] = measure(case, number, repeat)
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "number": number,
+        "repeat": repeat,
+        "results": results,
+    }
+
+def compare(run_results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Returns a line per case and metric that got worse than the baseline by more than threshold."""
+    regressions = []
+    for name, result in run_results["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        for metric in ("us_per_call", "alloc_bytes"):
+            # Allow a little absolute slack so a case allocating a few bytes can't flag on noise
+            if result[metric] > before[metric] * (1 + threshold) + (0.5 if metric == "us_per_call" else 64):
+                regressions.append(f"{name}: {metric} {before[metric]:,.2f} -> {result[metric]:,.2f}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=2000, help="calls per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per case; the median is reported")
+    parser.add_argument("--only", nargs="*", default=[], help="case names to run")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    run_results = run(args.number, args.repeat, args.only)
+    baseline = None
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print(f"{'case':<32} {'us/call':>9} {'min us':>9} {'bytes/call':>11} {'vs baseline':>12}")
+    for name, result in run_results["results"].items():
+        change = ""
+        if baseline and name in baseline["results"]:
+            change = f"{result['us_per_call'] / baseline['results'][name]['us_per_call'] - 1:+.0%}"
+        print(f"{name:<32} {result['us_per_call']:>9.2f} {result['min_us_per_call']:>9.2f} {result['alloc_bytes']:>11,} {change:>12}")
+
+    with open(args.output, "w") as f:
+        json.dump(run_results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(run_results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    if baseline:
+        regressions = compare(run_results, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,722 @@
+import os
+import json
+import math
+import asyncio
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+import itertools
+from collections import deque
+from contextlib import closing
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, Iterable, Iterator, Optional
+
+import fanout
+import redis_client
+
+CAMPAIGN_QUEUE_BACKEND = os.getenv("CAMPAIGN_QUEUE_BACKEND", os.getenv("STATE_BACKEND", "memory"))
+CAMPAIGN_QUEUE_URL = os.getenv("CAMPAIGN_QUEUE_URL")
+CAMPAIGN_CHECKPOINT_TABLE = os.getenv("CAMPAIGN_CHECKPOINT_TABLE")
+CAMPAIGN_QUEUE_PATH = os.getenv("CAMPAIGN_QUEUE_PATH", "/tmp/campaign_queue.sqlite3")
+CAMPAIGN_CHUNK_SIZE = int(os.getenv("CAMPAIGN_CHUNK_SIZE", "100"))
+CAMPAIGN_WORKERS = int(os.getenv("CAMPAIGN_WORKERS", "4"))
+# Chunks the asyncio process sends at once; each sends a whole chunk per batch, bounded by the fan-out semaphore
+ASYNC_CAMPAIGN_WORKERS = int(os.getenv("ASYNC_CAMPAIGN_WORKERS", "8"))
+# Stop taking new batches when the Lambda has less than this left, so the checkpoint is written before the timeout
+DEADLINE_MARGIN_SECONDS = 2.0
+VISIBILITY_TIMEOUT_SECONDS = 60
+# How long a serve_workers worker waits before looking at an empty queue again
+POLL_SECONDS = float(os.getenv("CAMPAIGN_POLL_SECONDS", "1"))
+# Reschedule buttons are clicked weeks after the send, so campaign records outlive the 7-day checkpoints
+CAMPAIGN_TTL_SECONDS = 90 * 24 * 3600
+# What a chunk's entries are for: recipients to message, or "<channel> <message id> <post_at>" scheduled messages to delete
+SEND = "send"
+CANCEL = "cancel"
+# Scheduled message IDs are spread over this many DynamoDB items per campaign, to stay under the 400 KB item limit
+SCHEDULED_SHARDS = 16
+# BatchGetItem takes at most this many keys per call
+DYNAMODB_BATCH_GET = 100
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class Chunk:
+    campaign_id: str
+    chunk_index: int
+    emails: list[str]
+    schedules: dict[str, str]
+    windows_version: str
+    # Campaign-wide, so whichever worker finishes the last recipient can close out the progress message
+    total: int = 0
+    progress_channel: Optional[str] = None
+    progress_ts: Optional[str] = None
+    # Position of the chunk's first recipient in the campaign, which paced campaigns turn into a delivery time
+    offset: int = 0
+    action: str = SEND
+
+    @property
+    def key(self) -> str:
+        return f"{self.campaign_id}#{self.chunk_index}" if self.action == SEND else f"{self.campaign_id}#{self.action}#{self.chunk_index}"
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, body: str) -> "Chunk":
+        return cls(**json.loads(body))
+
+@dataclass
+class Progress:
+    """Campaign-wide counts after a batch was added; before_done is what done was just before it.
+
+    A batch that was already counted (a redelivered chunk re-sending it) adds nothing, so before_done == done.
+    """
+    sent: int = 0
+    failed: int = 0
+    skipped: int = 0
+    before_done: int = 0
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.failed + self.skipped
+
+@dataclass
+class Job:
+    receipt: str
+    chunk: Chunk
+
+def iter_campaign_chunks(emails: Iterable[str], schedules: dict[str, str], windows_version: str, chunk_size: int = CAMPAIGN_CHUNK_SIZE, campaign_id: Optional[str] = None, **campaign) -> Iterator[Chunk]:
+    """Splits a campaign into fixed size recipient chunks sharing one campaign_id, reading emails lazily.
+
+    Pass a campaign_id that is stable across Slack retries (the submitted view's ID) so the per-recipient
+    idempotency keys of a retried submission match the first one. campaign sets the remaining Chunk fields
+    (total, progress_channel, progress_ts) on every chunk.
+    """
+    campaign_id = campaign_id or uuid.uuid4().hex
+    emails = (email.strip() for email in emails if email.strip())
+    for index in itertools.count():
+        batch = list(itertools.islice(emails, chunk_size))
+        if not batch:
+            return
+        yield Chunk(campaign_id, index, batch, schedules, windows_version, **campaign, offset=index * chunk_size)
+
+def split_campaign(emails: Iterable[str], schedules: dict[str, str], windows_version: str, chunk_size: int = CAMPAIGN_CHUNK_SIZE, campaign_id: Optional[str] = None, **campaign) -> list[Chunk]:
+    return list(iter_campaign_chunks(emails, schedules, windows_version, chunk_size, campaign_id, **campaign))
+
+class InMemoryQueue:
+    """Process-local queue for tests and socket mode; nothing survives a restart."""
+
+    def __init__(self):
+        self._pending = deque()
+        self._checkpoints = {}
+        self._progress: dict[str, Progress] = {}
+        # (campaign_id, chunk_index) -> how many of the chunk's recipients are already in the counts
+        self._counted: dict[tuple[str, int], int] = {}
+        self._failures: dict[str, dict[str, list[str]]] = {}
+        self._campaigns: dict[str, str] = {}
+        self._scheduled: dict[str, set[tuple]] = {}
+        self._cancelled: set[str] = set()
+        self._directory: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def enqueue(self, chunk: Chunk):
+        with self._lock:
+            self._pending.append(chunk)
+
+    def receive(self) -> Optional[Job]:
+        with self._lock:
+            if not self._pending:
+                return None
+            chunk = self._pending.popleft()
+        return Job(receipt=chunk.key, chunk=chunk)
+
+    def ack(self, job: Job):
+        pass
+
+    def release(self, job: Job):
+        self.enqueue(job.chunk)
+
+    def get_checkpoint(self, chunk: Chunk) -> int:
+        with self._lock:
+            return self._checkpoints.get(chunk.key, 0)
+
+    def set_checkpoint(self, chunk: Chunk, sent: int):
+        with self._lock:
+            self._checkpoints[chunk.key] = sent
+
+    def add_progress(self, campaign_id: str, sent: int, failed: int, skipped: int, failures: dict[str, list[str]], chunk_index: Optional[int] = None, batch_start: int = 0) -> Progress:
+        with self._lock:
+            progress = self._progress.setdefault(campaign_id, Progress())
+            if chunk_index is not None:
+                if self._counted.get((campaign_id, chunk_index), 0) > batch_start:
+                    return Progress(progress.sent, progress.failed, progress.skipped, progress.done)
+                self._counted[(campaign_id, chunk_index)] = batch_start + sent + failed + skipped
+            progress.before_done = progress.done
+            progress.sent += sent
+            progress.failed += failed
+            progress.skipped += skipped
+            for code, emails in failures.items():
+                self._failures.setdefault(campaign_id, {}).setdefault(code, []).extend(emails)
+            return Progress(progress.sent, progress.failed, progress.skipped, progress.before_done)
+
+    def get_failures(self, campaign_id: str) -> dict[str, list[str]]:
+        with self._lock:
+            return {code: list(emails) for code, emails in self._failures.get(campaign_id, {}).items()}
+
+    def put_campaign(self, campaign_id: str, body: str):
+        with self._lock:
+            self._campaigns[campaign_id] = body
+
+    def get_campaign(self, campaign_id: str) -> Optional[str]:
+        with self._lock:
+            return self._campaigns.get(campaign_id)
+
+    def add_scheduled(self, campaign_id: str, chunk_index: int, scheduled: list[tuple]):
+        with self._lock:
+            self._scheduled.setdefault(campaign_id, set()).update(scheduled)
+
+    def get_scheduled(self, campaign_id: str) -> list[tuple]:
+        with self._lock:
+            return sorted(self._scheduled.get(campaign_id, ()), key=lambda entry: entry[2])
+
+    def cancel_campaign(self, campaign_id: str):
+        with self._lock:
+            self._cancelled.add(campaign_id)
+
+    def is_cancelled(self, campaign_id: str) -> bool:
+        with self._lock:
+            return campaign_id in self._cancelled
+
+    def put_directory(self, name: str, body: str):
+        with self._lock:
+            self._directory[name] = body
+
+    def get_directory(self, names: list[str]) -> dict[str, str]:
+        with self._lock:
+            return {name: self._directory[name] for name in names if name in self._directory}
+
+class SQLiteQueue:
+    """File-backed queue with visibility timeouts; safe to share between threads and local processes."""
+
+    def __init__(self, path: str = CAMPAIGN_QUEUE_PATH, visibility_timeout: float = VISIBILITY_TIMEOUT_SECONDS):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        with closing(self._connect()) as conn, conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS chunks (chunk_key TEXT PRIMARY KEY, body TEXT NOT NULL, visible_at REAL NOT NULL, done INTEGER NOT NULL DEFAULT 0)")
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_pending ON chunks (done, visible_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS checkpoints (chunk_key TEXT PRIMARY KEY, sent INTEGER NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS progress (campaign_id TEXT PRIMARY KEY, sent INTEGER NOT NULL, failed INTEGER NOT NULL, skipped INTEGER NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS progress_batches (campaign_id TEXT NOT NULL, chunk_index INTEGER NOT NULL, counted INTEGER NOT NULL, PRIMARY KEY (campaign_id, chunk_index))")
+            conn.execute("CREATE TABLE IF NOT EXISTS failures (campaign_id TEXT NOT NULL, error TEXT NOT NULL, email TEXT NOT NULL, PRIMARY KEY (campaign_id, error, email))")
+            conn.execute("CREATE TABLE IF NOT EXISTS campaigns (campaign_id TEXT PRIMARY KEY, body TEXT NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS scheduled (campaign_id TEXT NOT NULL, channel TEXT NOT NULL, message_id TEXT NOT NULL, post_at REAL NOT NULL, "
+                "PRIMARY KEY (campaign_id, message_id))"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS cancelled (campaign_id TEXT PRIMARY KEY, cancelled_at REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS directory (name TEXT PRIMARY KEY, body TEXT NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def enqueue(self, chunk: Chunk):
+        with closing(self._connect()) as conn:
+            conn.execute("INSERT OR IGNORE INTO chunks (chunk_key, body, visible_at) VALUES (?, ?, 0)", (chunk.key, chunk.to_json()))
+
+    def receive(self) -> Optional[Job]:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            # BEGIN IMMEDIATE takes the write lock up front so two workers can't claim the same row
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT chunk_key, body FROM chunks WHERE done = 0 AND visible_at <= ? ORDER BY rowid LIMIT 1", (now,)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute("UPDATE chunks SET visible_at = ? WHERE chunk_key = ?", (now + self.visibility_timeout, row[0]))
+            conn.execute("COMMIT")
+        return Job(receipt=row[0], chunk=Chunk.from_json(row[1]))
+
+    def ack(self, job: Job):
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE chunks SET done = 1 WHERE chunk_key = ?", (job.receipt,))
+
+    def release(self, job: Job):
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE chunks SET visible_at = 0 WHERE chunk_key = ?", (job.receipt,))
+
+    def get_checkpoint(self, chunk: Chunk) -> int:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT sent FROM checkpoints WHERE chunk_key = ?", (chunk.key,)).fetchone()
+        return row[0] if row else 0
+
+    def set_checkpoint(self, chunk: Chunk, sent: int):
+        with closing(self._connect()) as conn:
+            conn.execute("INSERT OR REPLACE INTO checkpoints (chunk_key, sent) VALUES (?, ?)", (chunk.key, sent))
+
+    def add_progress(self, campaign_id: str, sent: int, failed: int, skipped: int, failures: dict[str, list[str]], chunk_index: Optional[int] = None, batch_start: int = 0) -> Progress:
+        """Adds a batch's counts unless the chunk's counted mark is already past batch_start, in the same transaction."""
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if chunk_index is not None:
+                counted = conn.execute("SELECT counted FROM progress_batches WHERE campaign_id = ? AND chunk_index = ?", (campaign_id, chunk_index)).fetchone()
+                if counted and counted[0] > batch_start:
+                    row = conn.execute("SELECT sent, failed, skipped FROM progress WHERE campaign_id = ?", (campaign_id,)).fetchone() or (0, 0, 0)
+                    conn.execute("COMMIT")
+                    return Progress(*row, before_done=sum(row))
+                conn.execute(
+                    "INSERT OR REPLACE INTO progress_batches (campaign_id, chunk_index, counted) VALUES (?, ?, ?)",
+                    (campaign_id, chunk_index, batch_start + sent + failed + skipped)
+                )
+            row = conn.execute(
+                "INSERT INTO progress (campaign_id, sent, failed, skipped) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (campaign_id) DO UPDATE SET sent = sent + excluded.sent, failed = failed + excluded.failed, skipped = skipped + excluded.skipped "
+                "RETURNING sent, failed, skipped",
+                (campaign_id, sent, failed, skipped)
+            ).fetchone()
+            conn.executemany(
+                "INSERT OR IGNORE INTO failures (campaign_id, error, email) VALUES (?, ?, ?)",
+                [(campaign_id, code, email) for code, emails in failures.items() for email in emails]
+            )
+            conn.execute("COMMIT")
+        return Progress(*row, before_done=sum(row) - sent - failed - skipped)
+
+    def get_failures(self, campaign_id: str) -> dict[str, list[str]]:
+        failures = {}
+        with closing(self._connect()) as conn:
+            for code, email in conn.execute("SELECT error, email FROM failures WHERE campaign_id = ? ORDER BY rowid", (campaign_id,)):
+                failures.setdefault(code, []).append(email)
+        return failures
+
+    def put_campaign(self, campaign_id: str, body: str):
+        with closing(self._connect()) as conn:
+            conn.execute("INSERT OR REPLACE INTO campaigns (campaign_id, body) VALUES (?, ?)", (campaign_id, body))
+
+    def get_campaign(self, campaign_id: str) -> Optional[str]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT body FROM campaigns WHERE campaign_id = ?", (campaign_id,)).fetchone()
+        return row[0] if row else None
+
+    def add_scheduled(self, campaign_id: str, chunk_index: int, scheduled: list[tuple]):
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO scheduled (campaign_id, channel, message_id, post_at) VALUES (?, ?, ?, ?)",
+                [(campaign_id, *entry) for entry in scheduled]
+            )
+
+    def get_scheduled(self, campaign_id: str) -> list[tuple]:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT channel, message_id, post_at FROM scheduled WHERE campaign_id = ? ORDER BY post_at", (campaign_id,)).fetchall()
+
+    def cancel_campaign(self, campaign_id: str):
+        with closing(self._connect()) as conn:
+            conn.execute("INSERT OR IGNORE INTO cancelled (campaign_id, cancelled_at) VALUES (?, ?)", (campaign_id, time.time()))
+
+    def is_cancelled(self, campaign_id: str) -> bool:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT 1 FROM cancelled WHERE campaign_id = ?", (campaign_id,)).fetchone() is not None
+
+    def put_directory(self, name: str, body: str):
+        with closing(self._connect()) as conn:
+            conn.execute("INSERT OR REPLACE INTO directory (name, body) VALUES (?, ?)", (name, body))
+
+    def get_directory(self, names: list[str]) -> dict[str, str]:
+        with closing(self._connect()) as conn:
+            return dict(conn.execute(f"SELECT name, body FROM directory WHERE name IN ({', '.join('?' * len(names))})", names)) if names else {}
+
+class SQSQueue:
+    """SQS for chunk delivery with checkpoints in DynamoDB, since an SQS message body can't be rewritten."""
+
+    def __init__(self, queue_url: str = CAMPAIGN_QUEUE_URL, checkpoint_table: str = CAMPAIGN_CHECKPOINT_TABLE):
+        # boto3 is only needed on this path, so keep it out of module import time
+        import boto3
+        self.queue_url = queue_url
+        self.sqs = boto3.client("sqs")
+        self.dynamodb = boto3.resource("dynamodb")
+        self.table = self.dynamodb.Table(checkpoint_table)
+
+    def enqueue(self, chunk: Chunk):
+        self.sqs.send_message(QueueUrl=self.queue_url, MessageBody=chunk.to_json())
+
+    def receive(self) -> Optional[Job]:
+        response = self.sqs.receive_message(QueueUrl=self.queue_url, MaxNumberOfMessages=1, WaitTimeSeconds=1)
+        messages = response.get("Messages", [])
+        if not messages:
+            return None
+        return Job(receipt=messages[0]["ReceiptHandle"], chunk=Chunk.from_json(messages[0]["Body"]))
+
+    def ack(self, job: Job):
+        self.sqs.delete_message(QueueUrl=self.queue_url, ReceiptHandle=job.receipt)
+
+    def release(self, job: Job):
+        self.sqs.change_message_visibility(QueueUrl=self.queue_url, ReceiptHandle=job.receipt, VisibilityTimeout=0)
+
+    def get_checkpoint(self, chunk: Chunk) -> int:
+        item = self.table.get_item(Key={"chunk_key": chunk.key}, ConsistentRead=True).get("Item")
+        return int(item["sent"]) if item else 0
+
+    def set_checkpoint(self, chunk: Chunk, sent: int):
+        self.table.put_item(Item={"chunk_key": chunk.key, "sent": sent, "expires_at": int(time.time()) + 7 * 24 * 3600})
+
+    def add_progress(self, campaign_id: str, sent: int, failed: int, skipped: int, failures: dict[str, list[str]], chunk_index: Optional[int] = None, batch_start: int = 0) -> Progress:
+        """Atomic ADDs on one item per campaign; failed addresses go into a string set per error code.
+
+        The same update moves the chunk's counted:<chunk index> mark past the batch, on condition that it isn't
+        already past batch_start, so a redelivered batch is counted once.
+        """
+        from botocore.exceptions import ClientError
+        counts = {"sent": sent, "failed": failed, "skipped": skipped}
+        sets = {f"failed:{code}": set(emails) for code, emails in failures.items() if emails}
+        def update(attributes: dict):
+            names = {f"#a{index}": name for index, name in enumerate(attributes)}
+            values = {f":a{index}": value for index, value in enumerate(attributes.values())}
+            condition = {}
+            sets_expression = "SET expires_at = :expires_at"
+            if chunk_index is not None:
+                names["#counted"] = f"counted:{chunk_index}"
+                values.update({":counted": batch_start + sent + failed + skipped, ":batch_start": batch_start})
+                sets_expression += ", #counted = :counted"
+                condition["ConditionExpression"] = "attribute_not_exists(#counted) OR #counted <= :batch_start"
+            return self.table.update_item(
+                Key={"chunk_key": f"{campaign_id}#progress"},
+                UpdateExpression="ADD " + ", ".join(f"#a{index} :a{index}" for index in range(len(attributes))) + " " + sets_expression,
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues={**values, ":expires_at": int(time.time()) + 7 * 24 * 3600},
+                ReturnValues="UPDATED_NEW",
+                **condition
+            )["Attributes"]
+        try:
+            attributes = update({**counts, **sets})
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                item = self.table.get_item(Key={"chunk_key": f"{campaign_id}#progress"}, ConsistentRead=True).get("Item") or {}
+                totals = [int(item.get(name, 0)) for name in counts]
+                return Progress(*totals, before_done=sum(totals))
+            # Past the 400 KB item limit the addresses no longer fit; keep counting without them
+            if e.response["Error"]["Code"] != "ValidationException" or not sets:
+                raise
+            logger.warning(f"Campaign {campaign_id}: failure list is full, counting failures without their addresses")
+            attributes = update(counts)
+        totals = [int(attributes[name]) for name in counts]
+        return Progress(*totals, before_done=sum(totals) - sent - failed - skipped)
+
+    def get_failures(self, campaign_id: str) -> dict[str, list[str]]:
+        item = self.table.get_item(Key={"chunk_key": f"{campaign_id}#progress"}, ConsistentRead=True).get("Item") or {}
+        return {name[len("failed:"):]: sorted(emails) for name, emails in item.items() if name.startswith("failed:")}
+
+    def put_campaign(self, campaign_id: str, body: str):
+        self.table.put_item(Item={"chunk_key": f"{campaign_id}#campaign", "body": body, "expires_at": int(time.time()) + CAMPAIGN_TTL_SECONDS})
+
+    def get_campaign(self, campaign_id: str) -> Optional[str]:
+        item = self.table.get_item(Key={"chunk_key": f"{campaign_id}#campaign"}).get("Item")
+        return item["body"] if item else None
+
+    def add_scheduled(self, campaign_id: str, chunk_index: int, scheduled: list[tuple]):
+        """Adds "<channel> <message id> <post_at>" entries to a string set on one of the campaign's shard items."""
+        from botocore.exceptions import ClientError
+        try:
+            self.table.update_item(
+                Key={"chunk_key": f"{campaign_id}#scheduled#{chunk_index % SCHEDULED_SHARDS}"},
+                UpdateExpression="ADD entries :entries SET expires_at = :expires_at",
+                ExpressionAttributeValues={
+                    ":entries": {f"{channel} {message_id} {int(post_at)}" for channel, message_id, post_at in scheduled},
+                    ":expires_at": int(time.time()) + CAMPAIGN_TTL_SECONDS
+                }
+            )
+        except ClientError as e:
+            # Past the 400 KB item limit (roughly 150k scheduled recipients per campaign)
+            if e.response["Error"]["Code"] != "ValidationException":
+                raise
+            logger.error(f"Campaign {campaign_id}: scheduled message list is full, {len(scheduled)} messages can't be cancelled")
+
+    def get_scheduled(self, campaign_id: str) -> list[tuple]:
+        keys = [{"chunk_key": f"{campaign_id}#scheduled#{shard}"} for shard in range(SCHEDULED_SHARDS)]
+        request = {self.table.name: {"Keys": keys, "ConsistentRead": True}}
+        entries = []
+        while request:
+            response = self.dynamodb.batch_get_item(RequestItems=request)
+            for item in response["Responses"].get(self.table.name, []):
+                for entry in item.get("entries", ()):
+                    channel, message_id, post_at = entry.split(" ")
+                    entries.append((channel, message_id, float(post_at)))
+            request = response.get("UnprocessedKeys")
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def cancel_campaign(self, campaign_id: str):
+        self.table.put_item(Item={"chunk_key": f"{campaign_id}#cancelled", "cancelled_at": int(time.time()), "expires_at": int(time.time()) + CAMPAIGN_TTL_SECONDS})
+
+    def is_cancelled(self, campaign_id: str) -> bool:
+        return "Item" in self.table.get_item(Key={"chunk_key": f"{campaign_id}#cancelled"}, ConsistentRead=True)
+
+    def put_directory(self, name: str, body: str):
+        self.table.put_item(Item={"chunk_key": f"directory#{name}", "body": body, "expires_at": int(time.time()) + 7 * 24 * 3600})
+
+    def get_directory(self, names: list[str]) -> dict[str, str]:
+        found = {}
+        for start in range(0, len(names), DYNAMODB_BATCH_GET):
+            keys = [{"chunk_key": f"directory#{name}"} for name in names[start:start + DYNAMODB_BATCH_GET]]
+            request = {self.table.name: {"Keys": keys, "ConsistentRead": True}}
+            while request:
+                response = self.dynamodb.batch_get_item(RequestItems=request)
+                for item in response["Responses"].get(self.table.name, []):
+                    found[item["chunk_key"][len("directory#"):]] = item["body"]
+                request = response.get("UnprocessedKeys")
+        return found
+
+# Claims the oldest visible chunk by pushing its visibility out; one script, so two replicas can't claim the same chunk
+RECEIVE_SCRIPT = """
+local chunk_key = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 1)[1]
+if not chunk_key then
+    return nil
+end
+redis.call('ZADD', KEYS[1], ARGV[2], chunk_key)
+return {chunk_key, redis.call('HGET', KEYS[2], chunk_key)}
+"""
+
+# Adds a batch's counts and failures unless the chunk's counted mark (a field of KEYS[3]) is already past the batch
+ADD_PROGRESS_SCRIPT = """
+local chunk_index, batch_start, ttl = ARGV[1], tonumber(ARGV[2]), tonumber(ARGV[3])
+local counts = {tonumber(ARGV[4]), tonumber(ARGV[5]), tonumber(ARGV[6])}
+if chunk_index ~= '' then
+    if tonumber(redis.call('HGET', KEYS[3], chunk_index) or '0') > batch_start then
+        local totals = redis.call('HMGET', KEYS[1], 'sent', 'failed', 'skipped')
+        return {0, tonumber(totals[1] or '0'), tonumber(totals[2] or '0'), tonumber(totals[3] or '0')}
+    end
+    redis.call('HSET', KEYS[3], chunk_index, batch_start + counts[1] + counts[2] + counts[3])
+    redis.call('EXPIRE', KEYS[3], ttl)
+end
+local totals = {
+    redis.call('HINCRBY', KEYS[1], 'sent', counts[1]),
+    redis.call('HINCRBY', KEYS[1], 'failed', counts[2]),
+    redis.call('HINCRBY', KEYS[1], 'skipped', counts[3])
+}
+redis.call('EXPIRE', KEYS[1], ttl)
+if #ARGV > 6 then
+    redis.call('HSET', KEYS[2], unpack(ARGV, 7))
+    redis.call('EXPIRE', KEYS[2], ttl)
+end
+return {1, totals[1], totals[2], totals[3]}
+"""
+
+class RedisQueue:
+    """Redis-backed queue shared by every Socket Mode replica, with the same visibility timeouts as SQLiteQueue.
+
+    Pending chunks are a sorted set scored by when they next become visible (their enqueue time, so the oldest goes
+    first), with the bodies in a hash. Like SQS, an acked chunk is forgotten. Checkpoints, progress and campaign
+    records are plain keys that expire like their DynamoDB counterparts.
+    """
+
+    def __init__(self, client=None, visibility_timeout: float = VISIBILITY_TIMEOUT_SECONDS):
+        self.redis = client or redis_client.get_redis()
+        self.visibility_timeout = visibility_timeout
+        self.pending = redis_client.key("campaign_queue", "pending")
+        self.bodies = redis_client.key("campaign_queue", "chunks")
+        self._receive = self.redis.register_script(RECEIVE_SCRIPT)
+        self._add_progress = self.redis.register_script(ADD_PROGRESS_SCRIPT)
+
+    def enqueue(self, chunk: Chunk):
+        with self.redis.pipeline() as pipe:
+            pipe.hset(self.bodies, chunk.key, chunk.to_json())
+            # NX leaves a chunk that's already in flight alone
+            pipe.zadd(self.pending, {chunk.key: time.time()}, nx=True)
+            pipe.execute()
+
+    def receive(self) -> Optional[Job]:
+        now = time.time()
+        claimed = self._receive(keys=[self.pending, self.bodies], args=[now, now + self.visibility_timeout])
+        if claimed is None:
+            return None
+        return Job(receipt=claimed[0], chunk=Chunk.from_json(claimed[1]))
+
+    def ack(self, job: Job):
+        with self.redis.pipeline() as pipe:
+            pipe.zrem(self.pending, job.receipt)
+            pipe.hdel(self.bodies, job.receipt)
+            pipe.execute()
+
+    def release(self, job: Job):
+        self.redis.zadd(self.pending, {job.receipt: 0}, xx=True)
+
+    def get_checkpoint(self, chunk: Chunk) -> int:
+        return int(self.redis.get(redis_client.key("checkpoint", chunk.key)) or 0)
+
+    def set_checkpoint(self, chunk: Chunk, sent: int):
+        self.redis.set(redis_client.key("checkpoint", chunk.key), sent, ex=7 * 24 * 3600)
+
+    def add_progress(self, campaign_id: str, sent: int, failed: int, skipped: int, failures: dict[str, list[str]], chunk_index: Optional[int] = None, batch_start: int = 0) -> Progress:
+        """One script, so the totals returned include exactly this batch; failures map email to error code."""
+        addresses = [value for code, emails in failures.items() for email in emails for value in (email, code)]
+        applied, *totals = self._add_progress(
+            keys=[redis_client.key("progress", campaign_id), redis_client.key("failures", campaign_id), redis_client.key("progress_batches", campaign_id)],
+            args=["" if chunk_index is None else chunk_index, batch_start, 7 * 24 * 3600, sent, failed, skipped, *addresses]
+        )
+        return Progress(*totals, before_done=sum(totals) - (sent + failed + skipped if applied else 0))
+
+    def get_failures(self, campaign_id: str) -> dict[str, list[str]]:
+        failures = {}
+        for email, code in self.redis.hgetall(redis_client.key("failures", campaign_id)).items():
+            failures.setdefault(code, []).append(email)
+        return {code: sorted(emails) for code, emails in failures.items()}
+
+    def put_campaign(self, campaign_id: str, body: str):
+        self.redis.set(redis_client.key("campaign", campaign_id), body, ex=CAMPAIGN_TTL_SECONDS)
+
+    def get_campaign(self, campaign_id: str) -> Optional[str]:
+        return self.redis.get(redis_client.key("campaign", campaign_id))
+
+    def add_scheduled(self, campaign_id: str, chunk_index: int, scheduled: list[tuple]):
+        """Adds "<channel> <message id> <post_at>" entries to the campaign's set, like SQSQueue's shard items."""
+        name = redis_client.key("scheduled", campaign_id)
+        with self.redis.pipeline() as pipe:
+            pipe.sadd(name, *(f"{channel} {message_id} {int(post_at)}" for channel, message_id, post_at in scheduled))
+            pipe.expire(name, CAMPAIGN_TTL_SECONDS)
+            pipe.execute()
+
+    def get_scheduled(self, campaign_id: str) -> list[tuple]:
+        entries = []
+        for entry in self.redis.smembers(redis_client.key("scheduled", campaign_id)):
+            channel, message_id, post_at = entry.split(" ")
+            entries.append((channel, message_id, float(post_at)))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def cancel_campaign(self, campaign_id: str):
+        self.redis.set(redis_client.key("cancelled", campaign_id), int(time.time()), ex=CAMPAIGN_TTL_SECONDS)
+
+    def is_cancelled(self, campaign_id: str) -> bool:
+        return bool(self.redis.exists(redis_client.key("cancelled", campaign_id)))
+
+    def put_directory(self, name: str, body: str):
+        self.redis.hset(redis_client.key("directory"), name, body)
+
+    def get_directory(self, names: list[str]) -> dict[str, str]:
+        if not names:
+            return {}
+        return {name: body for name, body in zip(names, self.redis.hmget(redis_client.key("directory"), names)) if body is not None}
+
+def get_queue(backend: str = CAMPAIGN_QUEUE_BACKEND):
+    if backend == "sqs":
+        return SQSQueue()
+    if backend == "sqlite":
+        return SQLiteQueue()
+    if backend == "redis":
+        return RedisQueue()
+    return InMemoryQueue()
+
+def enqueue_campaign(queue, emails: Iterable[str], schedules: dict[str, str], windows_version: str, chunk_size: int = CAMPAIGN_CHUNK_SIZE, campaign_id: Optional[str] = None, **campaign) -> int:
+    """Enqueues each chunk as soon as it is read from emails; returns the number of chunks."""
+    count = 0
+    for chunk in iter_campaign_chunks(emails, schedules, windows_version, chunk_size, campaign_id, **campaign):
+        queue.enqueue(chunk)
+        count += 1
+    return count
+
+def run_chunk(queue, chunk: Chunk, send_batch: Callable[[Chunk, list[str]], fanout.FanoutSummary], batch_size: int = fanout.FANOUT_WORKERS, remaining_seconds: Optional[Callable[[], float]] = None) -> bool:
+    """Sends a chunk from its checkpoint onwards, one fan-out batch at a time.
+
+    Returns False when it stopped early for the deadline; the checkpoint then points at the first unsent batch.
+    """
+    sent = queue.get_checkpoint(chunk)
+    while sent < len(chunk.emails):
+        if remaining_seconds is not None and remaining_seconds() < DEADLINE_MARGIN_SECONDS:
+            return False
+        batch = chunk.emails[sent:sent + batch_size]
+        send_batch(chunk, batch)
+        sent += len(batch)
+        queue.set_checkpoint(chunk, sent)
+    return True
+
+def run_worker(queue, send_batch: Callable[[Chunk, list[str]], fanout.FanoutSummary], remaining_seconds: Optional[Callable[[], float]] = None) -> int:
+    """Pulls chunks until the queue is empty or the deadline is near; returns the number of chunks finished."""
+    finished = 0
+    while remaining_seconds is None or remaining_seconds() >= DEADLINE_MARGIN_SECONDS:
+        job = queue.receive()
+        if job is None:
+            break
+        try:
+            done = run_chunk(queue, job.chunk, send_batch, remaining_seconds=remaining_seconds)
+        except Exception:
+            logger.exception(f"Chunk {job.chunk.key} failed, releasing it for another worker")
+            queue.release(job)
+            break
+        if not done:
+            queue.release(job)
+            break
+        queue.ack(job)
+        finished += 1
+    return finished
+
+def run_workers(queue, send_batch: Callable[[Chunk, list[str]], fanout.FanoutSummary], workers: int = CAMPAIGN_WORKERS, remaining_seconds: Optional[Callable[[], float]] = None) -> int:
+    """Drains the queue with several workers; each pulls its own chunks so throughput grows with the worker count."""
+    counts = []
+    def worker():
+        counts.append(run_worker(queue, send_batch, remaining_seconds))
+    threads = [threading.Thread(target=worker, name=f"campaign-worker-{i}") for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts)
+
+def serve_workers(queue, send_batch: Callable[[Chunk, list[str]], fanout.FanoutSummary], workers: int = CAMPAIGN_WORKERS, stop: Optional[threading.Event] = None, poll_seconds: float = POLL_SECONDS) -> list[threading.Thread]:
+    """Starts workers that keep pulling chunks until stop is set, instead of draining the queue once and returning.
+
+    For long-running processes that share a queue: every replica runs its own pool, so each chunk goes to whichever
+    replica has a worker free. Returns the started threads; set stop and join them to shut down.
+    """
+    stop = stop or threading.Event()
+    # Once stop is set, a worker finishes its current batch, checkpoints it and releases the rest of its chunk
+    remaining_seconds = lambda: 0.0 if stop.is_set() else math.inf
+    def worker():
+        while not stop.is_set():
+            if not run_worker(queue, send_batch, remaining_seconds):
+                stop.wait(poll_seconds)
+    threads = [threading.Thread(target=worker, name=f"campaign-worker-{i}", daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+async def run_chunk_async(queue, chunk: Chunk, send_batch: Callable[[Chunk, list[str]], Awaitable[fanout.FanoutSummary]], batch_size: int = CAMPAIGN_CHUNK_SIZE) -> bool:
+    """run_chunk for a coroutine send_batch; the queue's own calls run on a thread, since its backends block."""
+    sent = await asyncio.to_thread(queue.get_checkpoint, chunk)
+    while sent < len(chunk.emails):
+        batch = chunk.emails[sent:sent + batch_size]
+        await send_batch(chunk, batch)
+        sent += len(batch)
+        await asyncio.to_thread(queue.set_checkpoint, chunk, sent)
+    return True
+
+async def run_worker_async(queue, send_batch: Callable[[Chunk, list[str]], Awaitable[fanout.FanoutSummary]]) -> int:
+    """run_worker for a coroutine send_batch: pulls chunks until the queue is empty."""
+    finished = 0
+    while True:
+        job = await asyncio.to_thread(queue.receive)
+        if job is None:
+            break
+        try:
+            await run_chunk_async(queue, job.chunk, send_batch)
+        except Exception:
+            logger.exception(f"Chunk {job.chunk.key} failed, releasing it for another worker")
+            await asyncio.to_thread(queue.release, job)
+            break
+        await asyncio.to_thread(queue.ack, job)
+        finished += 1
+    return finished
+
+async def run_workers_async(queue, send_batch: Callable[[Chunk, list[str]], Awaitable[fanout.FanoutSummary]], workers: int = ASYNC_CAMPAIGN_WORKERS) -> int:
+    """run_workers with a coroutine per worker instead of a thread."""
+    return sum(await asyncio.gather(*(run_worker_async(queue, send_batch) for _ in range(workers))))
+
+def handle_sqs_event(event: dict, context, queue, send_batch: Callable[[Chunk, list[str]], fanout.FanoutSummary]) -> dict:
+    """Lambda SQS trigger entrypoint; unfinished chunks are reported back so SQS redelivers them after the visibility timeout."""
+    remaining_seconds = lambda: context.get_remaining_time_in_millis() / 1000
+    failures = []
+    for record in event["Records"]:
+        chunk = Chunk.from_json(record["body"])
+        try:
+            if not run_chunk(queue, chunk, send_batch, remaining_seconds=remaining_seconds):
+                failures.append({"itemIdentifier": record["messageId"]})
+        except Exception:
+            logger.exception(f"Chunk {chunk.key} failed")
+            failures.append({"itemIdentifier": record["messageId"]})
+    return {"batchItemFailures": failures}
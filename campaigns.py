@@ -0,0 +1,98 @@
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+from typing import Optional
+
+import pacing
+import ui_templates
+
+# Campaigns never change once created, so a cached one is never stale; this only bounds memory
+CACHED_CAMPAIGNS = 256
+
+@dataclass(frozen=True)
+class Campaign:
+    campaign_id: str
+    windows_version: str
+    schedules: dict[str, str]
+    template: str = ui_templates.DEFAULT_TEMPLATE
+    # Most users who can pick each alternate week; None leaves every week unlimited
+    capacity: Optional[int] = None
+    # Recipients per minute, spread over business hours in each recipient's time zone; 0 sends straight away
+    per_minute: int = 0
+    created_by: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+
+    @classmethod
+    def create(cls, windows_version: str, schedules: dict[str, str], campaign_id: Optional[str] = None, **fields) -> "Campaign":
+        return cls(campaign_id or uuid.uuid4().hex, windows_version, schedules, **fields)
+
+    @property
+    def blocks(self) -> list:
+        """The campaign's message, rendered once per campaign; its buttons carry the campaign ID."""
+        return ui_templates.build_blocks_message(self.schedules, self.windows_version, self.campaign_id, self.template)
+
+    def blocks_without(self, full_weeks: frozenset) -> list:
+        """The campaign's message without the buttons for full weeks, cached per set of full weeks."""
+        return ui_templates.build_blocks_message(self.schedules, self.windows_version, self.campaign_id, self.template, full_weeks)
+
+    @property
+    def weeks(self) -> list[str]:
+        """The weeks the message offers a button for, in button order."""
+        return [self.schedules[schedule] for schedule in ui_templates.ALTERNATE_BLOCKS.values() if self.schedules.get(schedule)]
+
+    @property
+    def capacities(self) -> dict[str, int]:
+        """Capacity per week the message offers a button for; empty when the campaign is unlimited."""
+        return {week: self.capacity for week in self.weeks} if self.capacity else {}
+
+    @property
+    def pacing(self) -> Optional[pacing.Pacing]:
+        return pacing.Pacing.create(self.per_minute, self.created_at) if self.per_minute > 0 else None
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, body: str) -> "Campaign":
+        return cls(**json.loads(body))
+
+class CampaignRegistry:
+    """Campaigns by ID, persisted in the campaign queue's backend and cached in process.
+
+    A lookup is a dict hit once a process has seen the campaign, and one backend read the first time, e.g. in a
+    Lambda container that didn't handle the submission.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+        self._cache: OrderedDict[str, Campaign] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, campaign: Campaign):
+        self.queue.put_campaign(campaign.campaign_id, campaign.to_json())
+        self._remember(campaign)
+
+    def get(self, campaign_id: Optional[str]) -> Optional[Campaign]:
+        if not campaign_id:
+            return None
+        with self._lock:
+            campaign = self._cache.get(campaign_id)
+            if campaign is not None:
+                self._cache.move_to_end(campaign_id)
+                return campaign
+        body = self.queue.get_campaign(campaign_id)
+        if body is None:
+            return None
+        campaign = Campaign.from_json(body)
+        self._remember(campaign)
+        return campaign
+
+    def _remember(self, campaign: Campaign):
+        with self._lock:
+            self._cache[campaign.campaign_id] = campaign
+            self._cache.move_to_end(campaign.campaign_id)
+            while len(self._cache) > CACHED_CAMPAIGNS:
+                self._cache.popitem(last=False)
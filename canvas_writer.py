@@ -0,0 +1,271 @@
+import os
+import json
+import time
+import logging
+import datetime
+import threading
+from zoneinfo import ZoneInfo
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from slack_sdk.errors import SlackApiError
+
+import idempotency
+
+CANVAS_QUEUE_URL = os.getenv("CANVAS_QUEUE_URL")
+CANVAS_FLUSH_ROWS = int(os.getenv("CANVAS_FLUSH_ROWS", "100"))
+CANVAS_FLUSH_SECONDS = float(os.getenv("CANVAS_FLUSH_SECONDS", "2"))
+CANVAS_MAX_RETRIES = 3
+# Channel whose members can read each campaign's canvas; blank leaves it to the link in the main canvas
+CANVAS_SHARE_CHANNEL = os.getenv("CANVAS_SHARE_CHANNEL", os.getenv("LOG_CHANNEL", ""))
+ROW_SEPARATOR = "\n"
+# How many flushed row IDs to remember for dropping duplicate adds
+REMEMBERED_ROWS = 10000
+CANVAS_TITLE = "## Windows upgrade confirmations"
+CANVAS_TIMEZONE = ZoneInfo("America/Los_Angeles")
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class CanvasRow:
+    row_id: str
+    markdown: str
+    # Tells CanvasView which campaign's canvas the row changes; rows queued before it was added have none
+    campaign_id: Optional[str] = None
+
+    def to_json(self) -> str:
+        return json.dumps({"row_id": self.row_id, "markdown": self.markdown, "campaign_id": self.campaign_id}, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, body: str) -> "CanvasRow":
+        return cls(**json.loads(body))
+
+class CanvasWriteBuffer:
+    """Collects confirmation rows and appends them to the canvas as one combined markdown block.
+
+    A flush happens when flush_rows rows are waiting, or, with a flush_interval, when the oldest row is that many
+    seconds old. Rows are keyed by row_id so re-adding a pending or already flushed row is a no-op; with an
+    idempotency store that also holds for rows flushed by another process or an earlier Lambda invocation.
+    """
+
+    def __init__(self, client, canvas_id: str, flush_rows: int = CANVAS_FLUSH_ROWS, flush_interval: float = None, max_retries: int = CANVAS_MAX_RETRIES, store=None):
+        self.client = client
+        self.store = store
+        self.canvas_id = canvas_id
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.api_calls = 0
+        self._pending: OrderedDict[str, str] = OrderedDict()
+        self._flushed: OrderedDict[str, None] = OrderedDict()
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        if flush_interval:
+            threading.Thread(target=self._flush_periodically, name="canvas-writer", daemon=True).start()
+
+    def add(self, row: CanvasRow):
+        with self._lock:
+            if row.row_id in self._pending or row.row_id in self._flushed:
+                return
+            self._pending[row.row_id] = row.markdown
+            self._oldest = self._oldest or time.monotonic()
+            full = len(self._pending) >= self.flush_rows
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """Writes everything pending; returns the number of rows written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending, self._oldest = self._pending, OrderedDict(), None
+            if self.store is not None:
+                batch = OrderedDict((row_id, markdown) for row_id, markdown in batch.items() if self.store.claim(idempotency.canvas_key(row_id)))
+            if not batch:
+                return 0
+            if not self._write(batch):
+                if self.store is not None:
+                    for row_id in batch:
+                        self.store.release(idempotency.canvas_key(row_id))
+                # The canvas never accepted these rows, so put them back in front of anything added meanwhile
+                with self._lock:
+                    batch.update(self._pending)
+                    self._pending, self._oldest = batch, time.monotonic()
+                return 0
+            if self.store is not None:
+                for row_id in batch:
+                    self.store.complete(idempotency.canvas_key(row_id))
+            with self._lock:
+                for row_id in batch:
+                    self._flushed[row_id] = None
+                while len(self._flushed) > REMEMBERED_ROWS:
+                    self._flushed.popitem(last=False)
+            return len(batch)
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def close(self):
+        self._stopped.set()
+        self.flush()
+
+    def _write(self, batch: OrderedDict) -> bool:
+        return self._edit("insert_at_end", ROW_SEPARATOR.join(batch.values()), f"{len(batch)} canvas rows")
+
+    def _edit(self, operation: str, markdown: str, description: str, canvas_id: Optional[str] = None) -> bool:
+        changes = [{"operation": operation, "document_content": {"type": "markdown", "markdown": markdown}}]
+        return self._call(description, self.client.canvases_edit, canvas_id=canvas_id or self.canvas_id, changes=changes) is not None
+
+    def _call(self, description: str, method, **kwargs):
+        """Calls method, retrying errors up to max_retries times; returns its response, or None if every attempt failed."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.api_calls += 1
+                return method(**kwargs)
+            except SlackApiError as e:
+                # An error response means the edit was not applied, so retrying the same batch can't duplicate rows
+                if attempt == self.max_retries:
+                    logger.error(f"Failed to write {description}: {e.response['error']}")
+                    return None
+                retry_after = float(e.response.headers.get("Retry-After", 0) or 0) if e.response.get("error") == "ratelimited" else 0
+                time.sleep(retry_after or 2 ** attempt * 0.5)
+        return None
+
+    def _flush_periodically(self):
+        while not self._stopped.wait(self.flush_interval / 2):
+            with self._lock:
+                due = self._oldest is not None and time.monotonic() - self._oldest >= self.flush_interval
+            if due:
+                self.flush()
+
+class CanvasView(CanvasWriteBuffer):
+    """Renders each campaign's confirmations from the store into a canvas of its own, batched like CanvasWriteBuffer.
+
+    Added rows only mark their campaign as changed, and a flush re-renders just those campaigns, replacing the whole
+    of each one's canvas. The content always comes from the store, so a repeated row, a failed flush or a second
+    writer is corrected by the next flush instead of leaving duplicate or missing lines behind. The first flush of a
+    campaign creates its canvas and appends a link to it to canvas_id, which is otherwise never rewritten, so the rows
+    appended there before the store existed stay where they are.
+    """
+
+    def __init__(self, client, canvas_id: str, confirmation_store, flush_rows: int = CANVAS_FLUSH_ROWS, flush_interval: float = None, max_retries: int = CANVAS_MAX_RETRIES, share_channel: str = CANVAS_SHARE_CHANNEL):
+        # Set before the base class starts the periodic flush thread
+        self.confirmation_store = confirmation_store
+        self.share_channel = share_channel
+        self._canvases: dict[str, str] = {}
+        super().__init__(client, canvas_id, flush_rows, flush_interval, max_retries)
+
+    def add(self, row: CanvasRow):
+        with self._lock:
+            self._pending[row.row_id] = row.campaign_id
+            self._oldest = self._oldest or time.monotonic()
+            full = len(self._pending) >= self.flush_rows
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """Renders and writes the canvas of every campaign with new rows; returns the number of confirmations written."""
+        with self._flush_lock:
+            with self._lock:
+                changes, self._pending, self._oldest = self._pending, OrderedDict(), None
+            written = 0
+            # A row queued before rows carried their campaign can't say which canvas it changes; its campaign's
+            # next confirmation renders it
+            for campaign_id in dict.fromkeys(campaign_id for campaign_id in changes.values() if campaign_id):
+                store = self.confirmation_store
+                rows = [row for week in store.counts_by_week(campaign_id) for row in store.by_week(campaign_id, week)]
+                if self._render(campaign_id, rows):
+                    written += len(rows)
+                    continue
+                # Only this campaign's rows go back; the others are on their canvases
+                with self._lock:
+                    failed = OrderedDict((row_id, value) for row_id, value in changes.items() if value == campaign_id)
+                    failed.update(self._pending)
+                    self._pending, self._oldest = failed, time.monotonic()
+            return written
+
+    def _render(self, campaign_id: str, rows: list) -> bool:
+        markdown = render_markdown(rows)
+        canvas_id = self._canvases.get(campaign_id) or self.confirmation_store.get_canvas(campaign_id)
+        if canvas_id is None:
+            return self._create(campaign_id, rows, markdown)
+        self._canvases[campaign_id] = canvas_id
+        return self._edit("replace", markdown, f"the canvas of {campaign_id} ({len(rows)} confirmations)", canvas_id)
+
+    def _create(self, campaign_id: str, rows: list, markdown: str) -> bool:
+        title = f"{rows[0].windows_version if rows else 'Windows upgrade'} confirmations ({campaign_id})"
+        response = self._call(f"a canvas for {campaign_id}", self.client.canvases_create, title=title, document_content={"type": "markdown", "markdown": markdown})
+        if response is None:
+            return False
+        created = self._canvases[campaign_id] = self.confirmation_store.set_canvas(campaign_id, response["canvas_id"])
+        if created != response["canvas_id"]:
+            # Another writer created the campaign's canvas first; use theirs, with this flush's render
+            self._call(f"the spare canvas of {campaign_id}", self.client.canvases_delete, canvas_id=response["canvas_id"])
+            return self._edit("replace", markdown, f"the canvas of {campaign_id} ({len(rows)} confirmations)", created)
+        if self.share_channel:
+            self._call(f"access to the canvas of {campaign_id}", self.client.canvases_access_set, canvas_id=created, access_level="read", channel_ids=[self.share_channel])
+        info = self._call(f"the link to the canvas of {campaign_id}", self.client.files_info, file=created)
+        link = info["file"]["permalink"] if info is not None else created
+        self._edit("insert_at_end", f"### {title}: {link}", f"the link to the canvas of {campaign_id}")
+        return True
+
+def format_timestamp(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(timestamp, CANVAS_TIMEZONE).strftime("%Y-%m-%d %I:%M:%S %p %Z")
+
+def render_markdown(rows: list) -> str:
+    """The canvas as markdown: a heading per campaign and week with its count, then the same line per confirmation
+    that was appended before the canvas was rendered from the store. rows must be grouped by campaign and week.
+    """
+    counts = Counter((row.campaign_id, row.week) for row in rows)
+    lines = [CANVAS_TITLE]
+    group = None
+    for row in rows:
+        if (row.campaign_id, row.week) != group:
+            group = (row.campaign_id, row.week)
+            lines.append(f"### {row.windows_version}: week of {row.week} ({counts[group]})")
+        lines.append(f"{row.windows_version}, {row.email}, {row.week}, `{format_timestamp(row.confirmed_at)}`")
+    return ROW_SEPARATOR.join(lines)
+
+class SQSCanvasRows:
+    """Sends rows to the canvas queue; the queue's Lambda trigger batches them into one CanvasWriteBuffer flush."""
+
+    def __init__(self, queue_url: str = CANVAS_QUEUE_URL):
+        # boto3 is only needed on this path, so keep it out of module import time
+        import boto3
+        self.queue_url = queue_url
+        self.sqs = boto3.client("sqs")
+
+    def add(self, row: CanvasRow):
+        self.sqs.send_message(QueueUrl=self.queue_url, MessageBody=row.to_json())
+
+    def flush(self) -> int:
+        return 0
+
+def get_canvas_writer(client, canvas_id: str, flush_interval: float = None, store=None, confirmation_store=None):
+    if CANVAS_QUEUE_URL:
+        return SQSCanvasRows()
+    if confirmation_store is not None:
+        return CanvasView(client, canvas_id, confirmation_store, flush_interval=flush_interval)
+    return CanvasWriteBuffer(client, canvas_id, flush_interval=flush_interval, store=store)
+
+def is_canvas_event(event: dict) -> bool:
+    records = event.get("Records") or [{}]
+    return bool(CANVAS_QUEUE_URL) and records[0].get("eventSourceARN", "").endswith(":" + CANVAS_QUEUE_URL.rsplit("/", 1)[-1])
+
+def handle_sqs_event(event: dict, client, canvas_id: str, store=None, confirmation_store=None) -> dict:
+    """Lambda SQS trigger entrypoint: one canvases_edit for the whole batch of queued rows."""
+    if confirmation_store is not None:
+        buffer = CanvasView(client, canvas_id, confirmation_store, flush_rows=len(event["Records"]) + 1)
+    else:
+        buffer = CanvasWriteBuffer(client, canvas_id, flush_rows=len(event["Records"]) + 1, store=store)
+    for record in event["Records"]:
+        buffer.add(CanvasRow.from_json(record["body"]))
+    buffer.flush()
+    # Rows still pending were not written, and a CanvasView only keeps those of the campaigns it failed to render;
+    # rows the store already knew about were dropped, which is a success
+    with buffer._lock:
+        pending = set(buffer._pending)
+    return {"batchItemFailures": [{"itemIdentifier": record["messageId"]} for record in event["Records"] if CanvasRow.from_json(record["body"]).row_id in pending]}
@@ -0,0 +1,505 @@
+import os
+import json
+import math
+import time
+import sqlite3
+import threading
+from dataclasses import dataclass, asdict
+from typing import Iterator, Optional
+
+import redis_client
+
+CONFIRMATION_BACKEND = os.getenv("CONFIRMATION_BACKEND", os.getenv("STATE_BACKEND", "sqlite"))
+CONFIRMATION_TABLE = os.getenv("CONFIRMATION_TABLE")
+CONFIRMATION_PATH = os.getenv("CONFIRMATION_PATH", "/tmp/confirmations.sqlite3")
+# Confirmations from buttons sent before campaigns had IDs; DynamoDB key attributes can't be empty
+UNKNOWN_CAMPAIGN = "-"
+# DynamoDB keeps per-campaign aggregates on this sort key, next to the campaign's confirmations
+AGGREGATES_KEY = "#aggregates"
+# Latency histogram buckets grow by this factor, so a DynamoDB percentile is within about 10% of the exact one
+LATENCY_BUCKET_BASE = 1.2
+PERCENTILES = (50, 90, 99)
+# A confirmation that raced another change to the same user's row is re-read and retried this many times
+RECORD_ATTEMPTS = 5
+
+class SlotFull(Exception):
+    """The week a confirmation asked for has reached its capacity; nothing was recorded."""
+
+    def __init__(self, campaign_id: str, week: str):
+        super().__init__(f"The week of {week} is full for campaign {campaign_id}")
+        self.campaign_id = campaign_id
+        self.week = week
+
+@dataclass
+class Confirmation:
+    campaign_id: str
+    email: str
+    week: str
+    windows_version: str
+    user_id: Optional[str] = None
+    # The view the user confirmed in; the same view_id again is a retried delivery, not a new choice
+    view_id: Optional[str] = None
+    # ts of the campaign message the user answered, i.e. when it was sent
+    message_ts: Optional[float] = None
+    confirmed_at: float = 0.0
+
+    @property
+    def latency(self) -> Optional[float]:
+        """Seconds from the campaign message to the confirmation."""
+        return self.confirmed_at - self.message_ts if self.message_ts else None
+
+class SQLiteConfirmationStore:
+    """One row per (campaign, email), indexed for per-week lookups, per-user lookups and latency percentiles."""
+
+    def __init__(self, path: str = CONFIRMATION_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS confirmations ("
+            "campaign_id TEXT NOT NULL, email TEXT NOT NULL, week TEXT NOT NULL, windows_version TEXT NOT NULL, "
+            "user_id TEXT, view_id TEXT, message_ts REAL, confirmed_at REAL NOT NULL, latency REAL, "
+            "PRIMARY KEY (campaign_id, email))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS confirmations_week ON confirmations (campaign_id, week, confirmed_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS confirmations_email ON confirmations (email)")
+        conn.execute("CREATE INDEX IF NOT EXISTS confirmations_latency ON confirmations (campaign_id, latency)")
+        # The canvas each campaign's confirmations are rendered into, once canvas_writer.CanvasView has created it
+        conn.execute("CREATE TABLE IF NOT EXISTS campaign_canvases (campaign_id TEXT PRIMARY KEY, canvas_id TEXT NOT NULL)")
+        # Only capacity-limited weeks have a row; taken is kept in step with the confirmations inside record's transaction
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS slots ("
+            "campaign_id TEXT NOT NULL, week TEXT NOT NULL, capacity INTEGER NOT NULL, taken INTEGER NOT NULL DEFAULT 0, "
+            "PRIMARY KEY (campaign_id, week))"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread, kept open: opening one costs more than most of these queries
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return conn
+
+    def record(self, confirmation: Confirmation) -> bool:
+        """Stores the user's latest choice for the campaign; returns False for a repeat of the same view.
+
+        Moving to a capacity-limited week takes one of its slots and gives back the user's previous week's, in one
+        transaction; raises SlotFull when the week has none left.
+        """
+        row = asdict(confirmation)
+        row["latency"] = confirmation.latency
+        conn = self._connect()
+        # IMMEDIATE takes the write lock up front, so no other process can take the same slot between check and update
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            old = conn.execute(
+                "SELECT week, view_id FROM confirmations WHERE campaign_id = ? AND email = ?", (confirmation.campaign_id, confirmation.email)
+            ).fetchone()
+            if old and old[1] is not None and old[1] == confirmation.view_id:
+                conn.execute("ROLLBACK")
+                return False
+            if not old or old[0] != confirmation.week:
+                taken = conn.execute(
+                    "UPDATE slots SET taken = taken + 1 WHERE campaign_id = ? AND week = ? AND taken < capacity", (confirmation.campaign_id, confirmation.week)
+                )
+                if not taken.rowcount and conn.execute("SELECT 1 FROM slots WHERE campaign_id = ? AND week = ?", (confirmation.campaign_id, confirmation.week)).fetchone():
+                    raise SlotFull(confirmation.campaign_id, confirmation.week)
+                if old:
+                    conn.execute("UPDATE slots SET taken = taken - 1 WHERE campaign_id = ? AND week = ?", (confirmation.campaign_id, old[0]))
+            conn.execute(
+                "INSERT INTO confirmations (campaign_id, email, week, windows_version, user_id, view_id, message_ts, confirmed_at, latency) "
+                "VALUES (:campaign_id, :email, :week, :windows_version, :user_id, :view_id, :message_ts, :confirmed_at, :latency) "
+                "ON CONFLICT (campaign_id, email) DO UPDATE SET week = excluded.week, windows_version = excluded.windows_version, "
+                "user_id = excluded.user_id, view_id = excluded.view_id, message_ts = excluded.message_ts, confirmed_at = excluded.confirmed_at",
+                # latency is left out: it is measured to a user's first answer, as in the other backends
+                row
+            )
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def set_capacity(self, campaign_id: str, capacities: dict[str, int]):
+        """Limits how many users can pick each week; a week left out, or given 0 or less, stays unlimited."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for week, capacity in capacities.items():
+                if capacity <= 0:
+                    conn.execute("DELETE FROM slots WHERE campaign_id = ? AND week = ?", (campaign_id, week))
+                    continue
+                # A campaign's capacity can be set after confirmations came in, so start from the week's current count
+                conn.execute(
+                    "INSERT INTO slots (campaign_id, week, capacity, taken) "
+                    "VALUES (?, ?, ?, (SELECT COUNT(*) FROM confirmations WHERE campaign_id = ? AND week = ?)) "
+                    "ON CONFLICT (campaign_id, week) DO UPDATE SET capacity = excluded.capacity",
+                    (campaign_id, week, capacity, campaign_id, week)
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def availability(self, campaign_id: str) -> dict[str, int]:
+        """Slots left per capacity-limited week: one primary key range read, however many confirmations there are."""
+        return dict(self._connect().execute("SELECT week, MAX(capacity - taken, 0) FROM slots WHERE campaign_id = ?", (campaign_id,)))
+
+    def _query(self, where: str, args: tuple) -> list[Confirmation]:
+        rows = self._connect().execute(
+            f"SELECT campaign_id, email, week, windows_version, user_id, view_id, message_ts, confirmed_at FROM confirmations WHERE {where}", args
+        )
+        return [Confirmation(*row) for row in rows]
+
+    def get(self, campaign_id: str, email: str) -> Optional[Confirmation]:
+        found = self._query("campaign_id = ? AND email = ?", (campaign_id, email.lower()))
+        return found[0] if found else None
+
+    def for_email(self, email: str) -> list[Confirmation]:
+        return self._query("email = ?", (email.lower(),))
+
+    def by_week(self, campaign_id: str, week: str) -> list[Confirmation]:
+        return self._query("campaign_id = ? AND week = ? ORDER BY confirmed_at", (campaign_id, week))
+
+    def counts_by_week(self, campaign_id: str) -> dict[str, int]:
+        return dict(self._connect().execute("SELECT week, COUNT(*) FROM confirmations WHERE campaign_id = ? GROUP BY week ORDER BY week", (campaign_id,)))
+
+    def latency_percentiles(self, campaign_id: str, percentiles: tuple = PERCENTILES) -> dict[int, float]:
+        """Exact nearest-rank percentiles, each one indexed seek into the (campaign_id, latency) index."""
+        conn = self._connect()
+        count = conn.execute("SELECT COUNT(latency) FROM confirmations WHERE campaign_id = ?", (campaign_id,)).fetchone()[0]
+        if not count:
+            return {}
+        return {
+            percentile: conn.execute(
+                "SELECT latency FROM confirmations WHERE campaign_id = ? AND latency IS NOT NULL ORDER BY latency LIMIT 1 OFFSET ?",
+                (campaign_id, max(math.ceil(percentile / 100 * count) - 1, 0))
+            ).fetchone()[0]
+            for percentile in percentiles
+        }
+
+    def get_canvas(self, campaign_id: str) -> Optional[str]:
+        row = self._connect().execute("SELECT canvas_id FROM campaign_canvases WHERE campaign_id = ?", (campaign_id,)).fetchone()
+        return row[0] if row else None
+
+    def set_canvas(self, campaign_id: str, canvas_id: str) -> str:
+        """Records the campaign's canvas unless one already is; returns whichever canvas the campaign has."""
+        conn = self._connect()
+        conn.execute("INSERT OR IGNORE INTO campaign_canvases (campaign_id, canvas_id) VALUES (?, ?)", (campaign_id, canvas_id))
+        return self.get_canvas(campaign_id)
+
+    def iter_all(self) -> Iterator[Confirmation]:
+        """Every confirmation, grouped by campaign and week."""
+        yield from self._query("1 ORDER BY campaign_id, week, confirmed_at", ())
+
+class DynamoDBConfirmationStore:
+    """Confirmations keyed by (campaign_id, email), with week and email GSIs for the lookups.
+
+    Aggregates can't be computed from a partition in milliseconds, so each campaign keeps them on an extra item:
+    a count per week and a latency histogram, adjusted atomically on every recorded confirmation. The same item
+    holds each week's capacity, so a slot check is a single read.
+    """
+
+    def __init__(self, table_name: str = CONFIRMATION_TABLE):
+        # boto3 is only needed on this path, so keep it out of module import time
+        import boto3
+        self.table = boto3.resource("dynamodb").Table(table_name)
+
+    @staticmethod
+    def _item(confirmation: Confirmation) -> dict:
+        from decimal import Decimal
+        item = {key: value for key, value in asdict(confirmation).items() if value is not None}
+        for key in ("message_ts", "confirmed_at"):
+            if key in item:
+                item[key] = Decimal(str(item[key]))
+        item["campaign_week"] = f"{confirmation.campaign_id}#{confirmation.week}"
+        return item
+
+    @staticmethod
+    def _confirmation(item: dict) -> Confirmation:
+        fields = {key: item.get(key) for key in Confirmation.__dataclass_fields__}
+        for key in ("message_ts", "confirmed_at"):
+            if fields[key] is not None:
+                fields[key] = float(fields[key])
+        return Confirmation(**fields)
+
+    def record(self, confirmation: Confirmation) -> bool:
+        """Writes the confirmation and its aggregate changes in one transaction.
+
+        The aggregates update is conditioned on the new week having a slot left (capacity:<week> on the aggregates
+        item), so concurrent invocations can't oversubscribe it; raises SlotFull when it has none.
+        """
+        from botocore.exceptions import ClientError
+        from boto3.dynamodb.types import TypeSerializer
+        serializer = TypeSerializer()
+        key = {"campaign_id": confirmation.campaign_id, "email": confirmation.email}
+        for _ in range(RECORD_ATTEMPTS):
+            old = self.table.get_item(Key=key, ConsistentRead=True).get("Item")
+            if old and old.get("view_id") == confirmation.view_id:
+                return False
+            changes = {f"week:{confirmation.week}": 1}
+            if old:
+                changes[f"week:{old['week']}"] = changes.get(f"week:{old['week']}", 0) - 1
+            elif confirmation.latency is not None:
+                # Latency is measured to a user's first answer; changing weeks later doesn't count again
+                changes[f"latency:{math.ceil(math.log(max(confirmation.latency, 1), LATENCY_BUCKET_BASE))}"] = 1
+            names = {f"#a{index}": name for index, name in enumerate(changes)}
+            values = {f":a{index}": value for index, value in enumerate(changes.values())}
+            update = {
+                "TableName": self.table.name,
+                "Key": {name: serializer.serialize(value) for name, value in {"campaign_id": confirmation.campaign_id, "email": AGGREGATES_KEY}.items()},
+                "UpdateExpression": "ADD " + ", ".join(f"{name} {value}" for name, value in zip(names, values))
+            }
+            if not old or old["week"] != confirmation.week:
+                names.update({"#taken": f"week:{confirmation.week}", "#capacity": f"capacity:{confirmation.week}"})
+                update["ConditionExpression"] = "attribute_not_exists(#capacity) OR attribute_not_exists(#taken) OR #taken < #capacity"
+            # The put only applies if the user's row is still the one read above; another write in between retries
+            put = {"TableName": self.table.name, "Item": {name: serializer.serialize(value) for name, value in self._item(confirmation).items()}}
+            if old:
+                put.update(ConditionExpression="confirmed_at = :old_confirmed_at", ExpressionAttributeValues={":old_confirmed_at": serializer.serialize(old["confirmed_at"])})
+            else:
+                put.update(ConditionExpression="attribute_not_exists(email)")
+            update.update(ExpressionAttributeNames=names, ExpressionAttributeValues={name: serializer.serialize(value) for name, value in values.items()})
+            try:
+                self.table.meta.client.transact_write_items(TransactItems=[{"Put": put}, {"Update": update}])
+                return True
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "TransactionCanceledException":
+                    raise
+                reasons = [reason.get("Code") for reason in e.response.get("CancellationReasons", [])]
+                if reasons[1:2] == ["ConditionalCheckFailed"]:
+                    raise SlotFull(confirmation.campaign_id, confirmation.week)
+                # The user's row changed under us, or the transaction conflicted with another one: read it again
+        raise RuntimeError(f"Could not record the confirmation for {confirmation.email} after {RECORD_ATTEMPTS} attempts")
+
+    def set_capacity(self, campaign_id: str, capacities: dict[str, int]):
+        """Limits how many users can pick each week; a week left out, or given 0 or less, stays unlimited."""
+        limited = {week: capacity for week, capacity in capacities.items() if capacity > 0}
+        unlimited = [week for week in capacities if week not in limited]
+        names = {f"#c{index}": f"capacity:{week}" for index, week in enumerate([*limited, *unlimited])}
+        expressions = []
+        if limited:
+            expressions.append("SET " + ", ".join(f"#c{index} = :c{index}" for index in range(len(limited))))
+        if unlimited:
+            expressions.append("REMOVE " + ", ".join(f"#c{index}" for index in range(len(limited), len(names))))
+        if not expressions:
+            return
+        update = {
+            "Key": {"campaign_id": campaign_id, "email": AGGREGATES_KEY},
+            "UpdateExpression": " ".join(expressions),
+            "ExpressionAttributeNames": names
+        }
+        if limited:
+            update["ExpressionAttributeValues"] = {f":c{index}": capacity for index, capacity in enumerate(limited.values())}
+        self.table.update_item(**update)
+
+    def availability(self, campaign_id: str) -> dict[str, int]:
+        """Slots left per capacity-limited week, from the one aggregates item."""
+        aggregates = self._aggregates(campaign_id)
+        return {
+            name[len("capacity:"):]: max(int(capacity) - int(aggregates.get(f"week:{name[len('capacity:'):]}", 0)), 0)
+            for name, capacity in aggregates.items() if name.startswith("capacity:")
+        }
+
+    def _query_all(self, **query) -> list[Confirmation]:
+        items = []
+        while True:
+            response = self.table.query(**query)
+            items.extend(item for item in response["Items"] if item["email"] != AGGREGATES_KEY)
+            if "LastEvaluatedKey" not in response:
+                return [self._confirmation(item) for item in items]
+            query["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def get(self, campaign_id: str, email: str) -> Optional[Confirmation]:
+        item = self.table.get_item(Key={"campaign_id": campaign_id, "email": email.lower()}).get("Item")
+        return self._confirmation(item) if item else None
+
+    def for_email(self, email: str) -> list[Confirmation]:
+        from boto3.dynamodb.conditions import Key
+        return self._query_all(IndexName="email-index", KeyConditionExpression=Key("email").eq(email.lower()))
+
+    def by_week(self, campaign_id: str, week: str) -> list[Confirmation]:
+        from boto3.dynamodb.conditions import Key
+        return self._query_all(IndexName="week-index", KeyConditionExpression=Key("campaign_week").eq(f"{campaign_id}#{week}"))
+
+    def _aggregates(self, campaign_id: str) -> dict:
+        return self.table.get_item(Key={"campaign_id": campaign_id, "email": AGGREGATES_KEY}).get("Item") or {}
+
+    def counts_by_week(self, campaign_id: str) -> dict[str, int]:
+        counts = {name[len("week:"):]: int(count) for name, count in self._aggregates(campaign_id).items() if name.startswith("week:")}
+        return {week: count for week, count in sorted(counts.items()) if count}
+
+    def latency_percentiles(self, campaign_id: str, percentiles: tuple = PERCENTILES) -> dict[int, float]:
+        """Percentiles from the latency histogram, reported as the upper bound of the bucket they fall in."""
+        buckets = sorted((int(name[len("latency:"):]), int(count)) for name, count in self._aggregates(campaign_id).items() if name.startswith("latency:"))
+        total = sum(count for _, count in buckets)
+        if not total:
+            return {}
+        result = {}
+        for percentile in percentiles:
+            rank, seen = math.ceil(percentile / 100 * total), 0
+            for bucket, count in buckets:
+                seen += count
+                if seen >= rank:
+                    result[percentile] = LATENCY_BUCKET_BASE ** bucket
+                    break
+        return result
+
+    def get_canvas(self, campaign_id: str) -> Optional[str]:
+        return self._aggregates(campaign_id).get("canvas_id")
+
+    def set_canvas(self, campaign_id: str, canvas_id: str) -> str:
+        """Records the campaign's canvas on its aggregates item unless one already is; returns whichever it has."""
+        response = self.table.update_item(
+            Key={"campaign_id": campaign_id, "email": AGGREGATES_KEY},
+            UpdateExpression="SET canvas_id = if_not_exists(canvas_id, :canvas_id)",
+            ExpressionAttributeValues={":canvas_id": canvas_id},
+            ReturnValues="ALL_NEW"
+        )
+        return response["Attributes"]["canvas_id"]
+
+    def iter_all(self) -> Iterator[Confirmation]:
+        items, scan = [], {}
+        while True:
+            response = self.table.scan(**scan)
+            items.extend(self._confirmation(item) for item in response["Items"] if item["email"] != AGGREGATES_KEY)
+            if "LastEvaluatedKey" not in response:
+                break
+            scan["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        yield from sorted(items, key=lambda confirmation: (confirmation.campaign_id, confirmation.week, confirmation.confirmed_at))
+
+class RedisConfirmationStore:
+    """Confirmations in Redis, for Socket Mode replicas that can't share a SQLite file.
+
+    Each confirmation is a JSON string keyed by (campaign, email). Per campaign, a hash counts confirmations per week
+    (the taken count for that week's capacity), one sorted set per week orders its users by confirmed_at, and another
+    holds every user's latency, so percentiles are exact rank lookups. A set per email lists the user's campaigns,
+    and one hash maps each campaign to its canvas.
+    """
+
+    def __init__(self, client=None):
+        self.redis = client or redis_client.get_redis()
+
+    @staticmethod
+    def _key(campaign_id: str, *parts: str) -> str:
+        return redis_client.key("confirmations", campaign_id, *parts)
+
+    def record(self, confirmation: Confirmation) -> bool:
+        """Stores the user's latest choice for the campaign; returns False for a repeat of the same view.
+
+        Runs under WATCH on the user's row and the campaign's counts, so a slot taken by another replica between the
+        check and the write makes Redis run the check again; raises SlotFull when the week has none left.
+        """
+        name = self._key(confirmation.campaign_id, "email", confirmation.email)
+        counts = self._key(confirmation.campaign_id, "weeks")
+        capacities = self._key(confirmation.campaign_id, "capacity")
+        def write(pipe) -> bool:
+            body = pipe.get(name)
+            old = Confirmation(**json.loads(body)) if body else None
+            if old and old.view_id is not None and old.view_id == confirmation.view_id:
+                return False
+            if not old or old.week != confirmation.week:
+                capacity = pipe.hget(capacities, confirmation.week)
+                if capacity is not None and int(pipe.hget(counts, confirmation.week) or 0) >= int(capacity):
+                    raise SlotFull(confirmation.campaign_id, confirmation.week)
+            pipe.multi()
+            pipe.set(name, json.dumps(asdict(confirmation)))
+            if old:
+                pipe.hincrby(counts, old.week, -1)
+                pipe.zrem(self._key(confirmation.campaign_id, "week", old.week), confirmation.email)
+            pipe.hincrby(counts, confirmation.week, 1)
+            pipe.zadd(self._key(confirmation.campaign_id, "week", confirmation.week), {confirmation.email: confirmation.confirmed_at})
+            # Latency is measured to a user's first answer; changing weeks later doesn't count again
+            if not old and confirmation.latency is not None:
+                pipe.zadd(self._key(confirmation.campaign_id, "latency"), {confirmation.email: confirmation.latency})
+            pipe.sadd(redis_client.key("confirmations", "by_email", confirmation.email), confirmation.campaign_id)
+            pipe.sadd(redis_client.key("confirmations", "campaigns"), confirmation.campaign_id)
+            return True
+        return self.redis.transaction(write, name, counts, capacities, value_from_callable=True)
+
+    def set_capacity(self, campaign_id: str, capacities: dict[str, int]):
+        """Limits how many users can pick each week; a week left out, or given 0 or less, stays unlimited."""
+        limited = {week: capacity for week, capacity in capacities.items() if capacity > 0}
+        unlimited = [week for week in capacities if week not in limited]
+        with self.redis.pipeline() as pipe:
+            if limited:
+                pipe.hset(self._key(campaign_id, "capacity"), mapping=limited)
+            if unlimited:
+                pipe.hdel(self._key(campaign_id, "capacity"), *unlimited)
+            pipe.execute()
+
+    def availability(self, campaign_id: str) -> dict[str, int]:
+        with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self._key(campaign_id, "capacity"))
+            pipe.hgetall(self._key(campaign_id, "weeks"))
+            capacities, counts = pipe.execute()
+        return {week: max(int(capacity) - int(counts.get(week, 0)), 0) for week, capacity in capacities.items()}
+
+    def _load(self, names: list[str]) -> list[Confirmation]:
+        return [Confirmation(**json.loads(body)) for body in self.redis.mget(names) if body] if names else []
+
+    def get(self, campaign_id: str, email: str) -> Optional[Confirmation]:
+        found = self._load([self._key(campaign_id, "email", email.lower())])
+        return found[0] if found else None
+
+    def for_email(self, email: str) -> list[Confirmation]:
+        campaign_ids = self.redis.smembers(redis_client.key("confirmations", "by_email", email.lower()))
+        return self._load([self._key(campaign_id, "email", email.lower()) for campaign_id in campaign_ids])
+
+    def by_week(self, campaign_id: str, week: str) -> list[Confirmation]:
+        emails = self.redis.zrange(self._key(campaign_id, "week", week), 0, -1)
+        return self._load([self._key(campaign_id, "email", email) for email in emails])
+
+    def counts_by_week(self, campaign_id: str) -> dict[str, int]:
+        counts = {week: int(count) for week, count in self.redis.hgetall(self._key(campaign_id, "weeks")).items()}
+        return {week: count for week, count in sorted(counts.items()) if count}
+
+    def latency_percentiles(self, campaign_id: str, percentiles: tuple = PERCENTILES) -> dict[int, float]:
+        """Exact nearest-rank percentiles, one ZRANGE by rank each."""
+        name = self._key(campaign_id, "latency")
+        count = self.redis.zcard(name)
+        if not count:
+            return {}
+        result = {}
+        for percentile in percentiles:
+            rank = max(math.ceil(percentile / 100 * count) - 1, 0)
+            result[percentile] = self.redis.zrange(name, rank, rank, withscores=True)[0][1]
+        return result
+
+    def get_canvas(self, campaign_id: str) -> Optional[str]:
+        return self.redis.hget(redis_client.key("confirmations", "canvases"), campaign_id)
+
+    def set_canvas(self, campaign_id: str, canvas_id: str) -> str:
+        """Records the campaign's canvas unless one already is; returns whichever canvas the campaign has."""
+        self.redis.hsetnx(redis_client.key("confirmations", "canvases"), campaign_id, canvas_id)
+        return self.get_canvas(campaign_id)
+
+    def iter_all(self) -> Iterator[Confirmation]:
+        """Every confirmation, grouped by campaign and week."""
+        for campaign_id in sorted(self.redis.smembers(redis_client.key("confirmations", "campaigns"))):
+            for week in self.counts_by_week(campaign_id):
+                yield from self.by_week(campaign_id, week)
+
+def get_store(backend: str = CONFIRMATION_BACKEND):
+    if backend == "dynamodb":
+        return DynamoDBConfirmationStore()
+    if backend == "redis":
+        return RedisConfirmationStore()
+    return SQLiteConfirmationStore()
+
+def full_weeks(availability: dict[str, int]) -> frozenset:
+    return frozenset(week for week, left in availability.items() if left <= 0)
+
+def from_metadata(private_metadata: dict, view_id: str, user_id: Optional[str] = None) -> Confirmation:
+    """The confirmation a submitted confirmation modal describes."""
+    return Confirmation(
+        campaign_id=private_metadata.get("campaign_id") or UNKNOWN_CAMPAIGN,
+        email=private_metadata["user_email"].lower(),
+        week=private_metadata["date"],
+        windows_version=private_metadata["windows_version"],
+        user_id=user_id or private_metadata.get("caller_id"),
+        view_id=view_id,
+        message_ts=float(private_metadata["message_ts"]) if private_metadata.get("message_ts") else None,
+        confirmed_at=time.time()
+    )
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import logging
+import threading
+from typing import Callable, Iterable, Optional
+from slack_sdk.errors import SlackApiError
+
+import rate_limits
+
+DIRECTORY_TTL_SECONDS = int(os.getenv("DIRECTORY_TTL_SECONDS", "3600"))
+# How often a process without a fresh index looks for a newly saved one, and how often start_refresh checks on the walk
+DIRECTORY_RETRY_SECONDS = int(os.getenv("DIRECTORY_RETRY_SECONDS", "60"))
+USERS_LIST_PAGE_SIZE = 200
+# A users.list page can wait about 3s for a Tier 2 token, so stop taking pages with less than this left
+REFRESH_MARGIN_SECONDS = 4.0
+
+logger = logging.getLogger(__name__)
+
+class DirectoryIndex:
+    """Lower-cased email -> Slack user ID map built from one users.list walk, plus each user's time zone."""
+
+    def __init__(self, user_ids: Optional[dict[str, str]] = None, built_at: Optional[float] = None, time_zones: Optional[dict[str, str]] = None):
+        self.user_ids = user_ids or {}
+        # user ID -> IANA time zone name, for pacing campaign messages into business hours
+        self.time_zones = time_zones or {}
+        self.built_at = built_at if built_at is not None else time.time()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def is_fresh(self, ttl: int = DIRECTORY_TTL_SECONDS) -> bool:
+        return time.time() - self.built_at < ttl
+
+    def add(self, email: str, user_id: str, time_zone: Optional[str] = None):
+        with self._lock:
+            self.user_ids[email.strip().lower()] = user_id
+            if time_zone:
+                self.time_zones[user_id] = time_zone
+
+    def time_zone(self, user_id: Optional[str]) -> Optional[str]:
+        return self.time_zones.get(user_id)
+
+    def resolve(self, emails: Iterable[str]) -> tuple[dict[str, str], list[str]]:
+        """Splits emails into those found in the index (email -> user_id) and the misses, in one pass."""
+        resolved, misses = {}, []
+        user_ids = self.user_ids
+        for email in emails:
+            user_id = user_ids.get(email.lower())
+            if user_id:
+                resolved[email] = user_id
+            else:
+                misses.append(email)
+        return resolved, misses
+
+    @classmethod
+    def load(cls, queue) -> Optional["DirectoryIndex"]:
+        """The last finished walk saved in the campaign queue's backend, or None if no walk has finished yet."""
+        current = queue.get_directory(["current"]).get("current")
+        if not current:
+            return None
+        current = json.loads(current)
+        names = [f"{current['slot']}:{page}" for page in range(current["pages"])]
+        pages = queue.get_directory(names)
+        user_ids, time_zones = {}, {}
+        for name in names:
+            for email, (user_id, time_zone) in json.loads(pages.get(name, "{}")).items():
+                user_ids[email] = user_id
+                if time_zone:
+                    time_zones[user_id] = time_zone
+        return cls(user_ids, current["built_at"], time_zones)
+
+def refresh(client, queue, remaining_seconds: Optional[Callable[[], float]] = None, ttl: int = DIRECTORY_TTL_SECONDS, page_size: int = USERS_LIST_PAGE_SIZE) -> bool:
+    """Walks users.list a page at a time until the walk finishes or the deadline is near; True once a fresh index is saved.
+
+    Never called on the send path: the Lambda runs it from a scheduled event, long-running processes from
+    start_refresh. Each page, then the cursor after it, is saved in the campaign queue's backend, so the next call
+    (in any container or replica) carries on where this one stopped. A walk starts once the saved index is half its
+    ttl old and writes to the slot the current index isn't using, which stays readable until the walk finishes.
+    Two walkers at once only repeat each other's calls: each page is saved before the cursor that points past it.
+    """
+    saved = queue.get_directory(["current", "walk"])
+    current = json.loads(saved["current"]) if saved.get("current") else None
+    walk = json.loads(saved["walk"]) if saved.get("walk") else None
+    if walk is None:
+        if current is not None and time.time() - current["built_at"] < ttl / 2:
+            return True
+        walk = {"slot": 1 - current["slot"] if current else 0, "cursor": None, "pages": 0, "started_at": time.time()}
+    # Behind modal opens and confirmations, like campaign sends
+    with rate_limits.lane(rate_limits.BULK):
+        while remaining_seconds is None or remaining_seconds() >= REFRESH_MARGIN_SECONDS:
+            try:
+                response = client.users_list(limit=page_size, cursor=walk["cursor"])
+            except SlackApiError as e:
+                logger.error(f"Failed to walk users.list at page {walk['pages']}: {e.response['error']}")
+                if e.response["error"] == "invalid_cursor":
+                    # The saved cursor can't be resumed; the next call starts the walk over
+                    queue.put_directory("walk", "")
+                return False
+            users = {}
+            for member in response["members"]:
+                email = member.get("profile", {}).get("email")
+                if email and not member.get("deleted") and not member.get("is_bot"):
+                    users[email.lower()] = [member["id"], member.get("tz")]
+            queue.put_directory(f"{walk['slot']}:{walk['pages']}", json.dumps(users, separators=(",", ":")))
+            walk = {**walk, "cursor": response.get("response_metadata", {}).get("next_cursor"), "pages": walk["pages"] + 1}
+            if not walk["cursor"]:
+                # Dated from the start of the walk, since its first pages are that old
+                queue.put_directory("current", json.dumps({"slot": walk["slot"], "pages": walk["pages"], "built_at": walk["started_at"]}))
+                queue.put_directory("walk", "")
+                logger.info(f"Directory index saved: {walk['pages']} pages of users.list")
+                return True
+            queue.put_directory("walk", json.dumps(walk))
+    return False
+
+def start_refresh(client, queue, stop: Optional[threading.Event] = None, interval: float = DIRECTORY_RETRY_SECONDS) -> threading.Thread:
+    """Keeps the saved index fresh from a background thread, for processes that outlive a Lambda invocation."""
+    stop = stop or threading.Event()
+    def run():
+        while not stop.is_set():
+            try:
+                refresh(client, queue, remaining_seconds=lambda: 0.0 if stop.is_set() else interval)
+            except Exception:
+                logger.exception("Directory refresh failed")
+            stop.wait(interval)
+    thread = threading.Thread(target=run, name="directory-refresh", daemon=True)
+    thread.start()
+    return thread
+
+_index: Optional[DirectoryIndex] = None
+_checked_at = 0.0
+_index_lock = threading.Lock()
+
+def get_directory_index(queue, ttl: int = DIRECTORY_TTL_SECONDS) -> DirectoryIndex:
+    """Returns the index last saved by refresh, rereading it at most every DIRECTORY_RETRY_SECONDS once it goes stale.
+
+    Never calls Slack. Until refresh has saved a fresh index, every recipient is a miss and goes through
+    users_lookupByEmail; those lookups are added to the returned index, so later batches in the process reuse them.
+    """
+    global _index, _checked_at
+    with _index_lock:
+        now = time.time()
+        if _index is not None and (_index.is_fresh(ttl) or now - _checked_at < DIRECTORY_RETRY_SECONDS):
+            return _index
+        _checked_at = now
+        try:
+            index = DirectoryIndex.load(queue)
+        except Exception:
+            logger.exception("Failed to load the directory index")
+            index = None
+        if index is not None and index.is_fresh(ttl):
+            _index = index
+        elif _index is None or _index.built_at:
+            # built_at 0 marks the placeholder, which keeps the lookups learned since it was made
+            _index = DirectoryIndex(built_at=0)
+        return _index
@@ -0,0 +1,86 @@
+import os
+import time
+import asyncio
+import contextvars
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Iterable, Optional
+
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", "8"))
+# Recipients the asyncio process keeps in flight at once, across every campaign batch it is sending
+ASYNC_FANOUT_CONCURRENCY = int(os.getenv("ASYNC_FANOUT_CONCURRENCY", "256"))
+
+@dataclass
+class RecipientResult:
+    email: str
+    ok: bool
+    user_id: Optional[str] = None
+    error: Optional[str] = None
+    # Already sent by an earlier delivery of the same campaign, so nothing was posted this time
+    duplicate: bool = False
+    # Set when the message was handed to chat.scheduleMessage rather than posted
+    scheduled_message_id: Optional[str] = None
+    channel_id: Optional[str] = None
+    post_at: Optional[float] = None
+    # The user's time zone as users.lookupByEmail returned it, so a directory miss is learned with it
+    time_zone: Optional[str] = None
+
+@dataclass
+class FanoutSummary:
+    results: list[RecipientResult] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def sent(self) -> int:
+        return sum(1 for result in self.results if result.ok and not result.duplicate)
+
+    @property
+    def skipped(self) -> int:
+        return sum(1 for result in self.results if result.duplicate)
+
+    @property
+    def failed(self) -> int:
+        return sum(1 for result in self.results if not result.ok)
+
+    @property
+    def failures(self) -> list[RecipientResult]:
+        return [result for result in self.results if not result.ok]
+
+    @property
+    def recipients_per_second(self) -> float:
+        return len(self.results) / self.elapsed if self.elapsed else 0.0
+
+def clean_emails(emails: Iterable[str]) -> list[str]:
+    """Strips whitespace and drops blank entries from the provided email list."""
+    return [email.strip() for email in emails if email.strip()]
+
+def fan_out(send_one: Callable[[str], RecipientResult], emails: Iterable[str], max_workers: int = FANOUT_WORKERS) -> FanoutSummary:
+    """Calls send_one for every email on a bounded thread pool and collects the results in input order."""
+    emails = clean_emails(emails)
+    started = time.perf_counter()
+    if max_workers <= 1:
+        results = [send_one(email) for email in emails]
+    else:
+        # The WebClient is stateless per call, so every worker can share the one passed into send_one.
+        # Each call runs in a copy of the caller's context so settings like the rate-limit lane carry over.
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fanout") as executor:
+            futures = [executor.submit(contextvars.copy_context().run, send_one, email) for email in emails]
+            results = [future.result() for future in futures]
+    return FanoutSummary(results=results, elapsed=time.perf_counter() - started)
+
+async def fan_out_async(send_one: Callable[[str], Awaitable[RecipientResult]], emails: Iterable[str], semaphore: Optional[asyncio.Semaphore] = None) -> FanoutSummary:
+    """fan_out for coroutines: one task per email, at most as many running as the semaphore allows, results in input order.
+
+    Pass the same semaphore to every concurrent fan-out to bound the process as a whole rather than each batch.
+    """
+    emails = clean_emails(emails)
+    semaphore = semaphore or asyncio.Semaphore(ASYNC_FANOUT_CONCURRENCY)
+    started = time.perf_counter()
+
+    async def bounded(email: str) -> RecipientResult:
+        async with semaphore:
+            return await send_one(email)
+
+    # Tasks copy the caller's context, so settings like the rate-limit lane carry over as they do for threads
+    results = await asyncio.gather(*(bounded(email) for email in emails))
+    return FanoutSummary(results=list(results), elapsed=time.perf_counter() - started)
@@ -0,0 +1,216 @@
+"""Serves the Slack Events/Interactivity endpoint from a long-lived asyncio HTTP server.
+
+Runs the same listeners as the Lambda and Socket Mode entrypoints, for container platforms where the process
+(and its Slack client) stays warm between requests:
+
+    python http_server.py --port 3000 --workers 4
+"""
+import os
+import time
+import signal
+import asyncio
+import logging
+import argparse
+import multiprocessing
+from http import HTTPStatus
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+# Load .env before the listeners module reads its settings
+load_dotenv()
+
+import listeners
+import campaign_queue
+import idempotency
+import confirmations
+import canvas_writer
+import directory_index
+import aws_secrets
+import slack_clients
+import metrics
+import logging_config
+
+from slack_bolt import App, BoltRequest
+
+HTTP_HOST = os.getenv("HTTP_HOST", "0.0.0.0")
+HTTP_PORT = int(os.getenv("PORT", "3000"))
+HTTP_PATH = "/slack/events"
+HTTP_WORKERS = int(os.getenv("HTTP_WORKERS", "1"))
+# Threads that verify and ack requests; lazy listeners run on their own pool so a campaign can't delay acks
+DISPATCH_THREADS = int(os.getenv("HTTP_DISPATCH_THREADS", "32"))
+LAZY_THREADS = int(os.getenv("HTTP_LAZY_THREADS", "16"))
+KEEP_ALIVE_SECONDS = 75
+MAX_BODY_BYTES = 1024 * 1024
+SHUTDOWN_GRACE_SECONDS = 25
+
+logger = logging.getLogger(__name__)
+
+def build_app() -> tuple[App, ThreadPoolExecutor]:
+    secrets = aws_secrets.SecretsProvider(backend=os.getenv("SECRETS_BACKEND", "env"))
+    lazy_executor = ThreadPoolExecutor(max_workers=LAZY_THREADS, thread_name_prefix="lazy")
+    app = App(
+        client=slack_clients.build_web_client(secrets.get("bot_token")),
+        signing_secret=secrets.get("signing_secret"),
+        request_verification_enabled=False,
+        before_authorize=aws_secrets.RotatingRequestVerification(secrets),
+        # Ack first and run the lazy listeners on lazy_executor, like any long-running bolt server
+        process_before_response=False,
+        listener_executor=lazy_executor
+    )
+    idempotency_store = idempotency.get_store()
+    confirmation_store = confirmations.get_store()
+    canvas_rows = canvas_writer.get_canvas_writer(app.client, listeners.SLACK_CANVAS, flush_interval=canvas_writer.CANVAS_FLUSH_SECONDS, store=idempotency_store, confirmation_store=confirmation_store)
+    slack_clients.use_pooled_clients(app)
+    job_queue = campaign_queue.get_queue()
+    listeners.register_listeners(app, job_queue, canvas_rows, store=idempotency_store, confirmations_store=confirmation_store)
+    # Keeps the directory index in the queue backend fresh, so campaign batches never walk users.list themselves
+    directory_index.start_refresh(app.client, job_queue)
+    return app, lazy_executor
+
+class SlackHTTPServer:
+    def __init__(self, app: App, lazy_executor: ThreadPoolExecutor, host: str = HTTP_HOST, port: int = HTTP_PORT, reuse_port: bool = False):
+        self.app = app
+        self.lazy_executor = lazy_executor
+        self.host = host
+        self.port = port
+        self.reuse_port = reuse_port
+        self.dispatch_executor = ThreadPoolExecutor(max_workers=DISPATCH_THREADS, thread_name_prefix="dispatch")
+        self._stopping = asyncio.Event()
+        self._loop = None
+        # Connection task -> True while a request on it is being handled
+        self._connections: dict[asyncio.Task, bool] = {}
+
+    async def serve(self):
+        loop = self._loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self._stopping.set)
+            except (NotImplementedError, RuntimeError, ValueError):
+                # Not on the main thread (e.g. embedded in a test harness); call stop() instead
+                pass
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port, reuse_port=self.reuse_port, backlog=1024)
+        logger.info(f"Listening on http://{self.host}:{self.port}{HTTP_PATH} (pid {os.getpid()})")
+        await self._stopping.wait()
+        await self.shutdown(server)
+
+    def stop(self):
+        """Thread-safe way to begin a graceful shutdown."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    async def shutdown(self, server: asyncio.Server):
+        """Stops accepting, lets in-flight requests finish, then waits for lazy work and flushes the canvas."""
+        server.close()
+        for task, busy in list(self._connections.items()):
+            if not busy:
+                task.cancel()
+        if self._connections:
+            await asyncio.wait(list(self._connections), timeout=SHUTDOWN_GRACE_SECONDS)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.dispatch_executor.shutdown)
+        await loop.run_in_executor(None, self.lazy_executor.shutdown)
+        listeners.canvas_rows.flush()
+        metrics.flush()
+        logger.info("Shut down cleanly")
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connections[task] = False
+        try:
+            while not self._stopping.is_set():
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                self._connections[task] = True
+                method, target, headers, body = request
+                status, response_headers, response_body = await self._respond(method, target, headers, body)
+                keep_alive = headers.get("connection", [""])[0].lower() != "close" and not self._stopping.is_set()
+                self._write_response(writer, status, response_headers, response_body, keep_alive)
+                await writer.drain()
+                self._connections[task] = False
+                if not keep_alive:
+                    break
+        except (asyncio.CancelledError, asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ValueError as e:
+            self._write_response(writer, 400, {}, str(e).encode("utf-8"), keep_alive=False)
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        request_line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_SECONDS)
+        if not request_line:
+            return None
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        headers: dict[str, list[str]] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers.setdefault(name.strip().lower(), []).append(value.strip())
+        length = int(headers.get("content-length", ["0"])[0])
+        if length > MAX_BODY_BYTES:
+            raise ValueError("request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method, target, headers, body
+
+    async def _respond(self, method: str, target: str, headers: dict, body: bytes) -> tuple[int, dict, bytes]:
+        url = urlsplit(target)
+        if method == "GET" and url.path == "/health":
+            return 200, {}, b"ok"
+        if url.path != HTTP_PATH:
+            return 404, {}, b"not found"
+        if method != "POST":
+            return 405, {}, b"method not allowed"
+        bolt_request = BoltRequest(body=body.decode("utf-8"), query=url.query, headers=headers)
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        bolt_response = await loop.run_in_executor(self.dispatch_executor, self.app.dispatch, bolt_request)
+        metrics.recorder.record("RequestDuration", (time.perf_counter() - started) * 1000, Kind="ack")
+        return bolt_response.status, bolt_response.headers, bolt_response.body.encode("utf-8")
+
+    @staticmethod
+    def _write_response(writer: asyncio.StreamWriter, status: int, headers: dict, body: bytes, keep_alive: bool):
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+        for name, values in headers.items():
+            if name.lower() in ("content-length", "connection"):
+                continue
+            for value in values if isinstance(values, (list, tuple)) else [values]:
+                lines.append(f"{name}: {value}")
+        lines.append(f"Content-Length: {len(body)}")
+        lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+
+def run_server(host: str = HTTP_HOST, port: int = HTTP_PORT, reuse_port: bool = False):
+    # Per process: a forked worker doesn't inherit the parent's queue listener thread
+    logging_config.configure()
+    app, lazy_executor = build_app()
+    metrics.start_periodic_flush()
+    asyncio.run(SlackHTTPServer(app, lazy_executor, host, port, reuse_port).serve())
+
+def run_workers(workers: int = HTTP_WORKERS, host: str = HTTP_HOST, port: int = HTTP_PORT):
+    """Starts one server process per worker, all bound to the same port with SO_REUSEPORT."""
+    if workers <= 1:
+        run_server(host, port)
+        return
+    processes = [multiprocessing.Process(target=run_server, args=(host, port, True), name=f"http-worker-{i}") for i in range(workers)]
+    for process in processes:
+        process.start()
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in processes:
+        process.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default=HTTP_HOST)
+    parser.add_argument("--port", type=int, default=HTTP_PORT)
+    parser.add_argument("--workers", type=int, default=HTTP_WORKERS)
+    args = parser.parse_args()
+    run_workers(args.workers, args.host, args.port)
@@ -0,0 +1,240 @@
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from contextlib import asynccontextmanager, closing, contextmanager
+from typing import Optional
+
+import metrics
+import redis_client
+
+# STATE_BACKEND picks the same shared backend for every store that isn't set on its own
+IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", os.getenv("STATE_BACKEND", "memory"))
+IDEMPOTENCY_TABLE = os.getenv("IDEMPOTENCY_TABLE")
+IDEMPOTENCY_PATH = os.getenv("IDEMPOTENCY_PATH", "/tmp/idempotency.sqlite3")
+# Slack stops retrying a delivery after about an hour; keep keys well past that so late retries still match
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(7 * 24 * 3600)))
+# A claim that was never completed or released (the process died mid-send) can be taken over after this long
+LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "300"))
+
+PENDING = "pending"
+DONE = "done"
+
+def campaign_key(view_id: str) -> str:
+    return f"campaign:{view_id}"
+
+def send_key(campaign_id: str, email: str) -> str:
+    return f"send:{campaign_id}:{email.lower()}"
+
+def action_key(action_id: str, message_ts: str, trigger_id: str) -> str:
+    # A retried delivery repeats the trigger_id; a second click on the same button gets a new one
+    return f"action:{action_id}:{message_ts}:{trigger_id}"
+
+def delivery_key(body: bytes) -> str:
+    # Slack resends the exact same body on a retry, so its hash identifies the delivery
+    return f"delivery:{hashlib.sha256(body).hexdigest()}"
+
+def confirm_key(view_id: str) -> str:
+    return f"confirm:{view_id}"
+
+def canvas_key(row_id: str) -> str:
+    return f"canvas:{row_id}"
+
+class InMemoryStore:
+    """Process-local keys for tests and socket mode; retries that land on another process are not caught."""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL_SECONDS):
+        self.ttl = ttl
+        # key -> (state, lease_until, expires_at)
+        self._keys: dict[str, tuple[str, float, float]] = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key: str, lease_seconds: float = LEASE_SECONDS, ttl: Optional[float] = None) -> bool:
+        now = time.time()
+        ttl = ttl or self.ttl
+        with self._lock:
+            entry = self._keys.get(key)
+            if entry is not None and entry[2] > now and (entry[0] == DONE or entry[1] > now):
+                return False
+            self._keys[key] = (PENDING, now + lease_seconds, now + ttl)
+            return True
+
+    def complete(self, key: str):
+        with self._lock:
+            self._keys[key] = (DONE, 0, time.time() + self.ttl)
+
+    def release(self, key: str):
+        with self._lock:
+            # Like the shared stores, only a pending claim is dropped; a completed key stays done
+            if key in self._keys and self._keys[key][0] == PENDING:
+                del self._keys[key]
+
+class SQLiteStore:
+    """File-backed keys shared by every thread and local process using the same path."""
+
+    def __init__(self, path: str = IDEMPOTENCY_PATH, ttl: float = IDEMPOTENCY_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        with closing(self._connect()) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS idempotency_keys (key TEXT PRIMARY KEY, state TEXT NOT NULL, lease_until REAL NOT NULL, expires_at REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def claim(self, key: str, lease_seconds: float = LEASE_SECONDS, ttl: Optional[float] = None) -> bool:
+        now = time.time()
+        ttl = ttl or self.ttl
+        with closing(self._connect()) as conn:
+            # The upsert only overwrites an expired key or an abandoned pending one, so rowcount says who won
+            cursor = conn.execute(
+                "INSERT INTO idempotency_keys (key, state, lease_until, expires_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET state = excluded.state, lease_until = excluded.lease_until, expires_at = excluded.expires_at "
+                "WHERE idempotency_keys.expires_at <= ? OR (idempotency_keys.state = ? AND idempotency_keys.lease_until <= ?)",
+                (key, PENDING, now + lease_seconds, now + ttl, now, PENDING, now)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, key: str):
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE idempotency_keys SET state = ?, expires_at = ? WHERE key = ?", (DONE, time.time() + self.ttl, key))
+
+    def release(self, key: str):
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM idempotency_keys WHERE key = ? AND state = ?", (key, PENDING))
+
+class DynamoDBStore:
+    """Conditional writes on a DynamoDB table, so every Lambda container agrees on who claimed a key first.
+
+    Items expire through the table's TTL on expires_at; DynamoDB deletes lazily, so claim also treats an item past
+    its expires_at as absent.
+    """
+
+    def __init__(self, table_name: str = IDEMPOTENCY_TABLE, ttl: float = IDEMPOTENCY_TTL_SECONDS):
+        # boto3 is only needed on this path, so keep it out of module import time
+        import boto3
+        self.ttl = ttl
+        self.table = boto3.resource("dynamodb").Table(table_name)
+        self._conditional_check_failed = self.table.meta.client.exceptions.ConditionalCheckFailedException
+
+    def claim(self, key: str, lease_seconds: float = LEASE_SECONDS, ttl: Optional[float] = None) -> bool:
+        now = time.time()
+        ttl = ttl or self.ttl
+        try:
+            self.table.put_item(
+                Item={"idempotency_key": key, "state": PENDING, "lease_until": int(now + lease_seconds), "expires_at": int(now + ttl)},
+                ConditionExpression="attribute_not_exists(idempotency_key) OR expires_at <= :now OR (#state = :pending AND lease_until <= :now)",
+                # state is a DynamoDB reserved word
+                ExpressionAttributeNames={"#state": "state"},
+                ExpressionAttributeValues={":now": int(now), ":pending": PENDING}
+            )
+            return True
+        except self._conditional_check_failed:
+            return False
+
+    def complete(self, key: str):
+        self.table.update_item(
+            Key={"idempotency_key": key},
+            UpdateExpression="SET #state = :done, expires_at = :expires_at",
+            ExpressionAttributeNames={"#state": "state"},
+            ExpressionAttributeValues={":done": DONE, ":expires_at": int(time.time() + self.ttl)}
+        )
+
+    def release(self, key: str):
+        try:
+            self.table.delete_item(
+                Key={"idempotency_key": key},
+                ConditionExpression="#state = :pending",
+                ExpressionAttributeNames={"#state": "state"},
+                ExpressionAttributeValues={":pending": PENDING}
+            )
+        except self._conditional_check_failed:
+            # Someone took over the lease and already completed the key
+            pass
+
+class RedisStore:
+    """Keys in Redis, shared by every Socket Mode replica; Redis expires them itself.
+
+    A key holds "done" or "pending:<lease_until>". A claim is a SET NX; taking over an abandoned pending key is a
+    WATCH/MULTI swap, so of two replicas racing for it only one wins.
+    """
+
+    def __init__(self, client=None, ttl: float = IDEMPOTENCY_TTL_SECONDS):
+        self.redis = client or redis_client.get_redis()
+        self.ttl = ttl
+
+    def claim(self, key: str, lease_seconds: float = LEASE_SECONDS, ttl: Optional[float] = None) -> bool:
+        now = time.time()
+        ttl_ms = int((ttl or self.ttl) * 1000)
+        name = redis_client.key("idempotency", key)
+        value = f"{PENDING}:{now + lease_seconds}"
+        if self.redis.set(name, value, nx=True, px=ttl_ms):
+            return True
+        def take_over(pipe) -> bool:
+            current = pipe.get(name)
+            if current is not None and (current == DONE or float(current.split(":", 1)[1]) > now):
+                return False
+            pipe.multi()
+            pipe.set(name, value, px=ttl_ms)
+            return True
+        return self.redis.transaction(take_over, name, value_from_callable=True)
+
+    def complete(self, key: str):
+        self.redis.set(redis_client.key("idempotency", key), DONE, px=int(self.ttl * 1000))
+
+    def release(self, key: str):
+        name = redis_client.key("idempotency", key)
+        def delete_pending(pipe):
+            current = pipe.get(name)
+            if current is not None and current.startswith(PENDING):
+                pipe.multi()
+                pipe.delete(name)
+        self.redis.transaction(delete_pending, name)
+
+@contextmanager
+def once(store, key: Optional[str]):
+    """Yields True for the first delivery of key and False for a repeat, which the caller should skip.
+
+    The key is completed when the block finishes and released if it raises, so a failed attempt can be retried.
+    With no store or no key every call is treated as the first.
+    """
+    if store is None or key is None:
+        yield True
+        return
+    if not store.claim(key):
+        metrics.recorder.count("DuplicateSuppressed", Kind=key.split(":", 1)[0])
+        yield False
+        return
+    try:
+        yield True
+    except BaseException:
+        store.release(key)
+        raise
+    store.complete(key)
+
+@asynccontextmanager
+async def once_async(store, key: Optional[str]):
+    """once() for coroutines; the store's calls run on a thread, since the SQLite and DynamoDB stores block."""
+    if store is None or key is None:
+        yield True
+        return
+    if not await asyncio.to_thread(store.claim, key):
+        metrics.recorder.count("DuplicateSuppressed", Kind=key.split(":", 1)[0])
+        yield False
+        return
+    try:
+        yield True
+    except BaseException:
+        await asyncio.to_thread(store.release, key)
+        raise
+    await asyncio.to_thread(store.complete, key)
+
+def get_store(backend: str = IDEMPOTENCY_BACKEND):
+    if backend == "dynamodb":
+        return DynamoDBStore()
+    if backend == "sqlite":
+        return SQLiteStore()
+    if backend == "redis":
+        return RedisStore()
+    return InMemoryStore()
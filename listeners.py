@@ -0,0 +1,407 @@
+import os
+import time
+import logging
+import datetime
+from zoneinfo import ZoneInfo
+# custom py modules
+import ui_templates
+import metadata_codec
+import fanout
+import directory_index
+import campaign_queue
+import canvas_writer
+import rate_limits
+import metrics
+import logging_config
+import idempotency
+import recipients
+import progress
+import campaigns
+import confirmations
+import pacing
+# Slack imports
+from slack_sdk.errors import SlackApiError
+
+SLACK_CANVAS = os.getenv("SLACK_CANVAS")
+ALLOWED_USERS=os.getenv("ALLOWED_USERS", "").split(",")
+LOG_CHANNEL=os.getenv("LOG_CHANNEL")
+# Used when the modal's Windows Version field is left blank, and for buttons sent before campaigns had IDs
+WINDOWS_VERSION="Windows 11 24H2"
+# Default technician capacity per alternate week when the modal's capacity field is left blank; 0 is unlimited
+SLOT_CAPACITY=int(os.getenv("SLOT_CAPACITY", "0"))
+
+# Wired up by register_listeners for the transport (Lambda, Socket Mode or HTTP server) that owns the app
+bot_client = None
+job_queue = None
+canvas_rows = None
+flush_canvas_each_time = False
+idempotency_store = None
+campaign_registry = None
+confirmation_store = None
+# Whether a listener drains the local queue itself; False when a campaign_queue.serve_workers pool does it instead
+drain_queue_inline = True
+
+def get_todays_date() -> str:
+    """Returns today's date in the format %Y-%m-%d %I:%M:%S %p %Z."""
+    # Get the current datetime object
+    now = datetime.datetime.now()
+    # Convert to Pacific Time (Los Angeles)
+    pacific_timezone = ZoneInfo("America/Los_Angeles") 
+    now_aware = now.astimezone(pacific_timezone)
+    formatted_datetime = now_aware.strftime("%Y-%m-%d %I:%M:%S %p %Z")
+    return formatted_datetime
+
+def respond_to_slack_within_3_seconds(ack):
+    ack()
+
+def get_user_email(client, user_id:str) -> str:
+    user_object = client.users_info(user=user_id)
+    return user_object["user"]["profile"]["email"]
+
+def get_full_weeks(campaign) -> frozenset:
+    """The campaign's weeks with no slots left; one read of the confirmation store's counters, none if it is unlimited."""
+    if campaign is None or not campaign.capacity or confirmation_store is None:
+        return frozenset()
+    return confirmations.full_weeks(confirmation_store.availability(campaign.campaign_id))
+
+def offer_open_weeks(client, campaign, full_weeks: frozenset, channel_id: str, message_ts: str, week: str):
+    """Re-renders the campaign message with only the weeks that still have room, saying why the pick didn't stick."""
+    warning = f":no_entry: The week of *{week}* is fully booked. Please pick another week."
+    client.chat_update(
+        channel=channel_id,
+        ts=message_ts,
+        text=warning,
+        blocks=[{"type": "section", "text": {"type": "mrkdwn", "text": warning}}, *campaign.blocks_without(full_weeks)]
+    )
+
+def handle_alternative_choice(body, client, logger):
+    logger.debug("Processing handle_alternative_choice")
+    try:
+        logging_config.log_payload(logger, body)
+        trigger_id = body["trigger_id"]
+        campaign_id, selected_date = ui_templates.parse_button_value(body["actions"][0]["value"])
+        campaign = campaign_registry.get(campaign_id) if campaign_registry else None
+        key = idempotency.action_key(body["actions"][0]["action_id"], body["message"]["ts"], trigger_id)
+        with idempotency.once(idempotency_store, key) as first:
+            if not first:
+                return
+            # Only a capacity-limited campaign pays for the check, a single read that leaves the trigger_id time to open the modal
+            full_weeks = get_full_weeks(campaign)
+            if selected_date in full_weeks:
+                client.views_open(
+                    view=ui_templates.build_week_full_modal(selected_date, [week for week in campaign.weeks if week not in full_weeks]),
+                    trigger_id=trigger_id
+                )
+                offer_open_weeks(client, campaign, full_weeks, body["container"]["channel_id"], body["message"]["ts"], selected_date)
+                return
+            email = get_user_email(client, body["user"]["id"])
+            private_metadata = {
+                "date": selected_date,
+                "message_ts": body["message"]["ts"],
+                "channel_id": body["container"]["channel_id"],
+                "caller_id": body["user"]["id"],
+                "user_email": email,
+                "windows_version": campaign.windows_version if campaign else WINDOWS_VERSION
+            }
+            if campaign_id:
+                private_metadata["campaign_id"] = campaign_id
+            confirmation_message = f":spiral_calendar_pad: I am scheduling my Windows upgrade on *{selected_date}*"
+            client.views_open(
+                view=ui_templates.build_confirmation_modal(private_metadata, confirmation_message),
+                trigger_id=trigger_id
+            )
+    except SlackApiError as e:
+        logger.error(f"Failed to open modal: {e}")
+
+def handle_view_submission_events(body, client, logger):
+    logger.debug("Processing handle_view_submission_events")
+    try:
+        logging_config.log_payload(logger, body)
+        private_metadata=metadata_codec.decode_private_metadata(body["view"]["private_metadata"])
+        # The store is the record of who picked which week, and takes the week's slot atomically; a repeat of the
+        # same view changes nothing, so a retry goes on to whatever the first delivery didn't finish
+        if confirmation_store is not None:
+            try:
+                confirmation_store.record(confirmations.from_metadata(private_metadata, body["view"]["id"], (body.get("user") or {}).get("id")))
+            except confirmations.SlotFull as e:
+                # The week filled up between the button check and this submission
+                logger.info(str(e))
+                campaign = campaign_registry.get(e.campaign_id) if campaign_registry else None
+                if campaign is not None:
+                    offer_open_weeks(client, campaign, get_full_weeks(campaign) | {e.week}, private_metadata["channel_id"], private_metadata["message_ts"], e.week)
+                return
+        #insert_at_end
+        with idempotency.once(idempotency_store, idempotency.confirm_key(body["view"]["id"])) as first:
+            if first:
+                client.chat_update(
+                    channel=private_metadata["channel_id"],
+                    ts=private_metadata["message_ts"],
+                    text=f"You have selected the week of *{private_metadata['date']}* for your Windows upgrade."
+                )
+        # The canvas writer checks its own key per row, so a retry that failed after the update still adds the row
+        canvas_rows.add(canvas_writer.CanvasRow(
+            row_id=body["view"]["id"],
+            markdown=f"{private_metadata['windows_version']}, {private_metadata['user_email']}, {private_metadata['date']}, `{get_todays_date()}`",
+            campaign_id=private_metadata.get("campaign_id") or confirmations.UNKNOWN_CAMPAIGN
+        ))
+        if flush_canvas_each_time:
+            # Without the canvas queue there is nothing to coalesce with once this invocation ends
+            canvas_rows.flush()
+    except SlackApiError as e:
+        logger.error(f"Failed to open modal: {e}")
+
+def handle_global_shortcut(body, client, logger):
+    logger.debug("Processing handle_global_shortcut")
+    try:
+        user_id = body["user"]["id"]
+        if user_id not in ALLOWED_USERS:
+            client.chat_postMessage(
+                channel=user_id,
+                text="You’re not authorized to use this shortcut. Contact #ask_bt if this seems wrong."
+            )
+            logger.info(f"Blocked {user_id}")
+        else:
+            client.views_open(
+                trigger_id=body["trigger_id"],
+                view=ui_templates.build_shortcut_modal("private_metadata")
+            )
+    except SlackApiError as e:
+        logger.error(f"Failed to open modal: {e}")
+
+def send_windows_message(client, email: str, schedules: dict[str:str], windows_version:str, user_id:str=None, campaign_id:str=None, full_weeks:frozenset=frozenset(), ordinal:int=None, time_zone:str=None) -> fanout.RecipientResult:
+    # With a campaign_id, a recipient already messaged by an earlier delivery of the same campaign is skipped.
+    # A paced campaign's recipient (ordinal is their position in it) is scheduled into their business hours instead.
+    key = idempotency.send_key(campaign_id, email) if campaign_id else None
+    campaign = campaign_registry.get(campaign_id) if campaign_registry else None
+    try:
+        with metrics.recorder.span("RecipientSend"), idempotency.once(idempotency_store, key) as first:
+            if not first:
+                return fanout.RecipientResult(email=email, ok=True, user_id=user_id, duplicate=True)
+            if user_id is None:
+                with metrics.recorder.span("CampaignPhase", Phase="lookup"):
+                    response = client.users_lookupByEmail(email=email)
+                user_id = response["user"]["id"]
+                time_zone = time_zone or response["user"].get("tz")
+            blocks = campaign.blocks_without(full_weeks) if campaign else ui_templates.build_blocks_message(schedules, windows_version, campaign_id or "")
+            post_at = campaign.pacing.post_at(ordinal, time_zone, time.time()) if campaign and campaign.pacing and ordinal is not None else None
+            if post_at is not None:
+                with metrics.recorder.span("CampaignPhase", Phase="schedule"):
+                    response = client.chat_scheduleMessage(channel=user_id, post_at=int(post_at), blocks=blocks, text="Message from Endpoint Engineering")
+                return fanout.RecipientResult(
+                    email=email, ok=True, user_id=user_id, scheduled_message_id=response["scheduled_message_id"], channel_id=response["channel"], post_at=post_at, time_zone=time_zone
+                )
+            with metrics.recorder.span("CampaignPhase", Phase="post"):
+                client.chat_postMessage(channel=user_id, blocks=blocks, text="Message from Endpoint Engineering")
+        return fanout.RecipientResult(email=email, ok=True, user_id=user_id, time_zone=time_zone)
+    except SlackApiError as e:
+        # Reported once per campaign by progress.record, grouped by error
+        return fanout.RecipientResult(email=email, ok=False, error=e.response["error"])
+
+def message_multiple_users(client, emails: list[str], schedules:dict[str:str], windows_version:str, max_workers:int=fanout.FANOUT_WORKERS, campaign_id:str=None, full_weeks:frozenset=frozenset(), ordinals:dict[str:int]=None) -> fanout.FanoutSummary:
+    logging.getLogger(__name__).debug(f"Processing message_multiple_users for {len(emails)} recipients")
+    emails = fanout.clean_emails(emails)
+    # Resolve the whole list against the index directory_index.refresh saved; only the misses cost a users_lookupByEmail call
+    with metrics.recorder.span("CampaignPhase", Phase="directory"):
+        index = directory_index.get_directory_index(job_queue)
+        resolved, misses = index.resolve(emails)
+    ordinals = ordinals or {}
+    summary = fanout.fan_out(
+        lambda email: send_windows_message(
+            client, email, schedules, windows_version, resolved.get(email), campaign_id, full_weeks, ordinals.get(email), index.time_zone(resolved.get(email))
+        ),
+        emails,
+        max_workers=max_workers
+    )
+    if misses:
+        for result in summary.results:
+            if result.ok and result.user_id and result.email not in resolved:
+                index.add(result.email, result.user_id, result.time_zone)
+    return summary
+
+def delete_scheduled(client, scheduled: list[tuple], logger) -> int:
+    """Deletes scheduled campaign messages that haven't gone out yet; returns how many were deleted."""
+    deleted = 0
+    now = time.time()
+    for channel, message_id, post_at in scheduled:
+        if post_at <= now:
+            continue
+        try:
+            client.chat_deleteScheduledMessage(channel=channel, scheduled_message_id=message_id)
+            deleted += 1
+        except SlackApiError as e:
+            # Already delivered or deleted, e.g. by an earlier attempt at the same chunk
+            if e.response["error"] != "invalid_scheduled_message_id":
+                logger.error(f"Failed to delete scheduled message {message_id}: {e}")
+    return deleted
+
+def send_campaign_batch(chunk: campaign_queue.Chunk, emails: list[str]) -> fanout.FanoutSummary:
+    logger = logging.getLogger(__name__)
+    # Campaign sends yield to modal opens and confirmations whenever both need the same rate-limit bucket
+    with rate_limits.lane(rate_limits.BULK), logging_config.correlation(chunk.key):
+        if chunk.action == campaign_queue.CANCEL:
+            entries = [entry.split(" ") for entry in emails]
+            deleted = delete_scheduled(bot_client, [(channel, message_id, float(post_at)) for channel, message_id, post_at in entries], logger)
+            logger.info(f"{chunk.key}: deleted {deleted} of {len(emails)} scheduled messages")
+            return fanout.FanoutSummary()
+        # Checked once per batch; a cancelled campaign's remaining recipients are dropped
+        if job_queue.is_cancelled(chunk.campaign_id):
+            logger.info(f"{chunk.key}: campaign cancelled, not messaging {len(emails)} recipients")
+            return fanout.FanoutSummary()
+        campaign = campaign_registry.get(chunk.campaign_id)
+        # Read once per batch, so newly sent messages only offer weeks that still have room
+        full_weeks = get_full_weeks(campaign)
+        ordinals = {email: chunk.offset + position for position, email in enumerate(chunk.emails)}
+        summary = message_multiple_users(bot_client, emails, chunk.schedules, chunk.windows_version, campaign_id=chunk.campaign_id, full_weeks=full_weeks, ordinals=ordinals)
+        scheduled = [(result.channel_id, result.scheduled_message_id, result.post_at) for result in summary.results if result.scheduled_message_id]
+        if scheduled:
+            job_queue.add_scheduled(chunk.campaign_id, chunk.chunk_index, scheduled)
+        # Cancelled while this batch was in flight: the cancel didn't see its scheduled messages, and the status
+        # message already says cancelled
+        if job_queue.is_cancelled(chunk.campaign_id):
+            delete_scheduled(bot_client, scheduled, logger)
+            return summary
+        progress.record(bot_client, job_queue, chunk, summary.results, paced=bool(campaign and campaign.pacing), batch_start=ordinals[emails[0]] - chunk.offset)
+    logger.info(f"{chunk.key}: sent {summary.sent}, skipped {summary.skipped} already sent, failed {summary.failed} in {summary.elapsed:.2f}s")
+    logger.info(f"{chunk.key}: rate limits {rate_limits.governor.snapshot()}")
+    return summary
+
+def handle_cancel_campaign(body, client, logger):
+    logger.debug("Processing handle_cancel_campaign")
+    try:
+        user_id = body["user"]["id"]
+        if user_id not in ALLOWED_USERS:
+            client.chat_postMessage(channel=user_id, text="You’re not authorized to cancel campaigns. Contact #ask_bt if this seems wrong.")
+            logger.info(f"Blocked {user_id} from cancelling a campaign")
+            return
+        campaign_id = body["actions"][0]["value"]
+        key = idempotency.action_key(body["actions"][0]["action_id"], body["message"]["ts"], body.get("trigger_id"))
+        with idempotency.once(idempotency_store, key) as first:
+            if not first:
+                return
+            # Workers check this before every batch, so nobody else is messaged from here on
+            job_queue.cancel_campaign(campaign_id)
+            now = time.time()
+            pending = [f"{channel} {message_id} {int(post_at)}" for channel, message_id, post_at in job_queue.get_scheduled(campaign_id) if post_at > now]
+            # chat.deleteScheduledMessage is Tier 3, so a large campaign's deletions take longer than one invocation;
+            # they go through the campaign queue, soonest first, with the same checkpoints and retries as sends
+            chunks = campaign_queue.enqueue_campaign(job_queue, pending, {}, "", campaign_id=campaign_id, action=campaign_queue.CANCEL)
+            text = f"{body['message'].get('text', '')}\n:no_entry_sign: Cancelled by <@{user_id}>: no further recipients will be messaged, and {len(pending):,} scheduled messages are being deleted."
+            client.chat_update(
+                channel=body["container"]["channel_id"],
+                ts=body["message"]["ts"],
+                text=text,
+                blocks=progress.status_blocks(text, campaign_id, cancellable=False)
+            )
+        logger.info(f"{campaign_id}: cancelled, {chunks} chunks of scheduled messages to delete")
+        if chunks and drain_queue_inline and campaign_queue.CAMPAIGN_QUEUE_BACKEND != "sqs":
+            campaign_queue.run_workers(job_queue, send_campaign_batch)
+    except SlackApiError as e:
+        logger.error(f"Failed to cancel campaign: {e}")
+
+def send_preflight_summary(client, body, recipient_list: recipients.RecipientList, logger):
+    """Tells the submitter how many addresses will be messaged before the first chunk is queued."""
+    logger.info(f"Preflight: {recipient_list.valid} valid, {recipient_list.duplicate} duplicate, {recipient_list.invalid} invalid")
+    user_id = (body.get("user") or {}).get("id")
+    if user_id is None:
+        return
+    text = recipient_list.summary() if recipient_list.valid else f"Nothing to send. {recipient_list.summary()}"
+    try:
+        client.chat_postMessage(channel=user_id, text=f":clipboard: Campaign preflight: {text}")
+    except SlackApiError as e:
+        logger.error(f"Failed to send preflight summary: {e}")
+
+def read_shortcut_submission(view) -> tuple[str, str, list, int, int, dict]:
+    """The shortcut modal's fields: (windows_version, pasted emails, uploaded files, slot capacity, recipients per minute, schedules)."""
+    windows_version=(view["state"]["values"].get("windows_version", {}).get("windows_version-action") or {}).get("value") or WINDOWS_VERSION
+    # Both recipient inputs are optional: a pasted list, an uploaded CSV, or both
+    provided_emails=(view["state"]["values"].get("provided_emails", {}).get("provided_emails-action") or {}).get("value")
+    provided_files=(view["state"]["values"].get("recipients_file", {}).get("recipients_file-action") or {}).get("files") or []
+    slot_capacity=int((view["state"]["values"].get("slot_capacity", {}).get("slot_capacity-action") or {}).get("value") or SLOT_CAPACITY)
+    per_minute=int((view["state"]["values"].get("pacing_per_minute", {}).get("pacing_per_minute-action") or {}).get("value") or pacing.PACING_PER_MINUTE)
+    provided_schedules={
+        "windows_version":windows_version,
+        "tentative_schedule": view["state"]["values"]["tentative_schedule"]["tentative_schedule-action"]["value"],
+        "alternate_schedule_1": view["state"]["values"]["alternate_schedule_1"]["alternate_schedule_1-action"]["value"],
+        "alternate_schedule_2": view["state"]["values"]["alternate_schedule_2"]["alternate_schedule_2-action"]["value"],
+        "alternate_schedule_3": view["state"]["values"]["alternate_schedule_3"]["alternate_schedule_3-action"]["value"],
+        "alternate_schedule_4": view["state"]["values"]["alternate_schedule_4"]["alternate_schedule_4-action"]["value"],
+        "alternate_schedule_5": view["state"]["values"]["alternate_schedule_5"]["alternate_schedule_5-action"]["value"]
+    }
+    return windows_version, provided_emails, provided_files, slot_capacity, per_minute, provided_schedules
+
+def handle_shortcut_submission_events(ack, body, client, logger, view):
+    ack()
+    logger.debug("Processing handle_shortcut_submission_events")
+    # The body carries every submitted email; log_payload samples, truncates and (via the handler) redacts it
+    logging_config.log_payload(logger, body)
+    windows_version, provided_emails, provided_files, slot_capacity, per_minute, provided_schedules = read_shortcut_submission(view)
+    # The view ID is the same on every retry of this submission, so it doubles as the campaign ID
+    view_id = view.get("id")
+    with idempotency.once(idempotency_store, idempotency.campaign_key(view_id) if view_id else None) as first:
+        if not first:
+            logger.info(f"{view_id}: campaign already queued, ignoring the retried submission")
+            return
+        sources = [recipients.text_lines(provided_emails), *(recipients.download_lines(client, file) for file in provided_files)]
+        with recipients.preflight(sources) as recipient_list:
+            send_preflight_summary(client, body, recipient_list, logger)
+            if not recipient_list.valid:
+                return
+            # Registered before the first send, so a click on any message of this campaign finds it
+            campaign = campaigns.Campaign.create(
+                windows_version, provided_schedules, campaign_id=view_id, capacity=slot_capacity or None, per_minute=per_minute, created_by=(body.get("user") or {}).get("id")
+            )
+            campaign_registry.put(campaign)
+            if campaign.capacities:
+                if confirmation_store is None:
+                    logger.warning(f"{campaign.campaign_id}: no confirmation store to enforce a capacity of {campaign.capacity} per week")
+                else:
+                    confirmation_store.set_capacity(campaign.campaign_id, campaign.capacities)
+            # One status message in LOG_CHANNEL per campaign, updated as chunks are sent
+            progress_ts = progress.start(client, LOG_CHANNEL, windows_version, recipient_list.valid, campaign.campaign_id, paced=campaign.pacing is not None)
+            chunks = campaign_queue.enqueue_campaign(
+                job_queue, recipient_list, provided_schedules, windows_version, campaign_id=campaign.campaign_id,
+                total=recipient_list.valid, progress_channel=LOG_CHANNEL, progress_ts=progress_ts
+            )
+    logger.info(f"{windows_version}: queued {chunks} chunks")
+    if drain_queue_inline and campaign_queue.CAMPAIGN_QUEUE_BACKEND != "sqs":
+        # Local backends have no separate consumer unless serve_workers runs one, so drain the queue here
+        campaign_queue.run_workers(job_queue, send_campaign_batch)
+
+reschedule_action_ids = [
+    "confirm_reschedule_1",
+    "confirm_reschedule_2",
+    "confirm_reschedule_3",
+    "confirm_reschedule_4",
+    "confirm_reschedule_5"
+]
+
+def register_listeners(app, queue, canvas, flush_canvas: bool = False, store=None, confirmations_store=None, drain_queue: bool = True):
+    """Registers every shortcut, action and view listener on app and wires in the queue and canvas writer it sends through.
+
+    store is the idempotency store that turns a retried Slack delivery into a no-op; by default IDEMPOTENCY_BACKEND's.
+    confirmations_store records every confirmed week and enforces campaign capacities; without one, confirmations
+    only reach the canvas and every week is unlimited. drain_queue=False leaves queued chunks to a
+    campaign_queue.serve_workers pool instead of sending them on the listener's thread.
+
+    Every ack and lazy function is wrapped to record ListenerDuration{Listener, Phase}, and every log line written
+    while handling a request carries its correlation ID.
+    """
+    global bot_client, job_queue, canvas_rows, flush_canvas_each_time, idempotency_store, campaign_registry, confirmation_store, drain_queue_inline
+    bot_client, job_queue, canvas_rows, flush_canvas_each_time = app.client, queue, canvas, flush_canvas
+    drain_queue_inline = drain_queue
+    confirmation_store = confirmations_store
+    campaign_registry = campaigns.CampaignRegistry(queue)
+    idempotency_store = store or idempotency.get_store()
+    app.use(logging_config.correlation_middleware)
+    for register, lazy_function in [
+        *[(app.action(action_id), handle_alternative_choice) for action_id in reschedule_action_ids],
+        (app.view("confirmation_view"), handle_view_submission_events),
+        (app.shortcut("windows_update_callbackid"), handle_global_shortcut),
+        (app.view("windows_update_modal_view"), handle_shortcut_submission_events),
+        (app.action(progress.CANCEL_ACTION_ID), handle_cancel_campaign),
+    ]:
+        name = lazy_function.__name__
+        register(
+            ack=metrics.timed_listener(respond_to_slack_within_3_seconds, name, "ack"),
+            lazy=[logging_config.with_correlation(metrics.timed_listener(lazy_function, name, "lazy"))]
+        )
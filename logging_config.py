@@ -0,0 +1,166 @@
+import os
+import re
+import sys
+import json
+import queue
+import random
+import atexit
+import hashlib
+import inspect
+import logging
+import functools
+import contextvars
+import logging.handlers
+from contextlib import contextmanager
+from typing import Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# slack_sdk logs every request and response body at DEBUG, which is most of the ingestion cost on a campaign
+LIBRARY_LOG_LEVEL = os.getenv("LIBRARY_LOG_LEVEL", "WARNING").upper()
+LIBRARY_LOGGERS = ("slack_sdk", "slack_bolt", "urllib3", "botocore", "boto3", "s3transfer")
+# Share of Slack payloads logged in full; the rest only get a one-line summary
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))
+LOG_REDACT = os.getenv("LOG_REDACT", "true").lower() != "false"
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(correlation_id)s] %(name)s: %(message)s"
+
+EMAIL_PATTERN = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+# Slack user IDs: U or W followed by 8 or more uppercase letters and digits
+USER_ID_PATTERN = re.compile(r"\b[UW][A-Z0-9]{8,}\b")
+
+_correlation_id = contextvars.ContextVar("correlation_id", default="-")
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue: Optional[queue.Queue] = None
+
+def pseudonym(kind: str, value: str) -> str:
+    """The same value always maps to the same short token, so redacted logs can still be followed per person."""
+    return f"<{kind}:{hashlib.sha256(value.lower().encode('utf-8')).hexdigest()[:8]}>"
+
+def redact(text: str) -> str:
+    text = EMAIL_PATTERN.sub(lambda match: pseudonym("email", match.group(0)), text)
+    return USER_ID_PATTERN.sub(lambda match: pseudonym("user", match.group(0)), text)
+
+class CorrelationFilter(logging.Filter):
+    """Stamps each record with the correlation ID of the request it was logged for, on the thread that logged it."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = _correlation_id.get()
+        return True
+
+class RedactingFilter(logging.Filter):
+    """Replaces emails and Slack user IDs with pseudonyms; runs on the queue listener's thread, off the request path.
+
+    Covers the traceback and stack too: exception messages often quote the address or user a call failed for.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.msg = redact(record.getMessage())
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            # Formatted here, so the handler's formatter finds exc_text already set and uses the redacted copy
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        if record.exc_text:
+            record.exc_text = redact(record.exc_text)
+        if record.stack_info:
+            record.stack_info = redact(record.stack_info)
+        return True
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock prepare() formats the record on the caller's thread; only merge the args and leave formatting
+        # (and redaction) to the listener thread
+        record = super().prepare(record) if record.exc_info else record
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+def configure(level: str = LOG_LEVEL, library_level: str = LIBRARY_LOG_LEVEL, stream=None):
+    """Routes every log record through a queue to one stream handler on a background thread.
+
+    Replaces any handlers already on the root logger, including the one the Lambda runtime installs.
+    """
+    global _listener, _queue
+    if _listener is not None:
+        _listener.stop()
+    _queue = queue.Queue(-1)
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+    if LOG_REDACT:
+        output.addFilter(RedactingFilter())
+    _listener = logging.handlers.QueueListener(_queue, output, respect_handler_level=True)
+    _listener.start()
+
+    handler = _QueueHandler(_queue)
+    handler.addFilter(CorrelationFilter())
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    for name in LIBRARY_LOGGERS:
+        logging.getLogger(name).setLevel(library_level)
+
+def flush():
+    """Blocks until every queued record is written; the Lambda calls this before returning so nothing is lost on freeze."""
+    if _queue is not None:
+        _queue.join()
+
+@atexit.register
+def _stop():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+@contextmanager
+def correlation(correlation_id: str):
+    token = _correlation_id.set(correlation_id)
+    try:
+        yield
+    finally:
+        _correlation_id.reset(token)
+
+def correlation_id_for(body: dict) -> str:
+    """An ID every log line for one Slack interaction shares, across the ack and the lazy invocation."""
+    view = body.get("view") or {}
+    return body.get("trigger_id") or view.get("id") or body.get("event_id") or body.get("envelope_id") or "-"
+
+def correlation_middleware(body, next):
+    """Bolt global middleware: tags everything logged while handling the request with its correlation ID."""
+    with correlation(correlation_id_for(body)):
+        return next()
+
+async def async_correlation_middleware(body, next):
+    """correlation_middleware for AsyncApp."""
+    with correlation(correlation_id_for(body)):
+        return await next()
+
+def with_correlation(function):
+    """Wraps a lazy listener, which bolt runs on another thread (or invocation) than the middleware, the same way."""
+    if inspect.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            with correlation(correlation_id_for(kwargs.get("body") or {})):
+                return await function(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with correlation(correlation_id_for(kwargs.get("body") or {})):
+            return function(*args, **kwargs)
+    return wrapper
+
+def log_payload(logger: logging.Logger, body: dict, level: int = logging.INFO):
+    """Logs a sampled, truncated copy of a Slack payload; unsampled payloads only log their type and IDs."""
+    if not logger.isEnabledFor(level):
+        return
+    if random.random() < LOG_PAYLOAD_SAMPLE_RATE:
+        payload = json.dumps(body, separators=(",", ":"), default=str)
+        if len(payload) > LOG_PAYLOAD_MAX_CHARS:
+            payload = f"{payload[:LOG_PAYLOAD_MAX_CHARS]}... ({len(payload)} chars)"
+        logger.log(level, f"Payload: {payload}")
+    else:
+        actions = [action.get("action_id") for action in body.get("actions", [])]
+        view = body.get("view") or {}
+        logger.log(level, f"Payload type={body.get('type')} user={(body.get('user') or {}).get('id')} actions={actions} view={view.get('callback_id')}")
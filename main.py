@@ -1,165 +1,177 @@
 import os
-import json
+import time
+import base64
 import logging
-import datetime
-from zoneinfo import ZoneInfo
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 # custom py modules
-import ui_templates
-import aws_secrets
-# Slack imports
-from slack_bolt import App
-from slack_bolt.adapter.aws_lambda import SlackRequestHandler
-from slack_sdk.errors import SlackApiError
+import startup
+import logging_config
+startup_timer = startup.StartupTimer()
 
-logging.basicConfig(level=logging.DEBUG)
 load_dotenv()
+logging_config.configure()
 
-SLACK_SIGNING_SECRET = aws_secrets.get_signing_secret()
-SLACK_BOT_TOKEN = aws_secrets.get_bot_token()
-SLACK_CANVAS = os.getenv("SLACK_CANVAS")
-ALLOWED_USERS=os.getenv("ALLOWED_USERS").split(",")
-LOG_CHANNEL=os.getenv("LOG_CHANNEL")
-WINDOWS_VERSION="Windows 11 24H2"
+def load_secrets() -> tuple[str, str]:
+    # Both secrets come back from one batched Secrets Manager call and stay cached for the container's lifetime
+    import aws_secrets
+    return aws_secrets.get_signing_secret(), aws_secrets.get_bot_token()
 
-app = App(
-    token=SLACK_BOT_TOKEN,
-    signing_secret=SLACK_SIGNING_SECRET,
-    process_before_response=True
-)
+def build_lambda_client():
+    # boto3 is imported by bolt's Lambda adapter anyway; what this saves is loading the client's service model, which
+    # bolt otherwise does inside the first lazy dispatch, in the 3-second ack window. Its own session, since the
+    # default one isn't safe to build from two threads.
+    import boto3
+    return boto3.session.Session().client("lambda")
 
-def get_todays_date() -> str:
-    """Returns today's date in the format %Y-%m-%d %I:%M:%S %p %Z."""
-    # Get the current datetime object
-    now = datetime.datetime.now()
-    # Convert to Pacific Time (Los Angeles)
-    pacific_timezone = ZoneInfo("America/Los_Angeles") 
-    now_aware = now.astimezone(pacific_timezone)
-    formatted_datetime = now_aware.strftime("%Y-%m-%d %I:%M:%S %p %Z")
-    return formatted_datetime
+# The network-bound init work runs while the Slack imports below happen on the main thread
+init_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="init")
+secrets_future = init_executor.submit(startup.timed_call, load_secrets)
+lambda_client_future = init_executor.submit(startup.timed_call, build_lambda_client)
 
-def respond_to_slack_within_3_seconds(ack):
-    ack()
+with startup_timer.phase("imports"):
+    import listeners
+    import campaign_queue
+    import idempotency
+    import confirmations
+    import canvas_writer
+    import directory_index
+    import aws_secrets
+    import slack_clients
+    import metrics
+    import rate_limits
+    # Slack imports
+    from slack_bolt import App
+    from slack_bolt.adapter.aws_lambda import SlackRequestHandler
+    from slack_bolt.adapter.aws_lambda.lazy_listener_runner import LambdaLazyListenerRunner
+    from slack_sdk.signature import SignatureVerifier
+job_queue_future = init_executor.submit(startup.timed_call, campaign_queue.get_queue)
+idempotency_future = init_executor.submit(startup.timed_call, idempotency.get_store)
+confirmations_future = init_executor.submit(startup.timed_call, confirmations.get_store)
+# Opens keep-alive connections to slack.com now so the first request's API calls reuse them
+slack_pool = slack_clients.ConnectionPool()
+warm_future = init_executor.submit(startup.timed_call, slack_pool.warm, startup.WARM_CONNECTIONS)
 
-def get_user_email(client, user_id:str) -> str:
-    user_object = client.users_info(user=user_id)
-    return user_object["user"]["profile"]["email"]
+(SLACK_SIGNING_SECRET, SLACK_BOT_TOKEN), secrets_seconds = secrets_future.result()
+startup_timer.record("secrets", secrets_seconds)
+SLACK_CANVAS = listeners.SLACK_CANVAS
 
-def handle_alternative_choice(body, client, logger):
-    print("-------------- Processing handle_alternative_choice....\n")
-    try:
-        logger.info(body)
-        trigger_id = body["trigger_id"]
-        selected_date = body["actions"][0]["value"]
-        email = get_user_email(client, body["user"]["id"])
-        private_metadata = {
-            "date": selected_date,
-            "message_ts": body["message"]["ts"],
-            "channel_id": body["container"]["channel_id"],
-            "caller_id": body["user"]["id"],
-            "user_email": email,
-            "windows_version": WINDOWS_VERSION
-        }
-        confirmation_message = f":spiral_calendar_pad: I am scheduling my Windows upgrade on *{selected_date}*"
-        client.views_open(
-            view=ui_templates.build_confirmation_modal(private_metadata, confirmation_message),
-            trigger_id=trigger_id
-        )
-    except SlackApiError as e:
-        logger.error(f"Failed to open modal: {e}")
+class LambdaRequestHandler(SlackRequestHandler):
+    """SlackRequestHandler whose lazy listeners are invoked through a Lambda client built during init."""
 
-reschedule_action_ids = [
-    "confirm_reschedule_1",
-    "confirm_reschedule_2",
-    "confirm_reschedule_3",
-    "confirm_reschedule_4",
-    "confirm_reschedule_5"
-]
-for action_id in reschedule_action_ids:
-    app.action(action_id)(ack=respond_to_slack_within_3_seconds, lazy=[handle_alternative_choice])
+    def __init__(self, app: App, lambda_client):
+        super().__init__(app)
+        # The same runner the adapter installs, given the client through its lambda_client parameter
+        self.app.listener_runner.lazy_listener_runner = LambdaLazyListenerRunner(self.logger, lambda_client=lambda_client)
 
-def handle_view_submission_events(body, client, logger):
-    print("-------------- Processing handle_view_submission_events....\n")
-    try:
-        logger.info(body)
-        private_metadata=json.loads(body["view"]["private_metadata"])
-        #insert_at_end
-        client.chat_update(
-            channel=private_metadata["channel_id"],
-            ts=private_metadata["message_ts"],
-            text=f"You have selected the week of *{private_metadata['date']}* for your Windows upgrade."
-        )
-        client.canvases_edit(
-            canvas_id=SLACK_CANVAS,
-            changes=[{"operation":"insert_at_end",
-                    "document_content":{"type":"markdown","markdown":f"{private_metadata["windows_version"]}, {private_metadata['user_email']}, {private_metadata['date']}, `{get_todays_date()}`"}}]
-        )
-    except SlackApiError as e:
-        logger.error(f"Failed to open modal: {e}")
-app.view("confirmation_view")(ack=respond_to_slack_within_3_seconds, lazy=[handle_view_submission_events])
+with startup_timer.phase("app"):
+    app = App(
+        client=slack_clients.build_web_client(SLACK_BOT_TOKEN, pool=slack_pool),
+        signing_secret=SLACK_SIGNING_SECRET,
+        # Verified by RotatingRequestVerification instead, which refetches the secret after a rotation
+        request_verification_enabled=False,
+        before_authorize=aws_secrets.RotatingRequestVerification(aws_secrets.secrets),
+        process_before_response=True
+    )
+    lambda_client, lambda_client_seconds = lambda_client_future.result()
+    # Built once per container and reused by every invocation
+    slack_handler = LambdaRequestHandler(app, lambda_client)
+startup_timer.record("lambda client", lambda_client_seconds)
+job_queue, job_queue_seconds = job_queue_future.result()
+startup_timer.record("job queue", job_queue_seconds)
+idempotency_store, idempotency_seconds = idempotency_future.result()
+startup_timer.record("idempotency store", idempotency_seconds)
+confirmation_store, confirmations_seconds = confirmations_future.result()
+startup_timer.record("confirmation store", confirmations_seconds)
+canvas_rows = canvas_writer.get_canvas_writer(app.client, SLACK_CANVAS, store=idempotency_store, confirmation_store=confirmation_store)
+slack_clients.use_pooled_clients(app)
+listeners.register_listeners(app, job_queue, canvas_rows, flush_canvas=True, store=idempotency_store, confirmations_store=confirmation_store)
+_, warm_seconds = warm_future.result()
+startup_timer.record("slack warm-up", warm_seconds)
+init_executor.shutdown(wait=False)
+logging.getLogger(__name__).info(startup_timer.report())
+for phase, seconds in startup_timer.phases.items():
+    metrics.recorder.record("InitPhaseDuration", seconds * 1000, Phase=phase)
+cold_start = True
+# The campaign queue's trigger runs at most this many containers at once, each sending with its own governor, so each
+# takes an equal share of the bot token's limits; SLACK_RATE_LIMIT_SHARE overrides it, as for Socket Mode replicas
+CAMPAIGN_CONCURRENCY = int(os.getenv("CAMPAIGN_CONCURRENCY", "1"))
+rate_limits.governor.set_share(float(os.getenv("SLACK_RATE_LIMIT_SHARE", str(1 / CAMPAIGN_CONCURRENCY))))
+# Slack retries an unacked delivery up to three times over about five minutes; once one retry is being handled, the
+# others inside this window are acked and dropped
+RETRY_FINGERPRINT_SECONDS = float(os.getenv("RETRY_FINGERPRINT_SECONDS", "600"))
+RETRY_ACK = {"statusCode": 200, "headers": {"X-Slack-No-Retry": "1"}, "body": ""}
 
-def handle_global_shortcut(body, client, logger):
-    print("-------------- Processing handle_global_shortcut....\n")
-    try:
-        user_id = body["user"]["id"]
-        if user_id not in ALLOWED_USERS:
-            client.chat_postMessage(
-                channel=user_id,
-                text="You’re not authorized to use this shortcut. Contact #ask_bt if this seems wrong."
-            )
-            logger.info(f"Blocked {user_id}")
-        else:
-            client.views_open(
-                trigger_id=body["trigger_id"],
-                view=ui_templates.build_shortcut_modal("private_metadata")
-            )
-    except SlackApiError as e:
-        logger.error(f"Failed to open modal: {e}")
-app.shortcut("windows_update_callbackid")(ack=respond_to_slack_within_3_seconds, lazy=[handle_global_shortcut])
-
-def send_windows_message(client, email: str, schedules: dict[str:str], windows_version:str):
-    print("-------------- Processing send_windows_message....\n")
-    try:
-        response = app.client.users_lookupByEmail(email=email)
-        user_id = response["user"]["id"]
-        client.chat_postMessage(
-            channel=user_id,
-            blocks=ui_templates.build_blocks_message(schedules, windows_version),
-            text="Message from Endpoint Engineering"
-        )
-        ui_templates.update_confirmation_template({"user_email":email})
-    except SlackApiError as e:
-        client.chat_postMessage(
-            channel=LOG_CHANNEL,
-            markdown_text=f'''--------{windows_version}-------\nFailed for {email}: {e.response['error']}"'''
-        )
-        print(f"Failed for {email}: {e.response['error']}")
+def delivery_fingerprint(event) -> Optional[str]:
+    """Idempotency key for a Slack retry's ack invocation, or None for first deliveries, lazy invocations and anything not from Slack.
 
-def message_multiple_users(client, emails: list[str], schedules:dict[str:str], windows_version:str):
-    print("-------------- Processing message_multiple_users....\n")
-    for email in emails: send_windows_message(client, email.strip(), schedules, windows_version) 
-
-
-def handle_shortcut_submission_events(ack, body, client, logger, view):
-    ack()
-    print("-------------- Processing handle_shortcut_submission_events....\n")
-    logger.info(body)
-    windows_version=WINDOWS_VERSION #view["state"]["values"]["windows_version"]["windows_version-action"]["value"]
-    provided_emails=view["state"]["values"]["provided_emails"]["provided_emails-action"]["value"].split(",")
-    provided_schedules={
-        "windows_version":WINDOWS_VERSION, #view["state"]["values"]["windows_version"]["windows_version-action"]["value"],
-        "tentative_schedule": view["state"]["values"]["tentative_schedule"]["tentative_schedule-action"]["value"],
-        "alternate_schedule_1": view["state"]["values"]["alternate_schedule_1"]["alternate_schedule_1-action"]["value"],
-        "alternate_schedule_2": view["state"]["values"]["alternate_schedule_2"]["alternate_schedule_2-action"]["value"],
-        "alternate_schedule_3": view["state"]["values"]["alternate_schedule_3"]["alternate_schedule_3-action"]["value"],
-        "alternate_schedule_4": view["state"]["values"]["alternate_schedule_4"]["alternate_schedule_4-action"]["value"],
-        "alternate_schedule_5": view["state"]["values"]["alternate_schedule_5"]["alternate_schedule_5-action"]["value"]
-    }
-    ui_templates.update_confirmation_template(provided_schedules)
-    message_multiple_users(client, provided_emails, provided_schedules, windows_version)
-app.view("windows_update_modal_view")(ack=respond_to_slack_within_3_seconds, lazy=[handle_shortcut_submission_events])
+    First deliveries go straight to bolt, so the common path pays for no hashing, signature check or store call.
+    The key is the hash of the raw body, which Slack repeats on every retry: the first retry claims it and is
+    handled, and the listeners' own keys make its side effects no-ops if the original delivery already did them.
+    Only a correctly signed, fresh retry gets a key, so unsigned or stale POSTs never touch the store. A signature
+    that fails against the cached secret also gets None: bolt then rejects the request, or accepts it after
+    refetching a rotated secret.
+    """
+    if event.get("method") == "NONE":
+        return None
+    headers = {name.lower(): value for name, value in (event.get("headers") or {}).items()}
+    if "x-slack-signature" not in headers or "x-slack-retry-num" not in headers:
+        return None
+    body = event.get("body") or ""
+    body = base64.b64decode(body) if event.get("isBase64Encoded") else body.encode("utf-8")
+    verifier = SignatureVerifier(aws_secrets.secrets.get("signing_secret"))
+    if not verifier.is_valid(body, headers.get("x-slack-request-timestamp", "0"), headers["x-slack-signature"]):
+        return None
+    return idempotency.delivery_key(body)
 
 # AWS Lambda entrypoint
 def handler(event, context):
-    slack_handler = SlackRequestHandler(app=app)
-    return slack_handler.handle(event, context)
\ No newline at end of file
+    # Slack requests get a more specific ID from the correlation middleware
+    with logging_config.correlation(getattr(context, "aws_request_id", "-")):
+        try:
+            return handle_event(event, context)
+        finally:
+            # Lambda may freeze the container as soon as we return, so every invocation ships its own metrics and logs
+            metrics.flush()
+            logging_config.flush()
+
+def handle_event(event, context):
+    if canvas_writer.is_canvas_event(event):
+        # Confirmation rows batched by the canvas queue's trigger
+        return canvas_writer.handle_sqs_event(event, app.client, SLACK_CANVAS, store=idempotency_store, confirmation_store=confirmation_store)
+    if "Records" in event:
+        # Campaign chunks delivered by the SQS trigger
+        return campaign_queue.handle_sqs_event(event, context, job_queue, listeners.send_campaign_batch)
+    if event.get("directory_refresh"):
+        # The every-minute schedule: a few more pages of the users.list walk, resumed from the cursor in the queue backend
+        fresh = directory_index.refresh(app.client, job_queue, remaining_seconds=lambda: context.get_remaining_time_in_millis() / 1000)
+        return {"fresh": fresh}
+    global cold_start
+    started = time.perf_counter()
+    key = delivery_fingerprint(event)
+    if key is not None and not idempotency_store.claim(key, lease_seconds=RETRY_FINGERPRINT_SECONDS, ttl=RETRY_FINGERPRINT_SECONDS):
+        # A container is already handling (or has handled) an earlier retry of this delivery; skip bolt and the lazy self-invoke
+        headers = {name.lower(): value for name, value in (event.get("headers") or {}).items()}
+        metrics.recorder.count("DuplicateSuppressed", Kind="delivery")
+        metrics.recorder.record("RequestDuration", (time.perf_counter() - started) * 1000, Kind="retry", ColdStart=str(cold_start).lower())
+        logging.getLogger(__name__).info(f"Acked Slack retry {headers.get('x-slack-retry-num')} ({headers.get('x-slack-retry-reason')}) of a delivery already being retried")
+        cold_start = False
+        return RETRY_ACK
+    try:
+        response = slack_handler.handle(event, context)
+    except Exception:
+        if key is not None:
+            # Nothing was acked, so let Slack's retry through
+            idempotency_store.release(key)
+        raise
+    if key is not None and not 200 <= response.get("statusCode", 200) < 300:
+        # Slack retries a 401 or 5xx, and that retry has to be handled rather than acked as a duplicate
+        idempotency_store.release(key)
+    elapsed = time.perf_counter() - started
+    # Bolt re-invokes this function with method NONE to run lazy listeners; everything else is Slack waiting on an ack
+    kind = "lazy" if event.get("method") == "NONE" else "ack"
+    metrics.recorder.record("RequestDuration", elapsed * 1000, Kind=kind, ColdStart=str(cold_start).lower())
+    logging.getLogger(__name__).info(f"Handled Slack request in {elapsed * 1000:.0f}ms (cold start: {cold_start})")
+    cold_start = False
+    return response
\ No newline at end of file
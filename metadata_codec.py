@@ -0,0 +1,42 @@
+import json
+import zlib
+import base64
+
+# Slack rejects views whose private_metadata is longer than this
+PRIVATE_METADATA_LIMIT = 3000
+# Only payloads longer than this are worth the zlib + base64 overhead
+COMPRESS_OVER = 512
+COMPRESSED_PREFIX = "z:"
+
+SHORT_KEYS = {
+    "date": "d",
+    "message_ts": "t",
+    "channel_id": "c",
+    "caller_id": "u",
+    "user_email": "e",
+    "windows_version": "v",
+    "campaign_id": "k",
+}
+LONG_KEYS = {short: long for long, short in SHORT_KEYS.items()}
+
+class PrivateMetadataTooLarge(ValueError):
+    pass
+
+def encode_private_metadata(metadata: dict, compress: bool = True) -> str:
+    """Packs metadata into short-key compact JSON, compressing large payloads, within Slack's 3,000 character limit."""
+    packed = json.dumps({SHORT_KEYS.get(key, key): value for key, value in metadata.items()}, separators=(",", ":"), ensure_ascii=False)
+    if compress and len(packed) > COMPRESS_OVER:
+        compressed = COMPRESSED_PREFIX + base64.b64encode(zlib.compress(packed.encode("utf-8"), 9)).decode("ascii")
+        if len(compressed) < len(packed):
+            packed = compressed
+    if len(packed) > PRIVATE_METADATA_LIMIT:
+        raise PrivateMetadataTooLarge(f"private_metadata is {len(packed)} characters, Slack allows {PRIVATE_METADATA_LIMIT}")
+    return packed
+
+def decode_private_metadata(private_metadata: str) -> dict:
+    """Inverse of encode_private_metadata; long-key JSON from modals opened before the codec still decodes."""
+    if not private_metadata:
+        return {}
+    if private_metadata.startswith(COMPRESSED_PREFIX):
+        private_metadata = zlib.decompress(base64.b64decode(private_metadata[len(COMPRESSED_PREFIX):])).decode("utf-8")
+    return {LONG_KEYS.get(key, key): value for key, value in json.loads(private_metadata).items()}
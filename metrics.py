@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import time
+import inspect
+import logging
+import functools
+import threading
+import statistics
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from slack_sdk.errors import SlackApiError
+
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "SlackWindowsUpgrade")
+# emf: CloudWatch Embedded Metric Format lines on stdout, text: a readable summary in the log, none: drop
+METRICS_EXPORTER = os.getenv("METRICS_EXPORTER", "emf")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "60"))
+# EMF accepts at most 100 distinct values per metric per document
+EMF_MAX_VALUES = 100
+
+logger = logging.getLogger(__name__)
+
+def error_code(error: BaseException) -> str:
+    if isinstance(error, SlackApiError):
+        return str(error.response.get("error") or error.response.status_code)
+    return type(error).__name__
+
+class MetricsRecorder:
+    """Collects latencies and counts in memory, keyed by metric name and dimensions, until an exporter drains them."""
+
+    def __init__(self):
+        self._values: defaultdict[tuple, list[float]] = defaultdict(list)
+        self._units: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, value: float, unit: str = "Milliseconds", **dimensions):
+        key = (name, tuple(sorted(dimensions.items())))
+        with self._lock:
+            self._values[key].append(value)
+            self._units[name] = unit
+
+    def count(self, name: str, value: int = 1, **dimensions):
+        self.record(name, value, unit="Count", **dimensions)
+
+    @contextmanager
+    def span(self, name: str, **dimensions):
+        """Records the block's duration in ms as name; an exception also counts name + "Errors" by error code."""
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            self.count(name + "Errors", ErrorCode=error_code(e), **dimensions)
+            raise
+        finally:
+            self.record(name, (time.perf_counter() - started) * 1000, **dimensions)
+
+    def drain(self) -> list[tuple[str, dict, str, list[float]]]:
+        """Returns and clears everything recorded as (name, dimensions, unit, values)."""
+        with self._lock:
+            values, self._values = self._values, defaultdict(list)
+            return [(name, dict(dimensions), self._units[name], recorded) for (name, dimensions), recorded in values.items()]
+
+class EMFExporter:
+    """Prints one CloudWatch Embedded Metric Format document per dimension set; Lambda ships stdout to CloudWatch."""
+
+    def __init__(self, namespace: str = METRICS_NAMESPACE, stream=None):
+        self.namespace = namespace
+        self.stream = stream or sys.stdout
+
+    def export(self, entries: list):
+        by_dimensions = defaultdict(list)
+        for name, dimensions, unit, values in entries:
+            by_dimensions[tuple(sorted(dimensions.items()))].append((name, unit, values))
+        timestamp = int(time.time() * 1000)
+        for dimensions, metrics in by_dimensions.items():
+            for document in self._documents(dict(dimensions), metrics, timestamp):
+                self.stream.write(json.dumps(document, separators=(",", ":")) + "\n")
+        self.stream.flush()
+
+    def _documents(self, dimensions: dict, metrics: list, timestamp: int):
+        # Latencies are histograms: Values/Counts pairs, split across documents when there are too many distinct values
+        pending = [(name, unit, sorted(Counter(round(value, 1) for value in values).items())) for name, unit, values in metrics]
+        while pending:
+            document = dict(dimensions)
+            definitions = []
+            remaining = []
+            for name, unit, histogram in pending:
+                part, rest = histogram[:EMF_MAX_VALUES], histogram[EMF_MAX_VALUES:]
+                document[name] = {"Values": [value for value, _ in part], "Counts": [count for _, count in part]}
+                definitions.append({"Name": name, "Unit": unit})
+                if rest:
+                    remaining.append((name, unit, rest))
+            document["_aws"] = {
+                "Timestamp": timestamp,
+                "CloudWatchMetrics": [{"Namespace": self.namespace, "Dimensions": [sorted(dimensions)], "Metrics": definitions}]
+            }
+            yield document
+            pending = remaining
+
+class TextExporter:
+    """Logs one summary line per metric, for Socket Mode and local runs where nobody reads EMF."""
+
+    def export(self, entries: list):
+        for name, dimensions, unit, values in sorted(entries, key=lambda entry: (entry[0], sorted(entry[1].items()))):
+            labels = ",".join(f"{key}={value}" for key, value in sorted(dimensions.items()))
+            if unit == "Count":
+                logger.info(f"{name}{{{labels}}} count={sum(values):g}")
+                continue
+            ordered = sorted(values)
+            p90, p99 = (statistics.quantiles(ordered, n=100, method="inclusive")[index] for index in (89, 98)) if len(ordered) > 1 else (ordered[0], ordered[0])
+            logger.info(f"{name}{{{labels}}} n={len(ordered)} p50={statistics.median(ordered):.1f}ms p90={p90:.1f}ms p99={p99:.1f}ms max={ordered[-1]:.1f}ms")
+
+def build_exporter(kind: str = METRICS_EXPORTER):
+    if kind == "emf":
+        return EMFExporter()
+    if kind == "text":
+        return TextExporter()
+    return None
+
+recorder = MetricsRecorder()
+exporter = build_exporter()
+
+def configure(kind: str):
+    """Switches the process-wide exporter, e.g. to "text" for Socket Mode."""
+    global exporter
+    exporter = build_exporter(kind)
+
+def flush():
+    entries = recorder.drain()
+    if entries and exporter is not None:
+        exporter.export(entries)
+
+def start_periodic_flush(interval: float = METRICS_FLUSH_SECONDS) -> threading.Event:
+    """Flushes every interval seconds on a daemon thread, for long-lived processes; set the returned event to stop."""
+    stopped = threading.Event()
+    def run():
+        while not stopped.wait(interval):
+            flush()
+    threading.Thread(target=run, name="metrics-flush", daemon=True).start()
+    return stopped
+
+def timed_listener(function, listener: str, phase: str):
+    """Wraps a bolt ack or lazy function so every run records ListenerDuration{Listener, Phase}.
+
+    functools.wraps keeps the name and signature bolt uses for argument injection and lazy listener lookup.
+    Coroutine functions (the asyncio app's listeners) get a coroutine wrapper, which AsyncApp requires.
+    """
+    if inspect.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            with recorder.span("ListenerDuration", Listener=listener, Phase=phase):
+                return await function(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with recorder.span("ListenerDuration", Listener=listener, Phase=phase):
+            return function(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,89 @@
+import os
+import datetime
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Recipients per minute for a campaign whose modal leaves the field blank; 0 sends everything straight away
+PACING_PER_MINUTE = int(os.getenv("PACING_PER_MINUTE", "0"))
+# Local business hours and days, applied in each recipient's own Slack time zone
+BUSINESS_HOURS = os.getenv("BUSINESS_HOURS", "09:00-17:00")
+BUSINESS_DAYS = os.getenv("BUSINESS_DAYS", "mon,tue,wed,thu,fri")
+# For recipients whose time zone Slack doesn't tell us
+PACING_DEFAULT_TIME_ZONE = os.getenv("PACING_DEFAULT_TIME_ZONE", "America/Los_Angeles")
+# chat.scheduleMessage needs post_at in the future; a slot closer than this is posted right away instead
+SCHEDULE_LEAD_SECONDS = 60
+# chat.scheduleMessage accepts post_at up to 120 days ahead
+MAX_SCHEDULE_AHEAD_SECONDS = 120 * 24 * 3600
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+def parse_business_hours(value: str) -> tuple[int, int]:
+    """"09:00-17:00" -> (540, 1020), minutes after midnight."""
+    opens, closes = (int(hours) * 60 + int(minutes) for hours, minutes in (part.strip().split(":") for part in value.split("-")))
+    if not 0 <= opens < closes <= 24 * 60:
+        raise ValueError(f"BUSINESS_HOURS must be HH:MM-HH:MM with the opening first, got {value!r}")
+    return opens, closes
+
+def parse_business_days(value: str) -> frozenset:
+    days = frozenset(WEEKDAYS.index(day.strip().lower()[:3]) for day in value.split(",") if day.strip())
+    if not days:
+        raise ValueError("BUSINESS_DAYS must name at least one day")
+    return days
+
+@lru_cache(maxsize=256)
+def get_zone(time_zone: Optional[str]) -> ZoneInfo:
+    try:
+        return ZoneInfo(time_zone or PACING_DEFAULT_TIME_ZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(PACING_DEFAULT_TIME_ZONE)
+
+@dataclass(frozen=True)
+class Pacing:
+    """Spreads a campaign's recipients over business hours at per_minute recipients per minute.
+
+    Recipient number n of the campaign is due n / per_minute business minutes after start_at, counted in their own
+    time zone. A slot depends only on the recipient's position and time zone, so chunks sent by different workers
+    need no shared state, and the campaign as a whole never goes faster than per_minute.
+    """
+    per_minute: int
+    start_at: float
+    opens: int
+    closes: int
+    days: frozenset
+
+    @classmethod
+    def create(cls, per_minute: int, start_at: float) -> "Pacing":
+        return cls(per_minute, start_at, *parse_business_hours(BUSINESS_HOURS), parse_business_days(BUSINESS_DAYS))
+
+    def advance(self, timestamp: float, seconds: float, time_zone: Optional[str]) -> float:
+        """The moment that is seconds of business time after timestamp in time_zone."""
+        local = datetime.datetime.fromtimestamp(timestamp, get_zone(time_zone))
+        while True:
+            opening = local.replace(hour=self.opens // 60, minute=self.opens % 60, second=0, microsecond=0)
+            closing = opening + datetime.timedelta(minutes=self.closes - self.opens)
+            if local.weekday() not in self.days or local >= closing:
+                local = opening + datetime.timedelta(days=1)
+                continue
+            local = max(local, opening)
+            available = (closing - local).total_seconds()
+            if seconds < available:
+                return (local + datetime.timedelta(seconds=seconds)).timestamp()
+            seconds -= available
+            local = opening + datetime.timedelta(days=1)
+
+    def slot(self, ordinal: int, time_zone: Optional[str]) -> float:
+        return self.advance(self.start_at, ordinal * 60 / self.per_minute, time_zone)
+
+    def post_at(self, ordinal: int, time_zone: Optional[str], now: float) -> Optional[float]:
+        """When to deliver to the ordinal-th recipient, or None to post now.
+
+        A slot that has already passed (the campaign is behind, say after a retry) moves to the next business moment
+        rather than landing outside business hours.
+        """
+        post_at = self.slot(ordinal, time_zone)
+        if post_at < now + SCHEDULE_LEAD_SECONDS:
+            post_at = self.advance(now, 0, time_zone)
+        if post_at < now + SCHEDULE_LEAD_SECONDS:
+            return None
+        return min(post_at, now + MAX_SCHEDULE_AHEAD_SECONDS)
@@ -0,0 +1,137 @@
+import os
+import time
+import logging
+import threading
+from typing import Optional
+from slack_sdk.errors import SlackApiError
+
+import campaign_queue
+
+# The status message is updated whenever the campaign crosses a multiple of this many recipients ...
+PROGRESS_EVERY_RECIPIENTS = int(os.getenv("PROGRESS_EVERY_RECIPIENTS", "500"))
+# ... or at least this often per process while it is sending
+PROGRESS_EVERY_SECONDS = float(os.getenv("PROGRESS_EVERY_SECONDS", "10"))
+# Addresses listed per error code in the failure report; the rest are only counted
+MAX_LISTED_FAILURES = 50
+CANCEL_ACTION_ID = "cancel_campaign"
+
+logger = logging.getLogger(__name__)
+
+_last_update: dict[str, float] = {}
+_lock = threading.Lock()
+
+def render_status(windows_version: str, total: int, progress: campaign_queue.Progress, finished: bool = False, paced: bool = False) -> str:
+    heading = ":white_check_mark: Finished" if finished else ":outbox_tray: Sending"
+    remaining = max(total - progress.done, 0)
+    # A paced campaign hands most messages to chat.scheduleMessage, so they go out later than they are counted
+    sent = "Sent or scheduled" if paced else "Sent"
+    text = f"{heading} *{windows_version}* campaign: {progress.done:,} of {total:,} recipients\n{sent} {progress.sent:,} · Failed {progress.failed:,} · Remaining {remaining:,}"
+    if progress.skipped:
+        text += f" · Already sent {progress.skipped:,}"
+    return text
+
+def render_failure_report(failures: dict[str, list[str]], failed: int) -> str:
+    if not failed:
+        return "No failures."
+    lines = [f"*{failed:,} failed recipients by error*"]
+    for code, emails in sorted(failures.items(), key=lambda item: -len(item[1])):
+        listed = ", ".join(emails[:MAX_LISTED_FAILURES])
+        more = f" and {len(emails) - MAX_LISTED_FAILURES:,} more" if len(emails) > MAX_LISTED_FAILURES else ""
+        lines.append(f"*{code}* ({len(emails):,}): {listed}{more}")
+    unlisted = failed - sum(len(emails) for emails in failures.values())
+    if unlisted > 0:
+        lines.append(f"{unlisted:,} more failures were counted without their addresses")
+    return "\n".join(lines)
+
+def status_blocks(text: str, campaign_id: Optional[str], cancellable: bool = True) -> Optional[list]:
+    """The status text with a button that cancels the campaign's unsent and scheduled messages.
+
+    chat_update keeps a message's old blocks unless it is given new ones, so every update passes these.
+    """
+    if not campaign_id:
+        return None
+    blocks = [{"type": "section", "text": {"type": "mrkdwn", "text": text}}]
+    if not cancellable:
+        return blocks
+    return [
+        *blocks,
+        {"type": "actions", "elements": [{
+            "type": "button",
+            "action_id": CANCEL_ACTION_ID,
+            "style": "danger",
+            "text": {"type": "plain_text", "text": "Cancel campaign"},
+            "value": campaign_id,
+            "confirm": {
+                "title": {"type": "plain_text", "text": "Cancel this campaign?"},
+                "text": {"type": "plain_text", "text": "Recipients who haven't been messaged yet won't be, and scheduled messages are deleted."},
+                "confirm": {"type": "plain_text", "text": "Cancel campaign"},
+                "deny": {"type": "plain_text", "text": "Keep sending"}
+            }
+        }]}
+    ]
+
+def start(client, channel: Optional[str], windows_version: str, total: int, campaign_id: Optional[str] = None, paced: bool = False) -> Optional[str]:
+    """Posts the campaign's status message; returns its ts, or None when there is nowhere to post it."""
+    if not channel:
+        return None
+    try:
+        text = render_status(windows_version, total, campaign_queue.Progress(), paced=paced)
+        response = client.chat_postMessage(channel=channel, text=text, blocks=status_blocks(text, campaign_id))
+        return response["ts"]
+    except SlackApiError as e:
+        logger.error(f"Failed to post campaign status: {e}")
+        return None
+
+def record(client, queue, chunk: campaign_queue.Chunk, results: list, paced: bool = False, batch_start: Optional[int] = None) -> campaign_queue.Progress:
+    """Adds a sent batch's results to the campaign's counts and updates the status message when it is due.
+
+    The batch that takes the campaign to its total closes it out: a final update plus the failure report as a
+    thread reply. The counts live in the queue backend, so this works across workers and Lambda invocations.
+    batch_start is the batch's position in the chunk: a chunk redelivered before its checkpoint was written re-sends
+    that batch, and the backend then counts it only once.
+    """
+    failures = {}
+    for result in results:
+        if not result.ok:
+            failures.setdefault(result.error, []).append(result.email)
+    progress = queue.add_progress(
+        chunk.campaign_id,
+        sent=sum(1 for result in results if result.ok and not result.duplicate),
+        failed=sum(1 for result in results if not result.ok),
+        skipped=sum(1 for result in results if result.duplicate),
+        failures=failures,
+        chunk_index=None if batch_start is None else chunk.chunk_index,
+        batch_start=batch_start or 0
+    )
+    finished = progress.before_done < chunk.total <= progress.done
+    if chunk.progress_ts is None:
+        if finished and progress.failed:
+            logger.warning(f"Campaign {chunk.campaign_id}: {render_failure_report(queue.get_failures(chunk.campaign_id), progress.failed)}")
+        return progress
+    if finished or _due(chunk.campaign_id, progress):
+        try:
+            text = render_status(chunk.windows_version, chunk.total, progress, finished, paced)
+            # Scheduled messages of a paced campaign can still be cancelled after the last one is handed over
+            client.chat_update(channel=chunk.progress_channel, ts=chunk.progress_ts, text=text, blocks=status_blocks(text, chunk.campaign_id, paced or not finished))
+            if finished:
+                client.chat_postMessage(
+                    channel=chunk.progress_channel,
+                    thread_ts=chunk.progress_ts,
+                    text=render_failure_report(queue.get_failures(chunk.campaign_id), progress.failed)
+                )
+        except SlackApiError as e:
+            # Progress is best effort; the next due batch tries again
+            logger.error(f"Failed to update campaign status: {e}")
+    if finished:
+        with _lock:
+            _last_update.pop(chunk.campaign_id, None)
+    return progress
+
+def _due(campaign_id: str, progress: campaign_queue.Progress) -> bool:
+    now = time.monotonic()
+    crossed = progress.before_done // PROGRESS_EVERY_RECIPIENTS != progress.done // PROGRESS_EVERY_RECIPIENTS
+    with _lock:
+        if not crossed and now - _last_update.setdefault(campaign_id, now) < PROGRESS_EVERY_SECONDS:
+            return False
+        _last_update[campaign_id] = now
+        return True
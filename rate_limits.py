@@ -0,0 +1,238 @@
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import Counter, defaultdict
+from typing import Optional
+
+# Lanes: interactive calls (modals, acks, confirmations) always go ahead of bulk campaign traffic
+INTERACTIVE = 0
+BULK = 1
+LANE_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+# https://api.slack.com/apis/rate-limits
+TIER_PER_MINUTE = {1: 1, 2: 20, 3: 50, 4: 100}
+METHOD_TIERS = {
+    "users.list": 2,
+    "users.lookupByEmail": 3,
+    "chat.update": 3,
+    "chat.scheduleMessage": 3,
+    "chat.deleteScheduledMessage": 3,
+    "canvases.edit": 3,
+    "users.info": 4,
+    "views.open": 4,
+    "auth.test": 4,
+}
+DEFAULT_TIER = 3
+# chat.postMessage has its own limit: about one message per second per channel, plus a workspace-wide ceiling
+POST_MESSAGE_PER_MINUTE = int(os.getenv("SLACK_POST_MESSAGE_PER_MINUTE", "600"))
+POST_MESSAGE_PER_CHANNEL_PER_SECOND = 1
+# Share of each bucket bulk traffic may not dip into, so a modal can open mid-campaign without waiting
+INTERACTIVE_RESERVE = float(os.getenv("SLACK_INTERACTIVE_RESERVE", "0.2"))
+# A 429 halves the bucket's rate; every successful call then wins back this share of the base rate
+RECOVERY_STEP = 0.05
+MIN_RATE_FACTOR = 0.125
+# Share of each workspace-wide limit this process may use; with N replicas sharing a token, each takes 1/N
+RATE_LIMIT_SHARE = float(os.getenv("SLACK_RATE_LIMIT_SHARE", "1"))
+# Per-channel buckets idle this long are dropped, since every DM is its own channel
+IDLE_CHANNEL_SECONDS = 60
+
+_lane = contextvars.ContextVar("slack_rate_limit_lane", default=INTERACTIVE)
+
+@contextmanager
+def lane(value: int):
+    """Sends every Slack call made in this context (and in fan-out threads it starts) through the given lane."""
+    token = _lane.set(value)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+def current_lane() -> int:
+    return _lane.get()
+
+class TokenBucket:
+    def __init__(self, per_second: float, burst: float):
+        self.base_rate = self.rate = per_second
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, lane: int, now: float) -> float:
+        """Seconds until a caller in lane may take a token; 0 means now."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        reserve = self.burst * INTERACTIVE_RESERVE if lane == BULK else 0.0
+        missing = 1 + reserve - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def throttle(self, now: float, retry_after: float):
+        self.paused_until = max(self.paused_until, now + retry_after)
+        self.rate = max(self.base_rate * MIN_RATE_FACTOR, self.rate / 2)
+        self.tokens = 0.0
+
+    def recover(self):
+        self.rate = min(self.base_rate, self.rate + self.base_rate * RECOVERY_STEP)
+
+class RateLimitGovernor:
+    """Token buckets per Slack method tier (and per channel for chat.postMessage), shared by every client in the process.
+
+    Callers block in acquire() (or await acquire_async()) until every bucket the call needs has a token. Bulk callers also wait while any
+    interactive caller is waiting and leave INTERACTIVE_RESERVE of each bucket untouched. A 429 pauses the buckets
+    for Retry-After and halves their rate, which then climbs back as calls succeed.
+
+    Several processes sharing one bot token each take share of every method's limit. Per-channel buckets aren't
+    split: each DM channel is only written to by the replica sending that recipient's chunk.
+    """
+
+    def __init__(self, post_message_per_minute: int = POST_MESSAGE_PER_MINUTE, time_scale: float = 1.0, share: float = RATE_LIMIT_SHARE):
+        self.post_message_per_minute = post_message_per_minute
+        # Multiplies every rate; load tests against the fake Slack server speed both up by the same factor
+        self.time_scale = time_scale
+        self.share = share
+        self._buckets: dict[str, TokenBucket] = {}
+        self._channel_buckets: dict[str, TokenBucket] = {}
+        self._condition = threading.Condition()
+        self._waiting = [0, 0]
+        self._peak_waiting = [0, 0]
+        self._throttled_seconds: defaultdict[str, float] = defaultdict(float)
+        self._calls = Counter()
+        self._rate_limited = Counter()
+
+    def _method_bucket(self, method: str) -> TokenBucket:
+        bucket = self._buckets.get(method)
+        if bucket is None:
+            if method == "chat.postMessage":
+                per_minute = self.post_message_per_minute
+            else:
+                per_minute = TIER_PER_MINUTE[METHOD_TIERS.get(method, DEFAULT_TIER)]
+            per_minute *= self.share
+            # Slack allows short bursts above the per-minute rate; a tenth of a minute's worth keeps us well inside them
+            bucket = self._buckets[method] = TokenBucket(per_minute / 60 * self.time_scale, max(2.0, per_minute / 10))
+        return bucket
+
+    def set_share(self, share: float):
+        """Changes this process's share of the method limits; buckets are rebuilt on their next use."""
+        with self._condition:
+            self.share = share
+            self._buckets.clear()
+
+    def _channel_bucket(self, channel: str, now: float) -> TokenBucket:
+        bucket = self._channel_buckets.get(channel)
+        if bucket is None:
+            if len(self._channel_buckets) > 1000:
+                self._channel_buckets = {key: value for key, value in self._channel_buckets.items() if now - value.updated < IDLE_CHANNEL_SECONDS}
+            bucket = self._channel_buckets[channel] = TokenBucket(POST_MESSAGE_PER_CHANNEL_PER_SECOND * self.time_scale, 2.0)
+        return bucket
+
+    def _buckets_for(self, method: str, channel: Optional[str], now: float) -> list[TokenBucket]:
+        buckets = [self._method_bucket(method)]
+        if method == "chat.postMessage" and channel:
+            buckets.append(self._channel_bucket(channel, now))
+        return buckets
+
+    def acquire(self, method: str, channel: Optional[str] = None, lane: Optional[int] = None) -> float:
+        """Blocks until the call may be sent; returns the seconds spent waiting."""
+        lane = current_lane() if lane is None else lane
+        started = time.monotonic()
+        with self._condition:
+            self._waiting[lane] += 1
+            self._peak_waiting[lane] = max(self._peak_waiting[lane], self._waiting[lane])
+            try:
+                while True:
+                    now = time.monotonic()
+                    buckets = self._buckets_for(method, channel, now)
+                    for bucket in buckets:
+                        bucket.refill(now)
+                    wait = max(bucket.wait_time(lane, now) for bucket in buckets)
+                    if lane == BULK and self._waiting[INTERACTIVE]:
+                        wait = max(wait, 1 / buckets[0].rate)
+                    if wait <= 0:
+                        for bucket in buckets:
+                            bucket.tokens -= 1
+                        break
+                    self._condition.wait(wait)
+            finally:
+                self._waiting[lane] -= 1
+                # Bulk callers held back for an interactive one can re-check now
+                self._condition.notify_all()
+            waited = time.monotonic() - started
+            self._calls[method] += 1
+            self._throttled_seconds[LANE_NAMES[lane]] += waited
+        return waited
+
+    async def acquire_async(self, method: str, channel: Optional[str] = None, lane: Optional[int] = None) -> float:
+        """acquire() for coroutines: awaits the same buckets instead of blocking the event loop's thread."""
+        lane = current_lane() if lane is None else lane
+        started = time.monotonic()
+        with self._condition:
+            self._waiting[lane] += 1
+            self._peak_waiting[lane] = max(self._peak_waiting[lane], self._waiting[lane])
+        try:
+            while True:
+                # The lock is only held to do the arithmetic, never across the sleep
+                with self._condition:
+                    now = time.monotonic()
+                    buckets = self._buckets_for(method, channel, now)
+                    for bucket in buckets:
+                        bucket.refill(now)
+                    wait = max(bucket.wait_time(lane, now) for bucket in buckets)
+                    if lane == BULK and self._waiting[INTERACTIVE]:
+                        wait = max(wait, 1 / buckets[0].rate)
+                    if wait <= 0:
+                        for bucket in buckets:
+                            bucket.tokens -= 1
+                        break
+                await asyncio.sleep(wait)
+        finally:
+            with self._condition:
+                self._waiting[lane] -= 1
+                self._condition.notify_all()
+        waited = time.monotonic() - started
+        with self._condition:
+            self._calls[method] += 1
+            self._throttled_seconds[LANE_NAMES[lane]] += waited
+        return waited
+
+    def record_rate_limited(self, method: str, channel: Optional[str], retry_after: float):
+        """Called on a 429: pauses the method's (and channel's) bucket for Retry-After and halves its rate."""
+        with self._condition:
+            now = time.monotonic()
+            for bucket in self._buckets_for(method, channel, now):
+                bucket.throttle(now, retry_after)
+            self._rate_limited[method] += 1
+
+    def record_success(self, method: str):
+        with self._condition:
+            bucket = self._buckets.get(method)
+            if bucket is not None and bucket.rate < bucket.base_rate:
+                bucket.recover()
+
+    def snapshot(self) -> dict:
+        """Queue depth, peak queue depth, time spent throttled per lane and 429s per method since the last reset."""
+        with self._condition:
+            return {
+                "queue_depth": {LANE_NAMES[lane]: self._waiting[lane] for lane in LANE_NAMES},
+                "peak_queue_depth": {LANE_NAMES[lane]: self._peak_waiting[lane] for lane in LANE_NAMES},
+                "throttled_seconds": {name: round(seconds, 3) for name, seconds in self._throttled_seconds.items()},
+                "calls": dict(self._calls),
+                "rate_limited": dict(self._rate_limited),
+                "rates_per_minute": {method: round(bucket.rate * 60 / self.time_scale, 1) for method, bucket in self._buckets.items()},
+            }
+
+    def reset_metrics(self):
+        with self._condition:
+            self._peak_waiting = list(self._waiting)
+            self._throttled_seconds.clear()
+            self._calls.clear()
+            self._rate_limited.clear()
+
+# One governor per process, so the Lambda, Socket Mode and HTTP server clients all draw from the same buckets
+governor = RateLimitGovernor()
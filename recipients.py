@@ -0,0 +1,128 @@
+import io
+import os
+import re
+import csv
+import hashlib
+import tempfile
+import urllib.request
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Optional
+
+# Validated addresses are spooled to a temporary file between the preflight pass and the send; this much stays in memory
+RECIPIENT_SPOOL_BYTES = int(os.getenv("RECIPIENT_SPOOL_BYTES", str(1024 * 1024)))
+RECIPIENT_DOWNLOAD_TIMEOUT = float(os.getenv("RECIPIENT_DOWNLOAD_TIMEOUT", "30"))
+# How many rejected entries the preflight summary quotes
+INVALID_SAMPLES = 10
+EMAIL_HEADERS = ("email", "email address", "e-mail", "mail")
+# RFC 5321 caps a forward path at 256 octets including the angle brackets
+MAX_EMAIL_LENGTH = 254
+EMAIL_PATTERN = re.compile(r"[A-Za-z0-9._%+'-]+@[A-Za-z0-9](?:[A-Za-z0-9-]*[A-Za-z0-9])?(?:\.[A-Za-z0-9](?:[A-Za-z0-9-]*[A-Za-z0-9])?)*\.[A-Za-z]{2,}")
+# Besides CSV commas, a pasted list may separate addresses with semicolons, newlines or spaces
+SEPARATORS = re.compile(r"[;\r\n]+")
+# "Jane Doe <jane@example.com>", as mail clients copy addresses
+BRACKETED = re.compile(r"<([^<>]*)>")
+
+def normalize(entry: str) -> str:
+    """Lowercases and strips the quotes, angle brackets and mailto: that copied addresses often carry."""
+    entry = entry.strip().strip("\"'<>")
+    if entry.lower().startswith("mailto:"):
+        entry = entry[len("mailto:"):]
+    return entry.strip().lower()
+
+def is_valid(email: str) -> bool:
+    return len(email) <= MAX_EMAIL_LENGTH and EMAIL_PATTERN.fullmatch(email) is not None
+
+def iter_entries(lines: Iterable[str]) -> Iterator[str]:
+    """Yields every candidate address in CSV lines, one row at a time.
+
+    If the first row has an email column header (see EMAIL_HEADERS), only that column is read; otherwise every cell is.
+    """
+    column = None
+    for row_number, row in enumerate(csv.reader(lines)):
+        if row_number == 0:
+            headers = [cell.strip().lower() for cell in row]
+            column = next((index for index, header in enumerate(headers) if header in EMAIL_HEADERS), None)
+            if column is not None:
+                continue
+        cells = row if column is None else row[column:column + 1]
+        for cell in cells:
+            for entry in SEPARATORS.split(cell):
+                if "<" not in entry:
+                    yield from entry.split()
+                    continue
+                # The display names around bracketed addresses aren't recipients, so only keep what looks like one
+                yield from BRACKETED.findall(entry)
+                yield from (word for word in BRACKETED.sub(" ", entry).split() if "@" in word)
+
+def text_lines(text: str) -> Iterable[str]:
+    return io.StringIO(text or "")
+
+def download_lines(client, file: dict) -> Iterator[str]:
+    """Streams an uploaded file's lines straight off the connection, so the file is never held in memory whole.
+
+    Needs the files:read scope. file is the file object from a file_input's state; only its id is relied on.
+    """
+    url = file.get("url_private_download") or client.files_info(file=file["id"])["file"]["url_private_download"]
+    request = urllib.request.Request(url, headers={"Authorization": f"Bearer {client.token}"})
+    with urllib.request.urlopen(request, timeout=RECIPIENT_DOWNLOAD_TIMEOUT) as response:
+        # utf-8-sig drops the byte order mark Excel writes at the start of a CSV
+        yield from io.TextIOWrapper(response, encoding="utf-8-sig", errors="replace", newline="")
+
+@dataclass
+class RecipientList:
+    """Validated, deduplicated addresses from one preflight pass, spooled so they can be read back in chunks."""
+
+    valid: int = 0
+    duplicate: int = 0
+    invalid: int = 0
+    invalid_samples: list[str] = field(default_factory=list)
+    _spool: Optional[tempfile.SpooledTemporaryFile] = field(default=None, repr=False)
+
+    def __iter__(self) -> Iterator[str]:
+        if self._spool is None:
+            return
+        self._spool.seek(0)
+        for line in self._spool:
+            yield line.rstrip("\n")
+
+    def close(self):
+        if self._spool is not None:
+            self._spool.close()
+
+    def __enter__(self) -> "RecipientList":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def summary(self) -> str:
+        text = f"*{self.valid:,}* valid recipients, *{self.duplicate:,}* duplicates removed, *{self.invalid:,}* invalid addresses skipped"
+        if self.invalid_samples:
+            text += "\nInvalid: " + ", ".join(f"`{sample}`" for sample in self.invalid_samples)
+            if self.invalid > len(self.invalid_samples):
+                text += f" and {self.invalid - len(self.invalid_samples):,} more"
+        return text
+
+def preflight(sources: Iterable[Iterable[str]]) -> RecipientList:
+    """Normalizes, validates and deduplicates the addresses in every source of lines in a single streaming pass.
+
+    Only an 8 byte digest per unique address is kept for deduplication; the addresses themselves go to the spool.
+    """
+    recipients = RecipientList(_spool=tempfile.SpooledTemporaryFile(max_size=RECIPIENT_SPOOL_BYTES, mode="w+", encoding="utf-8"))
+    seen = set()
+    for lines in sources:
+        for entry in iter_entries(lines):
+            email = normalize(entry)
+            if not is_valid(email):
+                recipients.invalid += 1
+                if len(recipients.invalid_samples) < INVALID_SAMPLES:
+                    recipients.invalid_samples.append(entry[:80])
+                continue
+            digest = int.from_bytes(hashlib.blake2b(email.encode("utf-8"), digest_size=8).digest(), "big")
+            if digest in seen:
+                recipients.duplicate += 1
+                continue
+            seen.add(digest)
+            recipients._spool.write(email + "\n")
+            recipients.valid += 1
+    return recipients
@@ -0,0 +1,16 @@
+import os
+import functools
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Every key this app writes starts with this, so one Redis can serve several deployments
+REDIS_KEY_PREFIX = os.getenv("REDIS_KEY_PREFIX", "windows-upgrade:")
+
+@functools.lru_cache(maxsize=None)
+def get_redis(url: str = REDIS_URL):
+    """One client, and so one connection pool, per URL per process; safe to share between threads."""
+    # redis is only needed on this path, so keep it out of module import time
+    import redis
+    return redis.Redis.from_url(url, decode_responses=True, health_check_interval=30)
+
+def key(*parts: str) -> str:
+    return REDIS_KEY_PREFIX + ":".join(parts)
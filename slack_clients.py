@@ -0,0 +1,251 @@
+import os
+import io
+import ssl
+import time
+import queue
+import logging
+import threading
+import http.client
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit
+from typing import Optional
+from slack_sdk import WebClient
+from slack_sdk.http_retry import ConnectionErrorRetryHandler, RateLimitErrorRetryHandler
+from slack_sdk.http_retry.builtin_handlers import ServerErrorRetryHandler
+
+import fanout
+import campaign_queue
+import metrics
+import rate_limits
+
+SLACK_API_URL = "https://slack.com/api/"
+# Every campaign worker runs a full fan-out, plus a few connections for interactive calls
+SLACK_POOL_SIZE = int(os.getenv("SLACK_POOL_SIZE", str(fanout.FANOUT_WORKERS * campaign_queue.CAMPAIGN_WORKERS + 4)))
+SLACK_MAX_RETRIES = int(os.getenv("SLACK_MAX_RETRIES", "3"))
+DEFAULT_TIMEOUT_SECONDS = 10
+METHOD_TIMEOUTS = {
+    # trigger_id expires 3 seconds after the click, so there's no point waiting longer
+    "views.open": 2.5,
+    "users.info": 3,
+    "users.lookupByEmail": 5,
+    "chat.postMessage": 10,
+    "chat.update": 10,
+    "canvases.edit": 15,
+    "users.list": 20,
+}
+# Slack closes idle keep-alive connections; don't bother reusing ones older than this
+IDLE_SECONDS = 50
+
+logger = logging.getLogger(__name__)
+
+class ConnectionPool:
+    """Thread-safe pool of keep-alive HTTP(S) connections to one host."""
+
+    def __init__(self, base_url: str = SLACK_API_URL, size: int = SLACK_POOL_SIZE, ssl_context: Optional[ssl.SSLContext] = None):
+        url = urlsplit(base_url)
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.ssl_context = ssl_context or (ssl.create_default_context() if url.scheme == "https" else None)
+        self.created = 0
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _new_connection(self, timeout: float) -> http.client.HTTPConnection:
+        self.created += 1
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=timeout, context=self.ssl_context)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def acquire(self, timeout: float) -> tuple[http.client.HTTPConnection, bool]:
+        """Returns (connection, reused)."""
+        while True:
+            try:
+                conn, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                return self._new_connection(timeout), False
+            if time.monotonic() - idle_since < IDLE_SECONDS:
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return conn, True
+            conn.close()
+
+    def release(self, conn: http.client.HTTPConnection):
+        try:
+            self._idle.put_nowait((conn, time.monotonic()))
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        """Closes every idle connection; connections in use are closed or parked as their calls finish."""
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+
+    def warm(self, connections: int = 1, timeout: float = 2.0) -> int:
+        """Opens connections ahead of time (DNS, TCP and TLS) and parks them in the pool; returns how many opened."""
+        opened = 0
+        for _ in range(connections):
+            conn = self._new_connection(timeout)
+            try:
+                conn.connect()
+            except OSError as e:
+                logger.warning(f"Could not pre-open a connection to {self.host}: {e}")
+                break
+            self.release(conn)
+            opened += 1
+        return opened
+
+class PooledWebClient(WebClient):
+    """WebClient that sends over a shared keep-alive connection pool instead of a new urllib connection per call.
+
+    Every attempt, retries included, first takes a token from the rate-limit governor, and a 429 is reported back
+    to it. Each call records SlackApiCall{Method} latency, and SlackApiCallErrors{Method, ErrorCode} when it fails.
+    With a proxy (passed in, or from HTTPS_PROXY as WebClient reads it) the pool is bypassed and urllib's own
+    transport does the tunnelling, still through the governor.
+
+    The SDK has no public transport hook, so this overrides WebClient's _perform_urllib_http_request methods;
+    requirements.txt pins slack-sdk for that reason.
+    """
+
+    def __init__(self, *args, pool: Optional[ConnectionPool] = None, governor: Optional[rate_limits.RateLimitGovernor] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = pool or ConnectionPool(self.base_url, ssl_context=self.ssl)
+        self.governor = governor
+        # The channel of the call in progress on this thread, for chat.postMessage's per-channel bucket
+        self._call = threading.local()
+
+    def for_request(self, team_id: Optional[str] = None) -> "PooledWebClient":
+        """A per-request client like the one bolt builds, but sharing this client's pool and governor."""
+        return PooledWebClient(
+            token=self.token,
+            base_url=self.base_url,
+            timeout=self.timeout,
+            ssl=self.ssl,
+            proxy=self.proxy,
+            headers=dict(self.headers),
+            team_id=team_id,
+            logger=self.logger,
+            retry_handlers=self.retry_handlers.copy(),
+            pool=self.pool,
+            governor=self.governor
+        )
+
+    def __deepcopy__(self, memo):
+        # Bolt deep-copies each request, client included, before running lazy listeners. The copy has its own
+        # headers and retry handlers but shares the pool and governor: both are thread-safe, and the pool's SSL
+        # context can't be copied.
+        copied = memo[id(self)] = self.for_request(self.default_params.get("team_id"))
+        return copied
+
+    def api_call(self, api_method: str, **kwargs):
+        # Covers retries and rate-limit waits too: this is the latency the caller sees
+        with metrics.recorder.span("SlackApiCall", Method=api_method):
+            return super().api_call(api_method, **kwargs)
+
+    def _perform_urllib_http_request(self, *, url: str, args: dict) -> dict:
+        self._call.channel = (args["json"] or args["params"] or args["data"] or {}).get("channel")
+        return super()._perform_urllib_http_request(url=url, args=args)
+
+    def _perform_urllib_http_request_internal(self, url: str, req) -> dict:
+        method_name = url.rsplit("/", 1)[-1]
+        channel = getattr(self._call, "channel", None)
+        if self.governor is not None:
+            self.governor.acquire(method_name, channel)
+        try:
+            if self.proxy:
+                # The pool only connects straight to Slack
+                response = super()._perform_urllib_http_request_internal(url, req)
+            else:
+                response = self._send_pooled(url, req, method_name)
+        except HTTPError as e:
+            self._record_status(method_name, channel, e.code, e.headers)
+            raise
+        self._record_status(method_name, channel, response["status"], response["headers"])
+        return response
+
+    def _record_status(self, method_name: str, channel: Optional[str], status: int, headers):
+        if self.governor is None:
+            return
+        if status == 429:
+            self.governor.record_rate_limited(method_name, channel, float(headers.get("Retry-After") or 1))
+        else:
+            self.governor.record_success(method_name)
+
+    def _send_pooled(self, url: str, req, method_name: str) -> dict:
+        timeout = METHOD_TIMEOUTS.get(method_name, self.timeout or DEFAULT_TIMEOUT_SECONDS)
+        path = urlsplit(url).path
+        headers = dict(req.header_items())
+        for attempt in range(2):
+            conn, reused = self.pool.acquire(timeout)
+            try:
+                conn.request("POST", path, body=req.data, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                conn.close()
+                # A pooled connection the server already closed; the request never arrived, so try a fresh one
+                if reused and attempt == 0:
+                    continue
+                raise URLError(e)
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                # Wrapped like urllib does so ConnectionErrorRetryHandler recognises it
+                raise URLError(e)
+            if resp.will_close:
+                conn.close()
+            else:
+                self.pool.release(conn)
+            if resp.status >= 400:
+                # Raised the same way urlopen would, so the base client's 429/5xx retry handling applies
+                raise HTTPError(url, resp.status, resp.reason, resp.headers, io.BytesIO(body))
+            charset = resp.headers.get_content_charset() or "utf-8"
+            if resp.headers.get_content_type() == "application/gzip":
+                return {"status": resp.status, "headers": resp.headers, "body": body}
+            return {"status": resp.status, "headers": resp.headers, "body": body.decode(charset)}
+
+class TransientServerErrorRetryHandler(ServerErrorRetryHandler):
+    """ServerErrorRetryHandler only covers 500 and 503; Slack's edge also returns 502 and 504 under load."""
+
+    def _can_retry(self, *, state, request, response=None, error=None) -> bool:
+        return response is not None and response.status_code in (500, 502, 503, 504)
+
+def build_retry_handlers(max_retries: int = SLACK_MAX_RETRIES) -> list:
+    return [
+        # Sleeps for Retry-After before trying again
+        RateLimitErrorRetryHandler(max_retry_count=max_retries),
+        ConnectionErrorRetryHandler(max_retry_count=max_retries),
+        TransientServerErrorRetryHandler(max_retry_count=max_retries),
+    ]
+
+def build_web_client(token: str, base_url: str = SLACK_API_URL, pool: Optional[ConnectionPool] = None, ssl_context: Optional[ssl.SSLContext] = None, max_retries: int = SLACK_MAX_RETRIES, governor: Optional[rate_limits.RateLimitGovernor] = rate_limits.governor) -> PooledWebClient:
+    """The one place Slack WebClients are configured: pooled connections, retries, rate limits and per-method timeouts."""
+    pool = pool or ConnectionPool(base_url, ssl_context=ssl_context)
+    return PooledWebClient(
+        token=token,
+        base_url=base_url,
+        # TLS is the pool's job. An SSLContext on the client would also end up in bolt's per-request respond(),
+        # which bolt must deep-copy for lazy listeners, and SSLContexts can't be copied.
+        ssl=None,
+        timeout=DEFAULT_TIMEOUT_SECONDS,
+        retry_handlers=build_retry_handlers(max_retries),
+        pool=pool,
+        governor=governor
+    )
+
+def use_pooled_clients(app):
+    """Makes listeners get a client that shares app.client's pool and governor.
+
+    Bolt hands every request a fresh plain WebClient built from app.client's settings, so without this the
+    listeners' calls would skip both.
+    """
+    if not isinstance(app.client, PooledWebClient):
+        return
+
+    @app.use
+    def pooled_client(context, next):
+        context["client"] = app.client.for_request(context.team_id)
+        next()
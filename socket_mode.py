@@ -1,166 +1,126 @@
-import os
-import json
-import ui_templates
-import datetime
-from zoneinfo import ZoneInfo
+"""Socket Mode as N replica processes, each holding several WebSocket connections and its own campaign worker pool.
 
-from slack_bolt import App
-from slack_sdk.errors import SlackApiError
-from slack_bolt.adapter.socket_mode import SocketModeHandler
+Slack spreads events across every open connection of the app, so replicas scale out like HTTP workers do. They
+share their state (idempotency keys, the campaign queue and registry, confirmations) through STATE_BACKEND: redis
+in production, sqlite for replicas on one machine. A listener only enqueues a campaign; each replica's
+campaign_queue.serve_workers pool sends it, so a long campaign never holds up the connection that delivered it:
 
+    STATE_BACKEND=redis python socket_mode.py --replicas 4 --connections 2
+"""
+import os
+import signal
 import logging
-logging.basicConfig(level=logging.DEBUG)
-
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+# Load .env before the listeners module reads its settings
 load_dotenv()
 
-SLACK_APP_TOKEN= os.getenv("SLACK_APP_TOKEN")
-SLACK_SIGNING_SECRET = os.getenv("SLACK_SIGNING_SECRET")
-SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
-SLACK_CANVAS = os.getenv("SLACK_CANVAS")
-TENTATIVE_SECTION=os.getenv("TENTATIVE_SECTION")
-ALT_SECTION_1=os.getenv("ALT_SECTION_1")
-ALT_SECTION_2=os.getenv("ALT_SECTION_2")
-ALT_SECTION_3=os.getenv("ALT_SECTION_3")
-ALLOWED_USERS=os.getenv("ALLOWED_USERS").split(",")
-LOG_CHANNEL=os.getenv("LOG_CHANNEL")
-WINDOWS_VERSION="Windows 11 24H2"
-
-app = App(
-    token=SLACK_BOT_TOKEN,
-    signing_secret=SLACK_SIGNING_SECRET,
-    process_before_response=True
-)
-def get_todays_date() -> str:
-    """Returns today's date in the format %Y-%m-%d %I:%M:%S %p %Z."""
-    # Get the current datetime object
-    now = datetime.datetime.now()
-    # Convert to Pacific Time (Los Angeles)
-    pacific_timezone = ZoneInfo("America/Los_Angeles") 
-    now_aware = now.astimezone(pacific_timezone)
-    formatted_datetime = now_aware.strftime("%Y-%m-%d %I:%M:%S %p %Z")
-    return formatted_datetime
-
-def get_user_email(client, user_id:str) -> str:
-    user_object = client.users_info(user=user_id)
-    return user_object["user"]["profile"]["email"]
-
-def respond_to_slack_within_3_seconds(ack):
-    ack()
-
-def handle_alternative_choice(body, client, logger):
-    print("-------------- Processing handle_alternative_choice....\n")
-    try:
-        logger.info(body)
-        trigger_id = body["trigger_id"]
-        selected_date = body["actions"][0]["value"]
-        email = get_user_email(client, body["user"]["id"])
-        private_metadata = {
-            "date": selected_date,
-            "message_ts": body["message"]["ts"],
-            "channel_id": body["container"]["channel_id"],
-            "caller_id": body["user"]["id"],
-            "user_email": email,
-            "windows_version": WINDOWS_VERSION
-        }
-        confirmation_message = f":spiral_calendar_pad: I am scheduling my Windows upgrade on *{selected_date}*"
-        client.views_open(
-            view=ui_templates.build_confirmation_modal(private_metadata, confirmation_message),
-            trigger_id=trigger_id
-        )
-    except SlackApiError as e:
-        logger.error(f"Failed to open modal: {e}")
-
-reschedule_action_ids = [
-    "confirm_reschedule_1",
-    "confirm_reschedule_2",
-    "confirm_reschedule_3",
-    "confirm_reschedule_4",
-    "confirm_reschedule_5"
-]
-for action_id in reschedule_action_ids:
-    app.action(action_id)(ack=respond_to_slack_within_3_seconds, lazy=[handle_alternative_choice])
-
-def handle_view_submission_events(body, client, logger):
-    print("-------------- Processing handle_view_submission_events....\n")
-    try:
-        logger.info(body)
-        private_metadata=json.loads(body["view"]["private_metadata"])
-        #insert_at_end
-        client.chat_update(
-            channel=private_metadata["channel_id"],
-            ts=private_metadata["message_ts"],
-            text=f"You have selected the week of *{private_metadata['date']}* for your Windows upgrade."
-        )
-        client.canvases_edit(
-            canvas_id=SLACK_CANVAS,
-            changes=[{"operation":"insert_at_end",
-                    "document_content":{"type":"markdown","markdown":f"{private_metadata["windows_version"]}, {private_metadata['user_email']}, {private_metadata['date']}, `{get_todays_date()}`"}}]
-        )
-    except SlackApiError as e:
-        logger.error(f"Failed to open modal: {e}")
-app.view("confirmation_view")(ack=respond_to_slack_within_3_seconds, lazy=[handle_view_submission_events])
+import listeners
+import campaign_queue
+import idempotency
+import confirmations
+import canvas_writer
+import directory_index
+import aws_secrets
+import slack_clients
+import rate_limits
+import metrics
+import logging_config
 
-def handle_global_shortcut(body, client, logger):
-    print("-------------- Processing handle_global_shortcut....\n")
-    try:
-        user_id = body["user"]["id"]
-        if user_id not in ALLOWED_USERS:
-            client.chat_postMessage(
-                channel=user_id,
-                text="You’re not authorized to use this shortcut. Contact #ask_bt if this seems wrong."
-            )
-            logger.info(f"Blocked {user_id}")
-        else:
-            client.views_open(
-                trigger_id=body["trigger_id"],
-                view=ui_templates.build_shortcut_modal("private_metadata")
-            )
-    except SlackApiError as e:
-        logger.error(f"Failed to open modal: {e}")
-app.shortcut("windows_update_callbackid")(ack=respond_to_slack_within_3_seconds, lazy=[handle_global_shortcut])
+from slack_bolt import App
+from slack_bolt.adapter.socket_mode import SocketModeHandler
 
-def send_windows_message(client, email: str, schedules: dict[str:str], windows_version:str):
-    print("-------------- Processing send_windows_message....\n")
+SLACK_APP_TOKEN= os.getenv("SLACK_APP_TOKEN")
+SOCKET_MODE_REPLICAS = int(os.getenv("SOCKET_MODE_REPLICAS", "1"))
+# WebSocket connections per replica; more than one keeps events flowing while Slack recycles a connection
+SOCKET_MODE_CONNECTIONS = int(os.getenv("SOCKET_MODE_CONNECTIONS", "2"))
+# Slack refuses an app's connections beyond this many, across every replica
+SLACK_MAX_CONNECTIONS = 10
+# Threads running lazy listeners, apart from the threads reading each connection
+LAZY_THREADS = int(os.getenv("SOCKET_MODE_LAZY_THREADS", "16"))
+
+logger = logging.getLogger(__name__)
+
+def build_app(drain_queue: bool = True) -> tuple[App, object, object]:
+    """Returns the app, its canvas writer (which the caller flushes on the way out) and the campaign queue."""
+    # Socket mode reads its secrets from the environment (or SECRETS_FILE) and never touches AWS
+    secrets = aws_secrets.SecretsProvider(backend=os.getenv("SECRETS_BACKEND", "env"))
+    app = App(
+        client=slack_clients.build_web_client(secrets.get("bot_token")),
+        signing_secret=secrets.get("signing_secret"),
+        process_before_response=True,
+        listener_executor=ThreadPoolExecutor(max_workers=LAZY_THREADS, thread_name_prefix="lazy")
+    )
+    job_queue = campaign_queue.get_queue()
+    idempotency_store = idempotency.get_store()
+    confirmation_store = confirmations.get_store()
+    canvas_rows = canvas_writer.get_canvas_writer(app.client, listeners.SLACK_CANVAS, flush_interval=canvas_writer.CANVAS_FLUSH_SECONDS, store=idempotency_store, confirmation_store=confirmation_store)
+    slack_clients.use_pooled_clients(app)
+    listeners.register_listeners(app, job_queue, canvas_rows, store=idempotency_store, confirmations_store=confirmation_store, drain_queue=drain_queue)
+    return app, canvas_rows, job_queue
+
+def run_replica(connections: int = SOCKET_MODE_CONNECTIONS, campaign_workers: int = campaign_queue.CAMPAIGN_WORKERS, rate_limit_share: float = rate_limits.RATE_LIMIT_SHARE):
+    """Opens connections WebSockets on one app and sends queued campaigns with campaign_workers threads until SIGTERM."""
+    # Per process: a forked replica doesn't inherit the parent's queue listener or flush threads
+    logging_config.configure()
+    # Nobody reads EMF from a laptop; log a readable summary every METRICS_FLUSH_SECONDS instead
+    metrics.configure(os.getenv("METRICS_EXPORTER", "text"))
+    metrics.start_periodic_flush()
+    rate_limits.governor.set_share(rate_limit_share)
+    # With no pool, listeners drain the queue themselves as before
+    app, canvas_rows, job_queue = build_app(drain_queue=campaign_workers == 0)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    workers = campaign_queue.serve_workers(job_queue, listeners.send_campaign_batch, campaign_workers, stop)
+    # Replicas sharing a backend carry on each other's users.list walk rather than each doing their own
+    directory_index.start_refresh(app.client, job_queue, stop)
+    handlers = [SocketModeHandler(app, SLACK_APP_TOKEN) for _ in range(connections)]
     try:
-        response = app.client.users_lookupByEmail(email=email)
-        user_id = response["user"]["id"]
-        client.chat_postMessage(
-            channel=user_id,
-            blocks=ui_templates.build_blocks_message(schedules, windows_version),
-            text="Message from Endpoint Engineering"
-        )
-        ui_templates.update_confirmation_template({"user_email":email})
-    except SlackApiError as e:
-        client.chat_postMessage(
-            channel=LOG_CHANNEL,
-            markdown_text=f'''--------{windows_version}-------\nFailed for {email}: {e.response['error']}"'''
-        )
-        print(f"Failed for {email}: {e.response['error']}")
-
-def message_multiple_users(client, emails: list[str], schedules:dict[str:str], windows_version:str):
-    print("-------------- Processing message_multiple_users....\n")
-    for email in emails: send_windows_message(client, email.strip(), schedules, windows_version) 
-
-
-def handle_shortcut_submission_events(ack, body, client, logger, view):
-    ack()
-    print("-------------- Processing handle_shortcut_submission_events....\n")
-    logger.info(body)
-    windows_version=WINDOWS_VERSION #view["state"]["values"]["windows_version"]["windows_version-action"]["value"]
-    provided_emails=view["state"]["values"]["provided_emails"]["provided_emails-action"]["value"].split(",")
-    provided_schedules={
-        "windows_version":WINDOWS_VERSION, #view["state"]["values"]["windows_version"]["windows_version-action"]["value"],
-        "tentative_schedule": view["state"]["values"]["tentative_schedule"]["tentative_schedule-action"]["value"],
-        "alternate_schedule_1": view["state"]["values"]["alternate_schedule_1"]["alternate_schedule_1-action"]["value"],
-        "alternate_schedule_2": view["state"]["values"]["alternate_schedule_2"]["alternate_schedule_2-action"]["value"],
-        "alternate_schedule_3": view["state"]["values"]["alternate_schedule_3"]["alternate_schedule_3-action"]["value"],
-        "alternate_schedule_4": view["state"]["values"]["alternate_schedule_4"]["alternate_schedule_4-action"]["value"],
-        "alternate_schedule_5": view["state"]["values"]["alternate_schedule_5"]["alternate_schedule_5-action"]["value"]
-    }
-    ui_templates.update_confirmation_template(provided_schedules)
-    message_multiple_users(client, provided_emails, provided_schedules, windows_version)
-app.view("windows_update_modal_view")(ack=respond_to_slack_within_3_seconds, lazy=[handle_shortcut_submission_events])
-
-if __name__ == "__main__":      
-    SocketModeHandler(app, SLACK_APP_TOKEN).start()
\ No newline at end of file
+        for handler in handlers:
+            handler.connect()
+        logger.info(f"Socket Mode replica {os.getpid()}: {connections} connections, {campaign_workers} campaign workers")
+        stop.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for handler in handlers:
+            handler.close()
+        # Each worker checkpoints its batch and releases its chunk to another replica
+        for worker in workers:
+            worker.join()
+        canvas_rows.flush()
+        metrics.flush()
+
+def run_replicas(replicas: int = SOCKET_MODE_REPLICAS, connections: int = SOCKET_MODE_CONNECTIONS, campaign_workers: int = campaign_queue.CAMPAIGN_WORKERS):
+    """Starts one process per replica; each takes an equal share of the bot token's rate limits unless SLACK_RATE_LIMIT_SHARE is set."""
+    rate_limit_share = float(os.getenv("SLACK_RATE_LIMIT_SHARE", str(1 / replicas)))
+    if replicas <= 1:
+        run_replica(connections, campaign_workers, rate_limit_share)
+        return
+    processes = [multiprocessing.Process(target=run_replica, args=(connections, campaign_workers, rate_limit_share), name=f"socket-mode-{i}") for i in range(replicas)]
+    for process in processes:
+        process.start()
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in processes:
+        process.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replicas", type=int, default=SOCKET_MODE_REPLICAS)
+    parser.add_argument("--connections", type=int, default=SOCKET_MODE_CONNECTIONS)
+    parser.add_argument("--campaign-workers", type=int, default=campaign_queue.CAMPAIGN_WORKERS, help="threads per replica sending queued campaigns; 0 sends them on the listener's thread")
+    args = parser.parse_args()
+    if args.replicas * args.connections > SLACK_MAX_CONNECTIONS:
+        parser.error(f"Slack allows an app {SLACK_MAX_CONNECTIONS} Socket Mode connections, not {args.replicas} replicas x {args.connections}")
+    if args.replicas > 1 and "memory" in (idempotency.IDEMPOTENCY_BACKEND, campaign_queue.CAMPAIGN_QUEUE_BACKEND):
+        parser.error("replicas can't share in-process state; set STATE_BACKEND=redis (or sqlite on one machine)")
+    run_replicas(args.replicas, args.connections, args.campaign_workers)
@@ -0,0 +1,68 @@
+"""Socket Mode on asyncio: the same app as socket_mode.py, but with AsyncApp, an AsyncWebClient and coroutine listeners.
+
+A threaded process ties up a thread per Slack call in flight; this one keeps hundreds of lookups and posts in
+flight as tasks on one event loop (see ASYNC_FANOUT_CONCURRENCY and ASYNC_CAMPAIGN_WORKERS):
+
+    python socket_mode_async.py
+"""
+import os
+import asyncio
+from dotenv import load_dotenv
+# Load .env before the listeners module reads its settings
+load_dotenv()
+
+import listeners
+import async_listeners
+import campaign_queue
+import idempotency
+import confirmations
+import canvas_writer
+import directory_index
+import aws_secrets
+import slack_clients
+import async_slack_clients
+import metrics
+import logging_config
+
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+
+logging_config.configure()
+
+SLACK_APP_TOKEN = os.getenv("SLACK_APP_TOKEN")
+secrets = aws_secrets.SecretsProvider(backend=os.getenv("SECRETS_BACKEND", "env"))
+SLACK_SIGNING_SECRET = secrets.get("signing_secret")
+SLACK_BOT_TOKEN = secrets.get("bot_token")
+
+def build_app() -> tuple[AsyncApp, object]:
+    """Returns the app and its canvas writer, which the caller flushes on the way out."""
+    app = AsyncApp(
+        client=async_slack_clients.build_async_web_client(SLACK_BOT_TOKEN),
+        signing_secret=SLACK_SIGNING_SECRET,
+        process_before_response=True
+    )
+    # For the housekeeping that runs on worker threads; both clients take tokens from rate_limits.governor
+    sync_client = slack_clients.build_web_client(SLACK_BOT_TOKEN)
+    job_queue = campaign_queue.get_queue()
+    idempotency_store = idempotency.get_store()
+    confirmation_store = confirmations.get_store()
+    canvas_rows = canvas_writer.get_canvas_writer(sync_client, listeners.SLACK_CANVAS, flush_interval=canvas_writer.CANVAS_FLUSH_SECONDS, store=idempotency_store, confirmation_store=confirmation_store)
+    async_slack_clients.use_pooled_clients(app)
+    async_listeners.register_listeners(app, job_queue, canvas_rows, sync_client, store=idempotency_store, confirmations_store=confirmation_store)
+    # The users.list walk runs on its own thread, never in a campaign batch
+    directory_index.start_refresh(sync_client, job_queue)
+    return app, canvas_rows
+
+async def main():
+    app, canvas_rows = build_app()
+    try:
+        await AsyncSocketModeHandler(app, SLACK_APP_TOKEN).start_async()
+    finally:
+        await app.client.close()
+        canvas_rows.flush()
+        metrics.flush()
+
+if __name__ == "__main__":
+    metrics.configure(os.getenv("METRICS_EXPORTER", "text"))
+    metrics.start_periodic_flush()
+    asyncio.run(main())
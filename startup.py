@@ -0,0 +1,37 @@
+import time
+from contextlib import contextmanager
+
+# Connections to slack.com opened during init: enough for a lazy listener's users.info + views.open
+WARM_CONNECTIONS = 2
+
+class StartupTimer:
+    """Records how long each init phase takes so cold starts can be compared in CloudWatch."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - started
+
+    def record(self, name: str, seconds: float):
+        self.phases[name] = seconds
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+    def report(self) -> str:
+        phases = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.phases.items())
+        return f"Init finished in {self.total * 1000:.0f}ms ({phases})"
+
+def timed_call(function, *args, **kwargs) -> tuple[object, float]:
+    """Runs function and returns (result, seconds); used to time work handed to a background thread."""
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started
@@ -48,7 +48,8 @@ resource "aws_iam_role_policy" "allow_self_invoke" {
         Action = [
           "lambda:InvokeFunction",
           "lambda:GetFunction",
-          "secretsmanager:GetSecretValue"
+          "secretsmanager:GetSecretValue",
+          "secretsmanager:BatchGetSecretValue"
         ],
         Resource = "*"
       }
@@ -103,11 +104,221 @@ resource "aws_lambda_function" "slack_handler" {
       ALLOWED_USERS         = var.ALLOWED_USERS
       bot_token_secret_name = aws_secretsmanager_secret.windows_updater_bot_token_value.name
       signing_secret_name  = aws_secretsmanager_secret.windows_updater_signing_secret.name
+      CAMPAIGN_QUEUE_BACKEND    = "sqs"
+      CAMPAIGN_QUEUE_URL        = aws_sqs_queue.campaign_chunks.url
+      CAMPAIGN_CHECKPOINT_TABLE = aws_dynamodb_table.campaign_checkpoints.name
+      CANVAS_QUEUE_URL          = aws_sqs_queue.canvas_rows.url
+      IDEMPOTENCY_BACKEND       = "dynamodb"
+      IDEMPOTENCY_TABLE         = aws_dynamodb_table.idempotency_keys.name
+      CONFIRMATION_BACKEND      = "dynamodb"
+      CONFIRMATION_TABLE        = aws_dynamodb_table.confirmations.name
+      CAMPAIGN_CONCURRENCY      = var.campaign_concurrency
 
     }
   }
 }
 
+############################
+# 2a. Campaign chunk queue and checkpoints
+############################
+# A chunk that keeps failing (a malformed body, a campaign whose sends always raise) is moved here
+# instead of being redelivered until retention expires. Each Lambda deadline hand-off also counts as
+# a receive, so the limit leaves room for a chunk that legitimately spans several invocations.
+resource "aws_sqs_queue" "campaign_chunks_dlq" {
+  name                      = "slack_windows_updater_campaign_chunks_dlq"
+  message_retention_seconds = 1209600
+}
+
+resource "aws_sqs_queue" "campaign_chunks" {
+  name                       = "slack_windows_updater_campaign_chunks"
+  visibility_timeout_seconds = 60
+  message_retention_seconds  = 345600
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.campaign_chunks_dlq.arn
+    maxReceiveCount     = 10
+  })
+}
+
+resource "aws_dynamodb_table" "campaign_checkpoints" {
+  name         = "slack_windows_updater_campaign_checkpoints"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "chunk_key"
+
+  attribute {
+    name = "chunk_key"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+}
+
+# One item per campaign, recipient, confirmation and canvas row, so a retried Slack delivery sends nothing twice
+resource "aws_dynamodb_table" "idempotency_keys" {
+  name         = "slack_windows_updater_idempotency_keys"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "idempotency_key"
+
+  attribute {
+    name = "idempotency_key"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+}
+
+# Confirmed weeks; each campaign's canvas is rendered from this table. Each campaign also has an
+# email = "#aggregates" item holding per-week counts, a latency histogram and its canvas ID
+resource "aws_dynamodb_table" "confirmations" {
+  name         = "slack_windows_updater_confirmations"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "campaign_id"
+  range_key    = "email"
+
+  attribute {
+    name = "campaign_id"
+    type = "S"
+  }
+
+  attribute {
+    name = "email"
+    type = "S"
+  }
+
+  attribute {
+    name = "campaign_week"
+    type = "S"
+  }
+
+  attribute {
+    name = "confirmed_at"
+    type = "N"
+  }
+
+  global_secondary_index {
+    name            = "email-index"
+    hash_key        = "email"
+    projection_type = "ALL"
+  }
+
+  global_secondary_index {
+    name            = "week-index"
+    hash_key        = "campaign_week"
+    range_key       = "confirmed_at"
+    projection_type = "ALL"
+  }
+}
+
+resource "aws_lambda_event_source_mapping" "campaign_chunks" {
+  event_source_arn        = aws_sqs_queue.campaign_chunks.arn
+  function_name           = aws_lambda_function.slack_handler.arn
+  batch_size              = 1
+  function_response_types = ["ReportBatchItemFailures"]
+
+  # Each container's rate limit governor takes 1/campaign_concurrency of the bot token's limits (CAMPAIGN_CONCURRENCY)
+  scaling_config {
+    maximum_concurrency = var.campaign_concurrency
+  }
+}
+
+# Walks users.list a few pages per invocation, resuming from the cursor saved in the checkpoint table,
+# so campaign batches only read the saved directory index and never walk it themselves
+resource "aws_cloudwatch_event_rule" "directory_refresh" {
+  name                = "slack_windows_updater_directory_refresh"
+  schedule_expression = "rate(1 minute)"
+}
+
+resource "aws_cloudwatch_event_target" "directory_refresh" {
+  rule  = aws_cloudwatch_event_rule.directory_refresh.name
+  arn   = aws_lambda_function.slack_handler.arn
+  input = jsonencode({ directory_refresh = true })
+}
+
+resource "aws_lambda_permission" "allow_directory_refresh" {
+  statement_id  = "AllowDirectoryRefreshSchedule"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.slack_handler.arn
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.directory_refresh.arn
+}
+
+resource "aws_sqs_queue" "canvas_rows" {
+  name                       = "slack_windows_updater_canvas_rows"
+  visibility_timeout_seconds = 60
+}
+
+# Confirmation rows wait up to 5s so a burst of clicks becomes one canvases.edit,
+# and at most 2 concurrent batches keep insert_at_end writes from racing
+resource "aws_lambda_event_source_mapping" "canvas_rows" {
+  event_source_arn                   = aws_sqs_queue.canvas_rows.arn
+  function_name                      = aws_lambda_function.slack_handler.arn
+  batch_size                         = 100
+  maximum_batching_window_in_seconds = 5
+  function_response_types            = ["ReportBatchItemFailures"]
+
+  scaling_config {
+    maximum_concurrency = 2
+  }
+}
+
+resource "aws_iam_role_policy" "campaign_queue_access" {
+  name = "CampaignQueueAccess"
+  role = aws_iam_role.lambda_exec_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      {
+        Effect = "Allow",
+        Action = [
+          "sqs:SendMessage",
+          "sqs:ReceiveMessage",
+          "sqs:DeleteMessage",
+          "sqs:ChangeMessageVisibility",
+          "sqs:GetQueueAttributes"
+        ],
+        Resource = [aws_sqs_queue.campaign_chunks.arn, aws_sqs_queue.canvas_rows.arn]
+      },
+      {
+        Effect = "Allow",
+        Action = [
+          "dynamodb:GetItem",
+          "dynamodb:BatchGetItem",
+          "dynamodb:PutItem",
+          "dynamodb:UpdateItem"
+        ],
+        Resource = aws_dynamodb_table.campaign_checkpoints.arn
+      },
+      {
+        Effect = "Allow",
+        Action = [
+          "dynamodb:PutItem",
+          "dynamodb:UpdateItem",
+          "dynamodb:DeleteItem"
+        ],
+        Resource = aws_dynamodb_table.idempotency_keys.arn
+      },
+      {
+        Effect = "Allow",
+        Action = [
+          "dynamodb:GetItem",
+          "dynamodb:PutItem",
+          "dynamodb:UpdateItem",
+          "dynamodb:Query",
+          "dynamodb:Scan"
+        ],
+        Resource = [aws_dynamodb_table.confirmations.arn, "${aws_dynamodb_table.confirmations.arn}/index/*"]
+      }
+    ]
+  })
+}
+
 ########################################
 # 3. API Gateway and Lambda Integration
 ########################################
@@ -186,6 +397,17 @@ variable "ALLOWED_USERS" {
   description = "list of allowed user slack ids e.g. user_id_1,user_id_2,....,user_id_n"
 }
 
+variable "campaign_concurrency" {
+  type        = number
+  default     = 4
+  description = "most campaign chunk invocations running at once; each takes an equal share of the Slack rate limits"
+
+  validation {
+    condition     = var.campaign_concurrency >= 2 && var.campaign_concurrency <= 1000
+    error_message = "SQS event source maximum_concurrency must be between 2 and 1000."
+  }
+}
+
 ############################
 # 5. Log retention (CloudWatch)
 ############################
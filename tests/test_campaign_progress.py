@@ -0,0 +1,75 @@
+"""A chunk redelivered after its progress was counted but before its checkpoint was written.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fanout
+import progress
+import campaign_queue
+
+class CrashBeforeCheckpoint:
+    """Wraps a queue so the first set_checkpoint after the given batch raises, like a worker dying there."""
+
+    def __init__(self, queue, crash_at: int):
+        self.queue = queue
+        self.crash_at = crash_at
+
+    def __getattr__(self, name):
+        return getattr(self.queue, name)
+
+    def set_checkpoint(self, chunk, sent: int):
+        if sent == self.crash_at:
+            self.crash_at = None
+            raise RuntimeError("worker died")
+        self.queue.set_checkpoint(chunk, sent)
+
+class RedeliveredBatchTest:
+    def make_queue(self):
+        raise NotImplementedError
+
+    def test_redelivered_batch_is_counted_once(self):
+        queue = self.make_queue()
+        emails = [f"user{i}@example.com" for i in range(10)]
+        chunk = campaign_queue.split_campaign(emails, {}, "24H2", chunk_size=10, campaign_id="C1", total=len(emails))[0]
+        delivered, finished = set(), []
+
+        def send_batch(chunk, batch):
+            # The per-recipient idempotency keys turn a re-sent recipient into a duplicate
+            results = [fanout.RecipientResult(email, ok=email != emails[3], error=None if email != emails[3] else "users_not_found", duplicate=email in delivered) for email in batch]
+            delivered.update(batch)
+            counts = progress.record(None, queue, chunk, results, batch_start=chunk.emails.index(batch[0]))
+            if counts.before_done < chunk.total <= counts.done:
+                finished.append(counts)
+
+        with self.assertRaises(RuntimeError):
+            campaign_queue.run_chunk(CrashBeforeCheckpoint(queue, crash_at=8), chunk, send_batch, batch_size=4)
+        self.assertEqual(finished, [])
+        self.assertTrue(campaign_queue.run_chunk(queue, chunk, send_batch, batch_size=4))
+
+        self.assertEqual(len(finished), 1)
+        self.assertEqual((finished[0].sent, finished[0].failed, finished[0].skipped), (9, 1, 0))
+        self.assertEqual(queue.get_failures("C1"), {"users_not_found": [emails[3]]})
+
+class InMemoryQueueTest(RedeliveredBatchTest, unittest.TestCase):
+    def make_queue(self):
+        return campaign_queue.InMemoryQueue()
+
+class SQLiteQueueTest(RedeliveredBatchTest, unittest.TestCase):
+    def make_queue(self):
+        return campaign_queue.SQLiteQueue(os.path.join(tempfile.mkdtemp(), "queue.sqlite3"))
+
+class RedisQueueTest(RedeliveredBatchTest, unittest.TestCase):
+    def make_queue(self):
+        try:
+            import fakeredis
+        except ImportError:
+            self.skipTest("fakeredis is not installed")
+        return campaign_queue.RedisQueue(fakeredis.FakeRedis(decode_responses=True))
+
+if __name__ == "__main__":
+    unittest.main()
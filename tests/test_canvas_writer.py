@@ -0,0 +1,89 @@
+"""Each campaign rendered into its own canvas, only when its rows change, with the main canvas left in place.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import canvas_writer
+import confirmations
+
+class FakeCanvases:
+    """canvases.create/edit/delete and files.info, keeping each canvas's markdown."""
+
+    def __init__(self):
+        self.documents = {"F-MAIN": "legacy row"}
+        self.edits = []
+
+    def canvases_create(self, title: str, document_content: dict):
+        canvas_id = f"F{len(self.documents)}"
+        self.documents[canvas_id] = document_content["markdown"]
+        return {"canvas_id": canvas_id}
+
+    def canvases_edit(self, canvas_id: str, changes: list):
+        self.edits.append(canvas_id)
+        change = changes[0]
+        markdown = change["document_content"]["markdown"]
+        if change["operation"] == "replace":
+            self.documents[canvas_id] = markdown
+        else:
+            self.documents[canvas_id] += "\n" + markdown
+        return {"ok": True}
+
+    def canvases_delete(self, canvas_id: str):
+        del self.documents[canvas_id]
+
+    def files_info(self, file: str):
+        return {"file": {"permalink": f"https://example.slack.com/docs/{file}"}}
+
+class CanvasViewTest(unittest.TestCase):
+    def setUp(self):
+        self.store = confirmations.SQLiteConfirmationStore(os.path.join(tempfile.mkdtemp(), "confirmations.sqlite3"))
+        self.client = FakeCanvases()
+        self.view = canvas_writer.CanvasView(self.client, "F-MAIN", self.store, flush_rows=100, share_channel="")
+
+    def confirm(self, campaign_id: str, email: str):
+        self.store.record(confirmations.Confirmation(campaign_id, email, "March 9", "Windows 11 24H2", confirmed_at=1767225600))
+        self.view.add(canvas_writer.CanvasRow(row_id=f"{campaign_id}-{email}", markdown="", campaign_id=campaign_id))
+
+    def test_each_campaign_gets_a_canvas_linked_from_the_main_one(self):
+        self.confirm("a", "user1@example.com")
+        self.confirm("b", "user2@example.com")
+        self.assertEqual(self.view.flush(), 2)
+        a, b = self.store.get_canvas("a"), self.store.get_canvas("b")
+        self.assertIn("user1@example.com", self.client.documents[a])
+        self.assertNotIn("user2@example.com", self.client.documents[a])
+        main = self.client.documents["F-MAIN"]
+        self.assertTrue(main.startswith("legacy row"))
+        self.assertIn(f"https://example.slack.com/docs/{a}", main)
+        self.assertIn(f"https://example.slack.com/docs/{b}", main)
+
+    def test_only_changed_campaigns_are_rendered_again(self):
+        self.confirm("a", "user1@example.com")
+        self.confirm("b", "user2@example.com")
+        self.view.flush()
+        self.client.edits.clear()
+        self.confirm("a", "user3@example.com")
+        self.view.flush()
+        a = self.store.get_canvas("a")
+        self.assertEqual(self.client.edits, [a])
+        self.assertIn("user3@example.com", self.client.documents[a])
+
+    def test_a_second_writer_uses_the_canvas_created_first(self):
+        self.store.set_canvas("a", "F-OTHER")
+        self.client.documents["F-OTHER"] = ""
+        self.confirm("a", "user1@example.com")
+        self.view.flush()
+        self.assertIn("user1@example.com", self.client.documents["F-OTHER"])
+        self.assertEqual(self.client.documents["F-MAIN"], "legacy row")
+
+    def test_rows_without_a_campaign_are_not_rendered(self):
+        self.view.add(canvas_writer.CanvasRow(row_id="V1", markdown="queued before campaigns"))
+        self.assertEqual(self.view.flush(), 0)
+        self.assertEqual(self.client.edits, [])
+
+if __name__ == "__main__":
+    unittest.main()
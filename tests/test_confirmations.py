@@ -0,0 +1,94 @@
+"""Week capacities: one confirmation past a week's capacity is refused, also when they arrive at once.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import threading
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import confirmations
+
+CAPACITY = 5
+WEEK = "March 9"
+
+def confirmation(index: int, week: str = WEEK) -> confirmations.Confirmation:
+    return confirmations.Confirmation("C1", f"user{index}@example.com", week, "Windows 11 24H2", view_id=f"V{index}-{week}", confirmed_at=1767225600 + index)
+
+class CapacityTest:
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.store = self.make_store()
+        self.store.set_capacity("C1", {WEEK: CAPACITY})
+
+    def record_all(self, count: int) -> list:
+        """Records count confirmations for WEEK one after another; returns the SlotFull errors raised."""
+        errors = []
+        for index in range(count):
+            try:
+                self.store.record(confirmation(index))
+            except confirmations.SlotFull as e:
+                errors.append(e)
+        return errors
+
+    def test_one_past_capacity_is_refused(self):
+        errors = self.record_all(CAPACITY + 1)
+        self.assertEqual([(e.campaign_id, e.week) for e in errors], [("C1", WEEK)])
+        self.assertEqual(self.store.counts_by_week("C1"), {WEEK: CAPACITY})
+        self.assertEqual(self.store.availability("C1"), {WEEK: 0})
+        # The refused user has no confirmation at all
+        self.assertIsNone(self.store.get("C1", f"user{CAPACITY}@example.com"))
+
+    def test_moving_out_gives_the_slot_back(self):
+        self.record_all(CAPACITY)
+        self.store.record(confirmation(0, week="March 16"))
+        self.assertEqual(self.store.availability("C1"), {WEEK: 1})
+        self.store.record(confirmation(CAPACITY))
+        self.assertEqual(self.store.counts_by_week("C1"), {WEEK: CAPACITY, "March 16": 1})
+
+    def test_a_repeated_view_takes_no_second_slot(self):
+        self.store.record(confirmation(0))
+        self.assertFalse(self.store.record(confirmation(0)))
+        self.assertEqual(self.store.availability("C1"), {WEEK: CAPACITY - 1})
+
+    def test_concurrent_confirmations_take_exactly_the_capacity(self):
+        # Every thread records at once, each on its own connection
+        start = threading.Barrier(CAPACITY + 1)
+        recorded, errors, lock = [], [], threading.Lock()
+        def confirm(index: int):
+            start.wait()
+            try:
+                self.store.record(confirmation(index))
+                result = recorded
+            except confirmations.SlotFull:
+                result = errors
+            with lock:
+                result.append(index)
+        threads = [threading.Thread(target=confirm, args=(index,)) for index in range(CAPACITY + 1)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((len(recorded), len(errors)), (CAPACITY, 1))
+        self.assertEqual(self.store.counts_by_week("C1"), {WEEK: CAPACITY})
+        self.assertEqual(self.store.availability("C1"), {WEEK: 0})
+        self.assertEqual(sorted(c.email for c in self.store.by_week("C1", WEEK)), sorted(f"user{index}@example.com" for index in recorded))
+
+class SQLiteCapacityTest(CapacityTest, unittest.TestCase):
+    def make_store(self):
+        return confirmations.SQLiteConfirmationStore(os.path.join(tempfile.mkdtemp(), "confirmations.sqlite3"))
+
+class RedisCapacityTest(CapacityTest, unittest.TestCase):
+    def make_store(self):
+        try:
+            import fakeredis
+        except ImportError:
+            self.skipTest("fakeredis is not installed")
+        return confirmations.RedisConfirmationStore(fakeredis.FakeRedis(decode_responses=True))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""The users.list walk resumed across deadlines, and campaign batches reading only what it saved.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import campaign_queue
+import directory_index
+
+class FakeUsersList:
+    """users.list over a fixed directory, page_size members at a time; the cursor is the next member's position."""
+
+    def __init__(self, count: int):
+        self.members = [{"id": f"U{i}", "tz": "Europe/Paris", "profile": {"email": f"User{i}@example.com"}} for i in range(count)]
+        self.calls = 0
+
+    def users_list(self, limit: int, cursor=None):
+        self.calls += 1
+        start = int(cursor or 0)
+        end = start + limit
+        return {"members": self.members[start:end], "response_metadata": {"next_cursor": str(end) if end < len(self.members) else ""}}
+
+def deadline_after(calls: int):
+    """remaining_seconds for a call that has time for this many pages."""
+    checks = iter(range(calls, -1, -1))
+    return lambda: directory_index.REFRESH_MARGIN_SECONDS if next(checks, 0) else 0.0
+
+class DirectoryRefreshTest:
+    def make_queue(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        directory_index._index = None
+        self.queue = self.make_queue()
+
+    def test_walk_resumes_from_the_saved_cursor(self):
+        client = FakeUsersList(5)
+        self.assertFalse(directory_index.refresh(client, self.queue, remaining_seconds=deadline_after(2), page_size=2))
+        self.assertIsNone(directory_index.DirectoryIndex.load(self.queue))
+        self.assertTrue(directory_index.refresh(client, self.queue, remaining_seconds=deadline_after(2), page_size=2))
+        # Three pages in all: the second call picked up at the third
+        self.assertEqual(client.calls, 3)
+        index = directory_index.DirectoryIndex.load(self.queue)
+        self.assertEqual(len(index), 5)
+        self.assertEqual(index.time_zone("U4"), "Europe/Paris")
+        # Still fresh, so nothing is walked again
+        self.assertTrue(directory_index.refresh(client, self.queue, page_size=2))
+        self.assertEqual(client.calls, 3)
+
+    def test_batches_miss_until_a_walk_is_saved(self):
+        index = directory_index.get_directory_index(self.queue)
+        self.assertEqual(index.resolve(["user1@example.com"]), ({}, ["user1@example.com"]))
+        index.add("user1@example.com", "U1", "Europe/Paris")
+        # Until the retry interval passes, the placeholder and what it learned are reused
+        self.assertIs(directory_index.get_directory_index(self.queue), index)
+
+        directory_index.refresh(FakeUsersList(3), self.queue)
+        directory_index._checked_at = 0.0
+        resolved, misses = directory_index.get_directory_index(self.queue).resolve(["user2@example.com", "nobody@example.com"])
+        self.assertEqual((resolved, misses), ({"user2@example.com": "U2"}, ["nobody@example.com"]))
+
+class InMemoryDirectoryTest(DirectoryRefreshTest, unittest.TestCase):
+    def make_queue(self):
+        return campaign_queue.InMemoryQueue()
+
+class SQLiteDirectoryTest(DirectoryRefreshTest, unittest.TestCase):
+    def make_queue(self):
+        return campaign_queue.SQLiteQueue(os.path.join(tempfile.mkdtemp(), "queue.sqlite3"))
+
+class RedisDirectoryTest(DirectoryRefreshTest, unittest.TestCase):
+    def make_queue(self):
+        try:
+            import fakeredis
+        except ImportError:
+            self.skipTest("fakeredis is not installed")
+        return campaign_queue.RedisQueue(fakeredis.FakeRedis(decode_responses=True))
+
+if __name__ == "__main__":
+    unittest.main()
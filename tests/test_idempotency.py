@@ -0,0 +1,97 @@
+"""Claims, completions, releases and lease takeovers on each idempotency store, and once() around them.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import asyncio
+import tempfile
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import idempotency
+
+class IdempotencyStoreTest:
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.store = self.make_store()
+
+    def test_completed_key_is_not_claimed_again(self):
+        self.assertTrue(self.store.claim("send:C1:user1@example.com"))
+        self.store.complete("send:C1:user1@example.com")
+        self.assertFalse(self.store.claim("send:C1:user1@example.com"))
+        # Even with its lease long past: a completed key is never taken over
+        self.assertFalse(self.store.claim("send:C1:user1@example.com", lease_seconds=0))
+
+    def test_pending_key_is_not_claimed_again(self):
+        self.assertTrue(self.store.claim("confirm:V1"))
+        self.assertFalse(self.store.claim("confirm:V1"))
+
+    def test_released_key_can_be_claimed_again(self):
+        self.assertTrue(self.store.claim("confirm:V1"))
+        self.store.release("confirm:V1")
+        self.assertTrue(self.store.claim("confirm:V1"))
+
+    def test_release_leaves_a_completed_key(self):
+        self.assertTrue(self.store.claim("confirm:V1"))
+        self.store.complete("confirm:V1")
+        self.store.release("confirm:V1")
+        self.assertFalse(self.store.claim("confirm:V1"))
+
+    def test_abandoned_claim_is_taken_over_after_its_lease(self):
+        # The first claimant died without completing or releasing; its lease is already over
+        self.assertTrue(self.store.claim("campaign:V1", lease_seconds=0))
+        self.assertTrue(self.store.claim("campaign:V1"))
+        # The takeover holds a fresh lease of its own
+        self.assertFalse(self.store.claim("campaign:V1"))
+
+    def test_once_completes_the_key(self):
+        with idempotency.once(self.store, "confirm:V1") as first:
+            self.assertTrue(first)
+        with idempotency.once(self.store, "confirm:V1") as first:
+            self.assertFalse(first)
+
+    def test_once_releases_the_key_when_the_block_raises(self):
+        with self.assertRaises(RuntimeError):
+            with idempotency.once(self.store, "confirm:V1") as first:
+                self.assertTrue(first)
+                raise RuntimeError("chat.update failed")
+        with idempotency.once(self.store, "confirm:V1") as first:
+            self.assertTrue(first)
+
+    def test_once_async_releases_the_key_when_the_block_raises(self):
+        async def attempt(fail: bool) -> bool:
+            async with idempotency.once_async(self.store, "confirm:V1") as first:
+                if fail:
+                    raise RuntimeError("chat.update failed")
+                return first
+        with self.assertRaises(RuntimeError):
+            asyncio.run(attempt(fail=True))
+        self.assertTrue(asyncio.run(attempt(fail=False)))
+        self.assertFalse(asyncio.run(attempt(fail=False)))
+
+    def test_once_without_a_key_always_runs(self):
+        for _ in range(2):
+            with idempotency.once(self.store, None) as first:
+                self.assertTrue(first)
+
+class InMemoryStoreTest(IdempotencyStoreTest, unittest.TestCase):
+    def make_store(self):
+        return idempotency.InMemoryStore()
+
+class SQLiteStoreTest(IdempotencyStoreTest, unittest.TestCase):
+    def make_store(self):
+        return idempotency.SQLiteStore(os.path.join(tempfile.mkdtemp(), "idempotency.sqlite3"))
+
+class RedisStoreTest(IdempotencyStoreTest, unittest.TestCase):
+    def make_store(self):
+        try:
+            import fakeredis
+        except ImportError:
+            self.skipTest("fakeredis is not installed")
+        return idempotency.RedisStore(fakeredis.FakeRedis(decode_responses=True))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+"""Redaction of emails and Slack user IDs in log messages and tracebacks.
+
+    python -m unittest discover tests
+"""
+import io
+import os
+import sys
+import logging
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging_config
+
+EMAIL = "jane.doe@example.com"
+USER_ID = "U0123ABCDEF"
+
+def fail_for(email: str):
+    raise ValueError(f"users_not_found: {email}")
+
+class RedactingFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        handler = logging.StreamHandler(self.stream)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        handler.addFilter(logging_config.RedactingFilter())
+        self.logger = logging.getLogger("tests.redaction")
+        self.logger.propagate = False
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+
+    def assertRedacted(self, output: str):
+        self.assertNotIn(EMAIL, output)
+        self.assertNotIn(USER_ID, output)
+        self.assertIn(logging_config.pseudonym("email", EMAIL), output)
+
+    def test_message_and_args(self):
+        self.logger.warning("Could not message %s (%s)", EMAIL, USER_ID)
+        self.assertRedacted(self.stream.getvalue())
+
+    def test_traceback(self):
+        try:
+            fail_for(EMAIL)
+        except ValueError:
+            self.logger.exception(f"Send failed for {USER_ID}")
+        output = self.stream.getvalue()
+        self.assertIn("Traceback", output)
+        self.assertIn("users_not_found", output)
+        self.assertRedacted(output)
+
+class ConfigureTest(unittest.TestCase):
+    def test_exceptions_are_redacted_through_the_queue(self):
+        root = logging.getLogger()
+        handlers, level = list(root.handlers), root.level
+        def restore():
+            logging_config._stop()
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            for handler in handlers:
+                root.addHandler(handler)
+            root.setLevel(level)
+        self.addCleanup(restore)
+        stream = io.StringIO()
+        logging_config.configure(stream=stream)
+        try:
+            fail_for(EMAIL)
+        except ValueError:
+            logging.getLogger("tests.redaction.queue").exception("Send failed")
+        logging_config.flush()
+        output = stream.getvalue()
+        self.assertIn("users_not_found", output)
+        self.assertNotIn(EMAIL, output)
+
+if __name__ == "__main__":
+    unittest.main()
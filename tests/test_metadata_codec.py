@@ -0,0 +1,65 @@
+"""private_metadata round trips, plain and compressed, legacy payloads, and the 3,000 character limit.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import json
+import random
+import string
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metadata_codec
+
+CONFIRMATION = {
+    "date": "March 9",
+    "message_ts": "1767225600.000100",
+    "channel_id": "D0123456789",
+    "user_email": "jane.doe@example.com",
+    "windows_version": "Windows 11 24H2",
+    "campaign_id": "V0123456789",
+}
+
+class MetadataCodecTest(unittest.TestCase):
+    def test_small_metadata_round_trips_as_plain_json(self):
+        encoded = metadata_codec.encode_private_metadata(CONFIRMATION)
+        self.assertFalse(encoded.startswith(metadata_codec.COMPRESSED_PREFIX))
+        self.assertEqual(metadata_codec.decode_private_metadata(encoded), CONFIRMATION)
+        # The short keys are what make it smaller than the long-key JSON
+        self.assertLess(len(encoded), len(json.dumps(CONFIRMATION)))
+
+    def test_large_metadata_round_trips_compressed(self):
+        metadata = {**CONFIRMATION, "schedules": {f"March {day}": f"Windows 11 24H2 — week of March {day}" for day in range(1, 32)}}
+        encoded = metadata_codec.encode_private_metadata(metadata)
+        self.assertTrue(encoded.startswith(metadata_codec.COMPRESSED_PREFIX))
+        self.assertEqual(metadata_codec.decode_private_metadata(encoded), metadata)
+
+    def test_compression_can_be_turned_off(self):
+        metadata = {**CONFIRMATION, "note": "x" * 1000}
+        encoded = metadata_codec.encode_private_metadata(metadata, compress=False)
+        self.assertFalse(encoded.startswith(metadata_codec.COMPRESSED_PREFIX))
+        self.assertEqual(metadata_codec.decode_private_metadata(encoded), metadata)
+
+    def test_legacy_long_key_json_still_decodes(self):
+        self.assertEqual(metadata_codec.decode_private_metadata(json.dumps(CONFIRMATION)), CONFIRMATION)
+
+    def test_empty_metadata_decodes_to_nothing(self):
+        self.assertEqual(metadata_codec.decode_private_metadata(""), {})
+
+    def test_over_the_limit_raises(self):
+        # Random text barely compresses, so it stays over the limit either way
+        noise = "".join(random.Random(0).choices(string.ascii_letters + string.digits, k=metadata_codec.PRIVATE_METADATA_LIMIT))
+        for compress in (True, False):
+            with self.subTest(compress=compress), self.assertRaises(metadata_codec.PrivateMetadataTooLarge):
+                metadata_codec.encode_private_metadata({**CONFIRMATION, "note": noise}, compress=compress)
+
+    def test_over_the_limit_before_compression_fits_after_it(self):
+        metadata = {**CONFIRMATION, "note": "week of March 9 " * 300}
+        self.assertGreater(len(json.dumps(metadata)), metadata_codec.PRIVATE_METADATA_LIMIT)
+        encoded = metadata_codec.encode_private_metadata(metadata)
+        self.assertLessEqual(len(encoded), metadata_codec.PRIVATE_METADATA_LIMIT)
+        self.assertEqual(metadata_codec.decode_private_metadata(encoded), metadata)
+
+if __name__ == "__main__":
+    unittest.main()
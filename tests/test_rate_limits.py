@@ -0,0 +1,104 @@
+"""Token bucket refill, backing off after a 429, per-process shares, and interactive calls going ahead of bulk ones.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import time
+import threading
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rate_limits
+
+class TokenBucketTest(unittest.TestCase):
+    def test_refill_adds_rate_tokens_per_second_up_to_the_burst(self):
+        bucket = rate_limits.TokenBucket(per_second=10, burst=5)
+        bucket.tokens, now = 0.0, bucket.updated
+        bucket.refill(now + 0.2)
+        self.assertAlmostEqual(bucket.tokens, 2.0)
+        bucket.refill(now + 10)
+        self.assertEqual(bucket.tokens, 5)
+
+    def test_wait_time_is_the_time_to_the_next_token(self):
+        bucket = rate_limits.TokenBucket(per_second=10, burst=5)
+        bucket.tokens = 0.5
+        self.assertAlmostEqual(bucket.wait_time(rate_limits.INTERACTIVE, bucket.updated), 0.05)
+
+    def test_bulk_leaves_the_interactive_reserve(self):
+        bucket = rate_limits.TokenBucket(per_second=10, burst=5)
+        # Enough for one call, but not for one past the reserve
+        bucket.tokens = 1 + 5 * rate_limits.INTERACTIVE_RESERVE - 0.5
+        self.assertEqual(bucket.wait_time(rate_limits.INTERACTIVE, bucket.updated), 0.0)
+        self.assertGreater(bucket.wait_time(rate_limits.BULK, bucket.updated), 0.0)
+
+class GovernorTest(unittest.TestCase):
+    def setUp(self):
+        self.governor = rate_limits.RateLimitGovernor()
+
+    def bucket(self, method: str) -> rate_limits.TokenBucket:
+        return self.governor._method_bucket(method)
+
+    def test_a_429_pauses_and_halves_the_rate(self):
+        base = self.bucket("chat.update").rate
+        self.governor.record_rate_limited("chat.update", None, retry_after=3)
+        bucket = self.bucket("chat.update")
+        self.assertEqual(bucket.rate, base / 2)
+        self.assertEqual(bucket.tokens, 0.0)
+        self.assertAlmostEqual(bucket.wait_time(rate_limits.INTERACTIVE, time.monotonic()), 3, delta=0.1)
+        self.governor.record_rate_limited("chat.update", None, retry_after=1)
+        self.assertEqual(bucket.rate, base / 4)
+        self.assertEqual(self.governor.snapshot()["rate_limited"], {"chat.update": 2})
+
+    def test_the_rate_never_drops_below_the_floor(self):
+        base = self.bucket("chat.update").rate
+        for _ in range(10):
+            self.governor.record_rate_limited("chat.update", None, retry_after=0)
+        self.assertEqual(self.bucket("chat.update").rate, base * rate_limits.MIN_RATE_FACTOR)
+
+    def test_successes_win_the_rate_back(self):
+        base = self.bucket("chat.update").rate
+        self.governor.record_rate_limited("chat.update", None, retry_after=0)
+        self.governor.record_success("chat.update")
+        self.assertAlmostEqual(self.bucket("chat.update").rate, base * (0.5 + rate_limits.RECOVERY_STEP))
+        for _ in range(100):
+            self.governor.record_success("chat.update")
+        self.assertEqual(self.bucket("chat.update").rate, base)
+
+    def test_a_429_on_a_dm_also_pauses_its_channel(self):
+        self.bucket("chat.postMessage")
+        self.governor.record_rate_limited("chat.postMessage", "D1", retry_after=2)
+        self.assertGreater(self.governor._channel_bucket("D1", time.monotonic()).wait_time(rate_limits.INTERACTIVE, time.monotonic()), 1.5)
+
+    def test_share_divides_every_method_limit(self):
+        full = self.bucket("users.lookupByEmail").rate
+        self.governor.set_share(1 / 4)
+        self.assertAlmostEqual(self.bucket("users.lookupByEmail").rate, full / 4)
+
+    def test_interactive_goes_ahead_of_a_waiting_bulk_call(self):
+        # 50 calls a minute sped up 6x: one token every 0.2s, from an empty bucket
+        governor = rate_limits.RateLimitGovernor(time_scale=6)
+        governor._method_bucket("chat.update").tokens = 0.0
+        order = []
+        def call(lane: int):
+            governor.acquire("chat.update", lane=lane)
+            order.append(lane)
+        bulk = threading.Thread(target=call, args=(rate_limits.BULK,))
+        bulk.start()
+        # The bulk call is already waiting when the interactive one arrives
+        time.sleep(0.05)
+        interactive = threading.Thread(target=call, args=(rate_limits.INTERACTIVE,))
+        interactive.start()
+        bulk.join(5)
+        interactive.join(5)
+        self.assertEqual(order, [rate_limits.INTERACTIVE, rate_limits.BULK])
+        self.assertEqual(governor.snapshot()["peak_queue_depth"], {"interactive": 1, "bulk": 1})
+
+    def test_lane_context_sets_the_default_lane(self):
+        self.assertEqual(rate_limits.current_lane(), rate_limits.INTERACTIVE)
+        with rate_limits.lane(rate_limits.BULK):
+            self.assertEqual(rate_limits.current_lane(), rate_limits.BULK)
+        self.assertEqual(rate_limits.current_lane(), rate_limits.INTERACTIVE)
+
+if __name__ == "__main__":
+    unittest.main()
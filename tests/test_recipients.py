@@ -0,0 +1,71 @@
+"""preflight over pasted text and uploaded CSVs: headers, normalization, invalid entries, duplicates and the spool.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+from unittest import mock
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import recipients
+
+# (name, sources, expected addresses in order, duplicates, invalid entries)
+CASES = [
+    ("email header reads only its column",
+     [["name,Email,team\n", "Jane,jane@example.com,ops@example.com\n", "Joe,joe@example.com,ops@example.com\n"]],
+     ["jane@example.com", "joe@example.com"], 0, 0),
+    ("header is matched case-insensitively",
+     [[" E-Mail ,name\n", "jane@example.com,Jane\n"]],
+     ["jane@example.com"], 0, 0),
+    ("no header reads every cell",
+     [["jane@example.com,joe@example.com\n", "ann@example.com\n"]],
+     ["jane@example.com", "joe@example.com", "ann@example.com"], 0, 0),
+    ("mixed case and whitespace are normalized",
+     [recipients.text_lines("  Jane@Example.COM ; joe@example.com\n\tANN@example.com  \n")],
+     ["jane@example.com", "joe@example.com", "ann@example.com"], 0, 0),
+    ("copied forms lose their quotes, brackets and mailto:",
+     [['"Jane Doe <jane@example.com>"\n', "mailto:Joe@example.com\n", "'ann@example.com'\n"]],
+     ["jane@example.com", "joe@example.com", "ann@example.com"], 0, 0),
+    ("invalid addresses are counted and sampled",
+     [["jane@example.com\n", "not-an-address\n", "joe@example\n", "ann@@example.com\n", f"{'a' * 250}@example.com\n"]],
+     ["jane@example.com"], 0, 4),
+    ("duplicates differing only in case are dropped",
+     [["jane@example.com\n", "JANE@example.com\n", "jane@example.com\n"]],
+     ["jane@example.com"], 2, 0),
+    ("duplicates across pasted text and files are dropped",
+     [recipients.text_lines("jane@example.com; joe@example.com"), ["email\n", "Joe@example.com\n", "ann@example.com\n"], ["ANN@example.com,jane@example.com\n"]],
+     ["jane@example.com", "joe@example.com", "ann@example.com"], 3, 0),
+    ("a header row is not an address in later files",
+     [["email\n", "jane@example.com\n"], ["email\n", "joe@example.com\n"]],
+     ["jane@example.com", "joe@example.com"], 0, 0),
+    ("empty sources",
+     [recipients.text_lines(""), []],
+     [], 0, 0),
+]
+
+class PreflightTest(unittest.TestCase):
+    def test_cases(self):
+        for name, sources, expected, duplicate, invalid in CASES:
+            with self.subTest(name), recipients.preflight(sources) as recipient_list:
+                self.assertEqual(list(recipient_list), expected)
+                self.assertEqual((recipient_list.valid, recipient_list.duplicate, recipient_list.invalid), (len(expected), duplicate, invalid))
+
+    def test_invalid_samples_are_capped(self):
+        with recipients.preflight([[f"bad{index}\n" for index in range(recipients.INVALID_SAMPLES + 5)]]) as recipient_list:
+            self.assertEqual(recipient_list.invalid, recipients.INVALID_SAMPLES + 5)
+            self.assertEqual(len(recipient_list.invalid_samples), recipients.INVALID_SAMPLES)
+            self.assertIn("and 5 more", recipient_list.summary())
+
+    def test_spools_to_disk_past_the_threshold(self):
+        lines = [f"user{index}@example.com\n" for index in range(100)]
+        for spool_bytes, rolled in ((1024 * 1024, False), (256, True)):
+            with self.subTest(spool_bytes=spool_bytes), mock.patch.object(recipients, "RECIPIENT_SPOOL_BYTES", spool_bytes):
+                with recipients.preflight([lines]) as recipient_list:
+                    self.assertEqual(recipient_list._spool._rolled, rolled)
+                    # Read back the same either way, and more than once
+                    self.assertEqual(list(recipient_list), [line.strip() for line in lines])
+                    self.assertEqual(len(list(recipient_list)), 100)
+
+if __name__ == "__main__":
+    unittest.main()
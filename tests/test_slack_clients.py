@@ -0,0 +1,112 @@
+"""PooledWebClient against a local HTTP server: 429s retried through the governor, proxies, and bolt's deep copies.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import copy
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rate_limits
+import slack_clients
+
+class FakeSlack(ThreadingHTTPServer):
+    """Answers every method with ok, after first answering rate_limited times with a 429."""
+
+    # Keep-alive connections stay open in the client's pool; don't wait for them on close
+    daemon_threads = True
+
+    def __init__(self, rate_limited: int = 0):
+        super().__init__(("127.0.0.1", 0), FakeSlackHandler)
+        self.rate_limited = rate_limited
+        self.paths = []
+        threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/api/"
+
+class FakeSlackHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.server.paths.append(self.path)
+        if self.server.rate_limited:
+            self.server.rate_limited -= 1
+            self.reply(429, {"ok": False, "error": "ratelimited"}, {"Retry-After": "0"})
+        else:
+            self.reply(200, {"ok": True, "channel": "D1", "ts": "1.0"})
+
+    def reply(self, status: int, body: dict, headers: dict = {}):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        for name, value in {"Content-Type": "application/json; charset=utf-8", "Content-Length": str(len(data)), **headers}.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+class PooledWebClientTest(unittest.TestCase):
+    def setUp(self):
+        self.governor = rate_limits.RateLimitGovernor()
+
+    def serve(self, rate_limited: int = 0) -> FakeSlack:
+        server = FakeSlack(rate_limited)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def build_client(self, server: FakeSlack) -> slack_clients.PooledWebClient:
+        client = slack_clients.build_web_client("xoxb-test", base_url=server.url, governor=self.governor)
+        self.addCleanup(client.pool.close)
+        return client
+
+    def test_a_429_is_retried_through_the_governor(self):
+        server = self.serve(rate_limited=1)
+        client = self.build_client(server)
+        base = self.governor._method_bucket("chat.postMessage").rate
+        response = client.chat_postMessage(channel="D1", text="hi")
+        self.assertTrue(response["ok"])
+        self.assertEqual(len(server.paths), 2)
+        snapshot = self.governor.snapshot()
+        # Both attempts took a token, and the 429 was reported before the retry
+        self.assertEqual(snapshot["calls"], {"chat.postMessage": 2})
+        self.assertEqual(snapshot["rate_limited"], {"chat.postMessage": 1})
+        # Halved by the 429, then one recovery step for the successful retry
+        self.assertAlmostEqual(self.governor._method_bucket("chat.postMessage").rate, base * (0.5 + rate_limits.RECOVERY_STEP))
+
+    def test_connections_are_reused(self):
+        server = self.serve()
+        client = self.build_client(server)
+        for _ in range(3):
+            client.chat_postMessage(channel="D1", text="hi")
+        self.assertEqual(client.pool.created, 1)
+
+    def test_a_proxy_is_used_instead_of_the_pool(self):
+        proxy = self.serve(rate_limited=1)
+        client = slack_clients.PooledWebClient(token="xoxb-test", base_url="http://slack.invalid/api/", proxy=proxy.url, retry_handlers=slack_clients.build_retry_handlers(), governor=self.governor)
+        self.assertTrue(client.chat_postMessage(channel="D1", text="hi")["ok"])
+        # The request line a proxy gets carries the whole target URL
+        self.assertEqual(proxy.paths, ["http://slack.invalid/api/chat.postMessage"] * 2)
+        self.assertEqual(client.pool.created, 0)
+        self.assertEqual(self.governor.snapshot()["rate_limited"], {"chat.postMessage": 1})
+
+    def test_deep_copy_shares_the_pool_and_governor_only(self):
+        client = slack_clients.build_web_client("xoxb-test", governor=self.governor)
+        copied = copy.deepcopy({"client": client, "again": client})
+        self.assertIsNot(copied["client"], client)
+        self.assertIs(copied["again"], copied["client"])
+        self.assertIs(copied["client"].pool, client.pool)
+        self.assertIs(copied["client"].governor, self.governor)
+        copied["client"].headers["X-Test"] = "1"
+        self.assertNotIn("X-Test", client.headers)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,10 @@
 from typing import Dict, Any
-from copy import deepcopy
+from functools import lru_cache
 import json
+import logging
+import metadata_codec
+
+logger = logging.getLogger(__name__)
 
 MODAL_CONFIRMATION_TEMPLATE: Dict[str, Any] = {
 	"type": "modal",
@@ -9,7 +13,7 @@ MODAL_CONFIRMATION_TEMPLATE: Dict[str, Any] = {
 		"text": "Confirm",
 		"emoji": True
 	},
-	"private_metadata": {},
+	"private_metadata": "",
 	"close": {
 		"type": "plain_text",
 		"text": "Go Back",
@@ -44,6 +48,32 @@ MODAL_CONFIRMATION_TEMPLATE: Dict[str, Any] = {
 }
 
 
+MODAL_WEEK_FULL_TEMPLATE: Dict[str, Any] = {
+	"type": "modal",
+	"close": {
+		"type": "plain_text",
+		"text": "OK",
+		"emoji": True
+	},
+	"title": {
+		"type": "plain_text",
+		"text": "Week Fully Booked",
+		"emoji": True
+	},
+	"callback_id": "week_full_view",
+	"blocks": [
+		{
+			"type": "section",
+			"block_id": "week_full_message",
+			"text": {
+				"type": "mrkdwn",
+				"text": "week_full_message"
+			}
+		}
+	]
+}
+
+
 SHORTCUT_MODAL_TEMPLATE: Dict[str, Any] = {
 	"title": {
 		"type": "plain_text",
@@ -62,7 +92,7 @@ SHORTCUT_MODAL_TEMPLATE: Dict[str, Any] = {
 		"text": "Cancel",
 		"emoji": True
 	},
-	"private_metadata": {},
+	"private_metadata": "",
 	"blocks": [
 		{
 			"type": "input",
@@ -90,7 +120,24 @@ SHORTCUT_MODAL_TEMPLATE: Dict[str, Any] = {
 				"type": "plain_text",
 				"text": "Please provide a list of emails separated by a comma",
 				"emoji": True
-			}
+			},
+			"optional": True
+		},
+		{
+			"type": "input",
+			"block_id": "recipients_file",
+			"element": {
+				"type": "file_input",
+				"action_id": "recipients_file-action",
+				"filetypes": ["csv", "txt"],
+				"max_files": 1
+			},
+			"label": {
+				"type": "plain_text",
+				"text": "Or upload a CSV of emails (one column, or a column headed \"email\")",
+				"emoji": True
+			},
+			"optional": True
 		},
 		{
 			"type": "input",
@@ -169,10 +216,46 @@ SHORTCUT_MODAL_TEMPLATE: Dict[str, Any] = {
 				"text": "Alternate Schedule 5",
 				"emoji": True
 			}
+		},
+		{
+			"type": "input",
+			"block_id": "slot_capacity",
+			"element": {
+				"type": "number_input",
+				"is_decimal_allowed": False,
+				"min_value": "1",
+				"action_id": "slot_capacity-action"
+			},
+			"label": {
+				"type": "plain_text",
+				"text": "Technician capacity per alternate week (blank for unlimited)",
+				"emoji": True
+			},
+			"optional": True
+		},
+		{
+			"type": "input",
+			"block_id": "pacing_per_minute",
+			"element": {
+				"type": "number_input",
+				"is_decimal_allowed": False,
+				"min_value": "1",
+				"action_id": "pacing_per_minute-action"
+			},
+			"label": {
+				"type": "plain_text",
+				"text": "Recipients per minute, paced through each recipient's business hours",
+				"emoji": True
+			},
+			"optional": True
 		}
 	]
 }
 
+CONFIRMATION_MESSAGE_INDEX = next(
+	index for index, block in enumerate(MODAL_CONFIRMATION_TEMPLATE["blocks"]) if block.get("block_id") == "confirmation_message"
+)
+
 BLOCK_MESSAGE_TEMPLATE: Dict[str, Any] = {
 	"blocks": [
 		{
@@ -205,6 +288,7 @@ BLOCK_MESSAGE_TEMPLATE: Dict[str, Any] = {
 		},
 		{
 			"type": "section",
+			"block_id": "choose_week",
 			"text": {
 				"type": "mrkdwn",
 				"text": "If you need to select a different week, please choose from the options below by *Friday, Month 12 at 6:00 PM PT*."
@@ -613,54 +697,117 @@ BLOCK_MESSAGE_TEMPLATE: Dict[str, Any] = {
 	]
 }
 
-def update_confirmation_template(private_metadata:dict):
-	print("-------------- Processing update_confirmation_template....\n")
-	if MODAL_CONFIRMATION_TEMPLATE["private_metadata"] == True:
-		MODAL_CONFIRMATION_TEMPLATE["private_metadata"] = private_metadata
-	else:
-		MODAL_CONFIRMATION_TEMPLATE["private_metadata"].update(private_metadata)
-
-
 def build_confirmation_modal(private_metadata: dict, confirmation_message: str):
-	print("-------------- Processing build_confirmation_modal....\n")
-	confirmation_modal = deepcopy(MODAL_CONFIRMATION_TEMPLATE)
-	confirmation_modal["blocks"][2]["text"]["text"] = confirmation_message
-	x_private_metadata = confirmation_modal["private_metadata"]
-	x_private_metadata.update(private_metadata)
-	confirmation_modal["private_metadata"] = json.dumps(x_private_metadata)
-	return confirmation_modal
+	logger.debug("Processing build_confirmation_modal")
+	# Copy only what changes; the template itself is never mutated
+	blocks = list(MODAL_CONFIRMATION_TEMPLATE["blocks"])
+	blocks[CONFIRMATION_MESSAGE_INDEX] = dict(blocks[CONFIRMATION_MESSAGE_INDEX], text={"type": "mrkdwn", "text": confirmation_message})
+	return dict(
+		MODAL_CONFIRMATION_TEMPLATE,
+		blocks=blocks,
+		private_metadata=metadata_codec.encode_private_metadata(private_metadata)
+	)
 
 
+def build_week_full_modal(week: str, open_weeks: list):
+	logger.debug("Processing build_week_full_modal")
+	text = f":no_entry: The week of *{week}* is fully booked."
+	text += f" Weeks with room: {', '.join(f'*{open_week}*' for open_week in open_weeks)}." if open_weeks else " Every alternate week is fully booked, so your upgrade stays on its scheduled week."
+	return dict(MODAL_WEEK_FULL_TEMPLATE, blocks=[dict(MODAL_WEEK_FULL_TEMPLATE["blocks"][0], text={"type": "mrkdwn", "text": text})])
+
 def build_shortcut_modal(private_metadata: str):
-	print("-------------- Processing build_shortcut_modal....\n")
-	shortcut_modal = deepcopy(SHORTCUT_MODAL_TEMPLATE)
-	shortcut_modal["private_metadata"]=json.dumps(private_metadata)
-	return shortcut_modal
+	logger.debug("Processing build_shortcut_modal")
+	return dict(SHORTCUT_MODAL_TEMPLATE, private_metadata=json.dumps(private_metadata))
+
+def _find_path(node, target: str, path: tuple = ()):
+	"""Returns the key/index path to the first "text" or "value" string in node equal to target, or None."""
+	if node == target and path and path[-1] in ("text", "value"):
+		return path
+	if isinstance(node, dict):
+		children = node.items()
+	elif isinstance(node, list):
+		children = enumerate(node)
+	else:
+		return None
+	for key, child in children:
+		found = _find_path(child, target, path + (key,))
+		if found is not None:
+			return found
+	return None
+
+# (path into BLOCK_MESSAGE_TEMPLATE["blocks"], format string) pairs, located by the template's placeholder text once at import
+BLOCK_MESSAGE_SLOTS = [
+	(_find_path(BLOCK_MESSAGE_TEMPLATE["blocks"], placeholder), value)
+	for placeholder, value in [
+		("Time to Schedule Your {windows_version} Upgrade", ":windows_logo: *Your Windows 11 Upgrade: Scheduled for {tentative_schedule}* :windows_logo:"),
+		("We are upgrading your Workday laptop to {windows_version} for improved performance and enhanced security.", "We are upgrading your Workday laptop to *{windows_version}* for improved performance and enhanced security."),
+		("Your upgrade is scheduled for the week of {tentative_schedule}. If this timing works for you, no action is required.", "Your upgrade is scheduled for the week of {tentative_schedule}. If this timing works for you, *no action is required*."),
+		*[(f"alternate_{i}", f"Upgrade the week of *{{alternate_schedule_{i}}}*") for i in range(1, 6)],
+		*[(f"alternate_{i}-date", f"{{button_prefix}}{{alternate_schedule_{i}}}") for i in range(1, 6)],
+		(" Benefits of {windows_version}\n", "Benefits of {windows_version}\n"),
+		("For additional questions, please refer to the <https://google.com|{windows_version} FAQ> or ask in #ask-bt.", "For additional questions, please refer to the <https://www.google.com|{windows_version} FAQ> or ask in #ask-bt."),
+	]
+]
+assert all(path is not None for path, _ in BLOCK_MESSAGE_SLOTS), "BLOCK_MESSAGE_TEMPLATE no longer matches BLOCK_MESSAGE_SLOTS"
 
-def build_blocks_message(provided_schedules:dict, windows_version:str):
-	print("-------------- Processing build_blocks_message....\n")
-	blocks_message = deepcopy(BLOCK_MESSAGE_TEMPLATE)["blocks"]
-	blocks_message[0]["text"]["text"]=f":windows_logo: *Your Windows 11 Upgrade: Scheduled for {provided_schedules["tentative_schedule"]}* :windows_logo:"
-	blocks_message[2]["text"]["text"]=f"We are upgrading your Workday laptop to *{windows_version}* for improved performance and enhanced security."
-	blocks_message[3]["text"]["text"]=f"Your upgrade is scheduled for the week of {provided_schedules["tentative_schedule"]}. If this timing works for you, *no action is required*."
+# Campaign message templates by name, as (blocks, slots); a campaign records which one it was sent with
+DEFAULT_TEMPLATE = "windows_upgrade"
+MESSAGE_TEMPLATES = {
+	DEFAULT_TEMPLATE: (BLOCK_MESSAGE_TEMPLATE["blocks"], BLOCK_MESSAGE_SLOTS),
+}
+# Reschedule button values are "<campaign id>|<date>", so a click finds its campaign among overlapping rollouts
+BUTTON_VALUE_SEPARATOR = "|"
 
-	blocks_message[5]["text"]["text"]=f"Upgrade the week of *{provided_schedules['alternate_schedule_1']}*"
-	blocks_message[5]["accessory"]["value"]=provided_schedules["alternate_schedule_1"]
+# Reschedule button blocks and the schedule each one offers; a full week's block is left out of newly sent messages
+ALTERNATE_BLOCKS = {f"alternate_{i}": f"alternate_schedule_{i}" for i in range(1, 6)}
+# The line introducing the buttons, left out once every alternate week is full
+CHOOSE_WEEK_BLOCK = "choose_week"
 
-	blocks_message[6]["text"]["text"]=f"Upgrade the week of *{provided_schedules['alternate_schedule_2']}*"
-	blocks_message[6]["accessory"]["value"]=provided_schedules["alternate_schedule_2"]
+def parse_button_value(value: str) -> tuple:
+	"""Returns (campaign_id, date); campaign_id is None for buttons sent before campaigns had IDs."""
+	campaign_id, separator, date = value.rpartition(BUTTON_VALUE_SEPARATOR)
+	return (campaign_id or None) if separator else None, date
 
-	blocks_message[7]["text"]["text"]=f"Upgrade the week of *{provided_schedules['alternate_schedule_3']}*"
-	blocks_message[7]["accessory"]["value"]=provided_schedules["alternate_schedule_3"]
+def _render_slots(template_blocks: list, slots: list, values: dict) -> list:
+	"""Copies only the containers along each slot path; untouched blocks are shared with the template."""
+	blocks = list(template_blocks)
+	copied = {(): blocks}
+	for path, value in slots:
+		node = blocks
+		for depth in range(1, len(path)):
+			prefix = path[:depth]
+			if prefix not in copied:
+				child = node[path[depth - 1]]
+				copied[prefix] = child.copy()
+				node[path[depth - 1]] = copied[prefix]
+			node = copied[prefix]
+		node[path[-1]] = value.format_map(values)
+	return blocks
 
-	blocks_message[8]["text"]["text"]=f"Upgrade the week of *{provided_schedules['alternate_schedule_4']}*"
-	blocks_message[8]["accessory"]["value"]=provided_schedules["alternate_schedule_4"]
+def _without_full_weeks(blocks: list, values: dict, full_weeks: frozenset) -> list:
+	dropped = {block_id for block_id, schedule in ALTERNATE_BLOCKS.items() if values.get(schedule) in full_weeks}
+	if dropped == set(ALTERNATE_BLOCKS):
+		dropped.add(CHOOSE_WEEK_BLOCK)
+	return [block for block in blocks if block.get("block_id") not in dropped]
 
-	blocks_message[9]["text"]["text"]=f"Upgrade the week of *{provided_schedules['alternate_schedule_5']}*"
-	blocks_message[9]["accessory"]["value"]=provided_schedules["alternate_schedule_5"]
+@lru_cache(maxsize=32)
+def _render_blocks_message(schedule_items: tuple, windows_version: str, campaign_id: str, template: str, full_weeks: frozenset) -> tuple:
+	logger.debug("Rendering build_blocks_message for a new campaign")
+	button_prefix = campaign_id + BUTTON_VALUE_SEPARATOR if campaign_id else ""
+	values = dict(schedule_items, windows_version=windows_version, button_prefix=button_prefix)
+	template_blocks, slots = MESSAGE_TEMPLATES[template]
+	blocks_message = _render_slots(template_blocks, slots, values)
+	if full_weeks:
+		blocks_message = _without_full_weeks(blocks_message, values, full_weeks)
+	return blocks_message, json.dumps(blocks_message, separators=(",", ":"))
 
-	blocks_message[12]["elements"][0]["elements"][1]["text"]=f"Benefits of {windows_version}\n"
+def build_blocks_message(provided_schedules:dict, windows_version:str, campaign_id:str="", template:str=DEFAULT_TEMPLATE, full_weeks:frozenset=frozenset()) -> list:
+	"""Returns the rendered message blocks, cached per campaign and shared by every recipient.
 
-	blocks_message[15]["text"]["text"]=f"For additional questions, please refer to the <https://www.google.com|{windows_version} FAQ> or ask in #ask-bt."
+	Buttons for weeks in full_weeks are left out. The result is shared, so treat it as read-only.
+	"""
+	return _render_blocks_message(tuple(sorted(provided_schedules.items())), windows_version, campaign_id, template, frozenset(full_weeks))[0]
 
-	return blocks_message
\ No newline at end of file
+def build_blocks_message_json(provided_schedules:dict, windows_version:str, campaign_id:str="", template:str=DEFAULT_TEMPLATE, full_weeks:frozenset=frozenset()) -> str:
+	"""Same as build_blocks_message, pre-serialized once per campaign."""
+	return _render_blocks_message(tuple(sorted(provided_schedules.items())), windows_version, campaign_id, template, frozenset(full_weeks))[1]